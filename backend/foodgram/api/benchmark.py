@@ -0,0 +1,183 @@
+'''Нагрузка на запущенный сервер.
+
+Потоки с keep-alive соединениями по очереди выполняют запросы из
+списка, пока не будет сделано нужное число запросов, и записывают
+задержку каждого ответа. Нужна только стандартная библиотека, поэтому
+нагрузку можно давать с той же машины, где установлен бэкенд.
+'''
+import http.client
+import importlib.util
+import itertools
+import json
+import math
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+SAFE = '/?&=%+:,;@!$()*~'
+
+SERVERS = {
+    'wsgi': ['-m', 'gunicorn', 'foodgram.wsgi:application'],
+    'runserver': ['manage.py', 'runserver', '--noreload'],
+}
+REQUIREMENTS = {
+    'wsgi': ('gunicorn',),
+    'runserver': (),
+}
+
+
+def percentile(values, percent):
+    '''Перцентиль по ближайшему рангу; values отсортированы.'''
+    if not values:
+        return None
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = 0
+
+    def summary(self, path=None):
+        '''Сводка по одному пути или по всем сразу; задержки в мс.'''
+        if path is None:
+            latencies = sorted(itertools.chain(*self.latencies.values()))
+            errors = sum(self.errors.values())
+        else:
+            latencies = sorted(self.latencies[path])
+            errors = self.errors[path]
+        total = len(latencies) + errors
+        return {
+            'requests': total,
+            'errors': errors,
+            'rps': total / self.elapsed if self.elapsed else 0,
+            **{
+                f'p{percent}': percentile(latencies, percent)
+                for percent in (50, 95, 99)
+            },
+        }
+
+
+def connect(url, timeout):
+    connection_class = (http.client.HTTPSConnection
+                        if url.scheme == 'https'
+                        else http.client.HTTPConnection)
+    return connection_class(url.netloc, timeout=timeout)
+
+
+def as_request(request):
+    '''Путь — это GET; кортеж (метод, путь, тело) — любой запрос,
+    тело отправляется как JSON.'''
+    if isinstance(request, str):
+        return 'GET', request, None
+    return request
+
+
+def run_load(base_url, requests, concurrency, total, headers=None,
+             timeout=30):
+    '''Делает до total запросов к base_url в concurrency потоков; каждый
+    поток выполняет requests — список или функцию, которая по номеру
+    потока возвращает его собственный список — целиком, круг за кругом,
+    поэтому пары «добавить — удалить» не обрываются на середине. Ответы
+    с кодом 400 и выше и сетевые ошибки считаются ошибками.'''
+    url = urlsplit(base_url)
+    prefix = url.path.rstrip('/')
+    remaining = total
+    lock = threading.Lock()
+    result = LoadResult()
+
+    def claim(count):
+        nonlocal remaining
+        with lock:
+            if remaining < count:
+                return False
+            remaining -= count
+            return True
+
+    def worker(index):
+        plan = [as_request(request) for request in (
+            requests(index) if callable(requests) else requests)]
+        connection = connect(url, timeout)
+        while plan and claim(len(plan)):
+            connection = send_all(connection, plan)
+        connection.close()
+
+    def send_all(connection, plan):
+        for method, path, body in plan:
+            request_headers = dict(headers or {})
+            if body is not None:
+                body = json.dumps(body)
+                request_headers['Content-Type'] = 'application/json'
+            started = time.perf_counter()
+            try:
+                connection.request(
+                    method, quote(prefix + path, safe=SAFE),
+                    body=body, headers=request_headers)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = connect(url, timeout)
+                failed = True
+            latency = (time.perf_counter() - started) * 1000
+            with lock:
+                if failed:
+                    result.errors[path] += 1
+                else:
+                    result.latencies[path].append(latency)
+        return connection
+
+    threads = [threading.Thread(target=worker, args=(index,))
+               for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def start_server(kind, base_url, workers, cwd):
+    '''Запускает сервер kind из SERVERS на адресе из base_url.'''
+    for module in REQUIREMENTS[kind]:
+        if importlib.util.find_spec(module) is None:
+            raise RuntimeError(f'Для сервера {kind} нужен {module}.')
+    bind = urlsplit(base_url).netloc
+    if kind == 'runserver':
+        options = [bind]
+    else:
+        options = ['--workers', str(workers), '--bind', bind]
+    return subprocess.Popen(
+        [sys.executable, *SERVERS[kind], *options], cwd=cwd,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_servers(servers):
+    for server in servers:
+        server.terminate()
+        server.wait()
+
+
+def wait_until_ready(base_url, path, timeout=30):
+    url = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        connection = connect(url, 2)
+        try:
+            connection.request(
+                'GET', quote(url.path.rstrip('/') + path, safe=SAFE))
+            if connection.getresponse().status < 500:
+                return True
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+        finally:
+            connection.close()
+    return False
@@ -0,0 +1,191 @@
+'''Кэш ответов списка и карточки рецептов для анонимных пользователей.
+
+Ключ ответа строится из нормализованной строки запроса и поколений тех
+данных, от которых ответ зависит: всего каталога, автора, тегов или
+конкретного рецепта. Поколение — случайный токен в кэше; изменение
+данных заменяет токен, и все зависевшие от него ответы перестают
+находиться. Старые записи просто вытесняются по таймауту.
+
+Счётчики рецептов и авторов меняются на каждое добавление в избранное
+и корзину, поэтому поколений не трогают: в ответ из кэша они
+подставляются свежими, как в api.fragments.overlay. Сортировки по
+счётчикам не кэшируются — от счётчиков там зависит сам состав страницы.
+'''
+import time
+from hashlib import md5
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from recipes.models import Recipe
+
+RESPONSE_TIMEOUT = 60
+STALE_TIMEOUT = 30
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+
+CACHEABLE_PARAMS = frozenset(
+    ('tags', 'author', 'page', 'limit', 'pagination', 'cursor', 'count',
+     'ordering'))
+
+CATALOG = 'catalog'
+ALL_RECIPES = 'all'
+AUTHOR = 'author'
+TAG = 'tag'
+RECIPE = 'recipe'
+
+COUNTER_ORDERINGS = ('favorites_count', 'in_carts_count')
+COUNTER_VALUES = ('id', 'favorites_count', 'in_carts_count',
+                  'author__recipes_count', 'author__followers_count')
+
+
+def generation_key(scope, pk=None):
+    return f'recipes:generation:{scope}:{pk}'
+
+
+def get_generations(keys):
+    generations = cache.get_many(keys)
+    missing = {
+        key: uuid4().hex for key in keys if key not in generations
+    }
+    if missing:
+        for key, generation in missing.items():
+            cache.add(key, generation, None)
+        generations.update(cache.get_many(list(missing)))
+    return [generations.get(key, '') for key in keys]
+
+
+def bump(*keys):
+    '''Сменить поколения после фиксации транзакции: иначе параллельный
+    запрос успеет закэшировать ещё не изменённые данные.'''
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(
+            {key: uuid4().hex for key in keys}, None))
+
+
+def bump_recipe(recipe_id, author_id, tag_slugs):
+    bump(
+        generation_key(ALL_RECIPES),
+        generation_key(RECIPE, recipe_id),
+        generation_key(AUTHOR, author_id),
+        *(generation_key(TAG, slug) for slug in tag_slugs)
+    )
+
+
+def bump_catalog():
+    bump(generation_key(CATALOG))
+
+
+def cached_recipes(data):
+    '''Представления рецептов в теле ответа: списка, страницы
+    или карточки.'''
+    if isinstance(data, list):
+        return data
+    return data.get('results', [data])
+
+
+def with_counters(data):
+    '''Подставляет текущие счётчики в ответ из кэша — одним запросом
+    на все рецепты ответа.'''
+    recipes = cached_recipes(data)
+    counters = {
+        row[0]: row[1:] for row in Recipe.objects.filter(
+            id__in=[recipe['id'] for recipe in recipes]
+        ).values_list(*COUNTER_VALUES)
+    }
+    for recipe in recipes:
+        if recipe['id'] not in counters:
+            continue
+        author = recipe['author']
+        (recipe['favorites_count'], recipe['in_carts_count'],
+         author['recipes_count'], author['followers_count']) = counters[
+            recipe['id']]
+    return data
+
+
+def _response_key(request, scopes):
+    generations = get_generations(
+        [generation_key(CATALOG)]
+        + [generation_key(scope, pk) for scope, pk in scopes]
+    )
+    query = sorted(
+        (name, sorted(request.query_params.getlist(name)))
+        for name in request.query_params
+    )
+    raw = repr((request.get_host(), request.path, query, generations))
+    return f'recipes:response:{md5(raw.encode()).hexdigest()}'
+
+
+def list_key(request):
+    '''Ключ для списка рецептов или None, если ответ не кэшируется.'''
+    if (not request.user.is_anonymous
+            or set(request.query_params) - CACHEABLE_PARAMS
+            or any(field in request.query_params.get('ordering', '')
+                   for field in COUNTER_ORDERINGS)):
+        return None
+    scopes = [(TAG, slug) for slug in request.query_params.getlist('tags')]
+    author = request.query_params.get('author')
+    if author:
+        scopes.append((AUTHOR, author))
+    if not scopes:
+        scopes.append((ALL_RECIPES, None))
+    return _response_key(request, scopes)
+
+
+def detail_key(request, pk):
+    if (not request.user.is_anonymous or request.query_params
+            or not str(pk).isdigit()):
+        return None
+    return _response_key(request, [(RECIPE, int(pk))])
+
+
+def get_or_build(key, build):
+    '''Отдаёт ответ из кэша или строит его вызовом build().
+
+    Защита от «эффекта толпы»: строит ответ только процесс, захвативший
+    блокировку; остальные отдают устаревшую копию, а если её нет — ждут
+    результата не дольше LOCK_WAIT. Блокировка — cache.add, поэтому кэш
+    должен быть общим и атомарным (проверка api.E001).
+    '''
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return Response(with_counters(entry[1]))
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            response = build()
+            if response.status_code == 200:
+                cache.set(
+                    key, (time.time() + RESPONSE_TIMEOUT, response.data),
+                    RESPONSE_TIMEOUT + STALE_TIMEOUT)
+            return response
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        return Response(with_counters(entry[1]))
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return Response(with_counters(entry[1]))
+    return build()
+
+
+class AnonymousCacheMixin:
+    def list(self, request, *args, **kwargs):
+        key = list_key(request)
+        build = super().list
+        if key is None:
+            return build(request, *args, **kwargs)
+        return get_or_build(key, lambda: build(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        key = detail_key(request, kwargs['pk'])
+        build = super().retrieve
+        if key is None:
+            return build(request, *args, **kwargs)
+        return get_or_build(key, lambda: build(request, *args, **kwargs))
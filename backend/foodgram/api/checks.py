@@ -0,0 +1,45 @@
+'''Проверки настроек, без которых кэш ответов работает неверно.'''
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Бэкенды кэша, у которых add() не атомарен между процессами: блокировка
+# «одна пересборка на ключ» в api.cache.get_or_build на них не работает.
+NON_ATOMIC_CACHES = frozenset((
+    'django.core.cache.backends.filebased.FileBasedCache',
+))
+# Бэкенды без общего для процессов хранилища: у каждого воркера свои
+# поколения ответов, и инвалидация в одном не видна остальным.
+# Допустимы только с DEBUG, когда процесс один.
+PROCESS_LOCAL_CACHES = frozenset((
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+))
+
+SHARED_CACHE_HINT = (
+    'Укажите в CACHE_BACKEND общий кэш с атомарным add(): '
+    'django.core.cache.backends.redis.RedisCache или PyMemcacheCache. '
+    'LocMemCache годится только для одного процесса с DEBUG=True; '
+    'тесты подменяют кэш сами.'
+)
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in NON_ATOMIC_CACHES:
+        return [Error(
+            f'Кэш {backend} не подходит: cache.add() в нём не атомарен '
+            f'между процессами, и защита от одновременной пересборки '
+            f'ответов не работает.',
+            hint=SHARED_CACHE_HINT,
+            id='api.E001',
+        )]
+    if backend in PROCESS_LOCAL_CACHES and not settings.DEBUG:
+        return [Error(
+            f'Кэш {backend} не подходит без DEBUG: он не общий для '
+            f'воркеров, и изменения в одном из них не сбрасывают '
+            f'кэшированные ответы в остальных.',
+            hint=SHARED_CACHE_HINT,
+            id='api.E002',
+        )]
+    return []
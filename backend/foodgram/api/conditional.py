@@ -0,0 +1,92 @@
+from hashlib import md5
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Favourite, ShoppingCart
+from users.models import Subscribe
+
+
+def user_state(user):
+    '''Отпечаток избранного, корзины и подписок пользователя: флаги
+    is_favorited, is_in_shopping_cart и is_subscribed зависят от них.'''
+    if user.is_anonymous:
+        return None
+    return [
+        tuple(model.objects.filter(user=user).aggregate(
+            last=Max('id'), total=Count('id')).values())
+        for model in (Favourite, ShoppingCart, Subscribe)
+    ]
+
+
+def query_digest(request, normalize=None):
+    '''Отпечаток параметров запроса: от их порядка он не зависит,
+    а значения параметров из normalize ({имя: функция}) приводятся
+    так же, как их понимает представление.'''
+    normalize = normalize or {}
+    params = sorted(
+        (key, sorted(map(normalize.get(key, str), values)))
+        for key, values in request.query_params.lists())
+    return md5(repr(params).encode()).hexdigest()
+
+
+def validators(state, last_modified):
+    '''ETag и метка времени для Last-Modified из того, что вернул
+    get_validators.'''
+    etag = quote_etag(md5(repr(state).encode()).hexdigest())
+    return etag, last_modified and int(last_modified.timestamp())
+
+
+def add_validators(response, etag, timestamp):
+    response['ETag'] = etag
+    if timestamp:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class ConditionalGetMixin:
+    '''ETag и Last-Modified для list и retrieve; если клиент уже видел
+    текущую версию, отвечаем 304, не выполняя само представление.
+
+    Наследник определяет get_validators(request), возвращающий
+    (отпечаток для ETag, дата последнего изменения или None). Отпечаток
+    None значит, что дешёвого отпечатка нет: ответ собирается, и ETag
+    считается по его телу — 304 тогда экономит только передачу.
+    '''
+
+    def conditional_response(self, request, build):
+        state, last_modified = self.get_validators(request)
+        if state is None:
+            return self.content_response(request, build)
+        etag, timestamp = validators(state, last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = build()
+            if response.status_code != 200:
+                return response
+        return add_validators(response, etag, timestamp)
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return self.conditional_response(
+            request, lambda: build(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return self.conditional_response(
+            request, lambda: build(request, *args, **kwargs))
+
+    @staticmethod
+    def content_response(request, build):
+        response = build()
+        if response.status_code != 200:
+            return response
+        etag, _ = validators(JSONRenderer().render(response.data), None)
+        return add_validators(
+            get_conditional_response(request, etag=etag) or response,
+            etag, None)
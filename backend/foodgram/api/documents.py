@@ -0,0 +1,161 @@
+'''Фоновая сборка файлов списка покупок.
+
+Представление только ставит заказ (ShoppingListJob) в очередь, а файл
+собирает воркер — команда shopping_list_worker. Версия списка —
+счётчик User.shopping_list_version, который recipes.shopping_list
+увеличивает при каждом изменении списка: пока он не изменился, повторный
+заказ сразу получает уже готовый файл.
+
+Воркер, захвативший заказ, записывает в него своё имя и, пока собирает
+файл, обновляет heartbeat_at. В очередь возвращаются только заказы
+без сигнала дольше таймаута, а завершить заказ может только его
+нынешний владелец.
+'''
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from tempfile import TemporaryFile
+from uuid import uuid4
+
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from .shopping_list import RENDERERS, list_rows
+from recipes.models import ShoppingListJob
+from users.models import User
+
+FORMATS = tuple(RENDERERS)
+# Как часто воркер подтверждает, что собирает файл, секунд; таймаут
+# requeue_stale должен быть заметно больше.
+HEARTBEAT_INTERVAL = 10
+# Итог run() для заказа, который перехватил другой воркер.
+LOST = 'lost'
+# Текст ошибки виден клиенту; подробности — только в логе воркера.
+BUILD_ERROR = 'Не удалось собрать файл, закажите его ещё раз.'
+
+logger = logging.getLogger(__name__)
+
+
+class JobLost(Exception):
+    '''Заказ вернули в очередь и, возможно, отдали другому воркеру.'''
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'[-100:]
+
+
+def list_version(user_id):
+    return str(User.objects.filter(id=user_id).values_list(
+        'shopping_list_version', flat=True).get())
+
+
+def request_document(user, file_format):
+    '''Готовый или уже собираемый файл той же версии, иначе новый заказ.
+    Второй элемент — создан ли заказ.'''
+    version = list_version(user.id)
+    job = ShoppingListJob.objects.filter(
+        user=user, format=file_format, version=version,
+        status__in=(ShoppingListJob.PENDING, ShoppingListJob.RUNNING,
+                    ShoppingListJob.DONE),
+    ).first()
+    if job is not None:
+        return job, False
+    return ShoppingListJob.objects.create(
+        user=user, format=file_format, version=version), True
+
+
+def claim(job_id, worker):
+    '''Захват заказа условным UPDATE: из нескольких воркеров его получит
+    ровно один, на любой базе и без блокировок строк.'''
+    now = timezone.now()
+    return ShoppingListJob.objects.filter(
+        id=job_id, status=ShoppingListJob.PENDING
+    ).update(status=ShoppingListJob.RUNNING, worker=worker, started_at=now,
+             heartbeat_at=now) == 1
+
+
+def next_job(worker):
+    for job_id in ShoppingListJob.objects.filter(
+            status=ShoppingListJob.PENDING
+    ).order_by('id').values_list('id', flat=True)[:10]:
+        if claim(job_id, worker):
+            return ShoppingListJob.objects.get(id=job_id)
+    return None
+
+
+def owned(job):
+    return ShoppingListJob.objects.filter(
+        id=job.id, worker=job.worker, status=ShoppingListJob.RUNNING)
+
+
+def keep_alive(job):
+    '''Сигнал, что воркер жив и заказ всё ещё его.'''
+    if not owned(job).update(heartbeat_at=timezone.now()):
+        raise JobLost(job.id)
+
+
+def requeue_stale(timeout):
+    '''Возвращает в очередь заказы, от воркеров которых дольше timeout
+    секунд нет сигнала: воркер упал, не закончив.'''
+    return ShoppingListJob.objects.filter(
+        status=ShoppingListJob.RUNNING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=ShoppingListJob.PENDING, worker='', started_at=None,
+             heartbeat_at=None)
+
+
+def build(job):
+    '''Собирает файл и сохраняет его в хранилище медиафайлов. Версия
+    читается до строк списка: если список изменится во время сборки,
+    файл получит прежнюю версию и следующий заказ соберёт новый.'''
+    version = list_version(job.user_id)
+    rows = list(list_rows(job.user_id))
+    beat = time.monotonic()
+    with TemporaryFile() as buffer:
+        for chunk in RENDERERS[job.format](rows):
+            buffer.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            if time.monotonic() - beat >= HEARTBEAT_INTERVAL:
+                keep_alive(job)
+                beat = time.monotonic()
+        buffer.seek(0)
+        job.file.save(f'{uuid4().hex}.{job.format}', File(buffer),
+                      save=False)
+    job.version = version
+    job.status = ShoppingListJob.DONE
+    job.finished_at = timezone.now()
+    if not owned(job).update(file=job.file.name, version=job.version,
+                             status=job.status, finished_at=job.finished_at):
+        job.file.delete(save=False)
+        raise JobLost(job.id)
+    discard_previous(job)
+
+
+def discard_previous(job):
+    '''Файлы прежних версий больше не понадобятся.'''
+    previous = ShoppingListJob.objects.filter(
+        user_id=job.user_id, format=job.format,
+        status__in=(ShoppingListJob.DONE, ShoppingListJob.FAILED),
+    ).exclude(Q(id=job.id) | Q(version=job.version))
+    for old in previous:
+        if old.file:
+            old.file.delete(save=False)
+    previous.delete()
+
+
+def run(job):
+    '''Собирает файл заказа; возвращает итоговый статус.'''
+    try:
+        build(job)
+    except JobLost:
+        logger.warning('Заказ %s вернули в очередь во время сборки', job.id)
+        return LOST
+    except Exception:
+        logger.exception('Не удалось собрать файл заказа %s', job.id)
+        owned(job).update(
+            status=ShoppingListJob.FAILED, error=BUILD_ERROR,
+            finished_at=timezone.now())
+        return ShoppingListJob.FAILED
+    return job.status
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 
 
 User = get_user_model()
@@ -15,22 +16,48 @@ class IngredientSearchFilter(filters.FilterSet):
         fields = ['name']
 
 
+class StableOrderingFilter(filters.OrderingFilter):
+    '''Дописывает -id в конец сортировки: при равных значениях
+    счётчиков страницы иначе перемешивались бы.'''
+
+    def filter(self, queryset, value):
+        queryset = super().filter(queryset, value)
+        if not value:
+            return queryset
+        return queryset.order_by(*queryset.query.order_by, '-id')
+
+
 class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = StableOrderingFilter(
+        fields=('id', 'favorites_count', 'in_carts_count', 'cooking_time'))
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
+        if value and self.request.user.is_anonymous:
+            return queryset.none()
         if value:
             return queryset.filter(shopping__user=self.request.user)
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
+        if value and self.request.user.is_anonymous:
+            return queryset.none()
         if value:
             return queryset.filter(favorites__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,90 @@
+'''Кэш представлений рецептов, общих для всех пользователей.
+
+RecipeSerializer для каждого зрителя заново собирает одно и то же:
+теги, автора, ингредиенты, текст и ссылки на картинки. Здесь готовое
+представление рецепта кладётся в кэш под ключом из id рецепта и его
+updated_at — он меняется при любой записи в рецепт, его ингредиенты,
+теги и профиль автора (recipes.signals), так что устаревший фрагмент
+просто перестаёт находиться. Поверх фрагмента подставляется то, что
+меняется без updated_at: флаги текущего пользователя и счётчики рецепта
+и автора из только что прочитанной строки.
+
+Страница читает все фрагменты одним get_many; только для промахов
+догружаются теги и ингредиенты и собираются словари
+(api.light_serializers).
+'''
+from hashlib import md5
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .instrumentation import section
+from .light_serializers import recipes_data
+from .relation_sets import user_sets
+from recipes.models import Recipe
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def fragment_key(origin, recipe):
+    return (f'recipes:fragment:{origin}:{recipe.id}:'
+            f'{recipe.updated_at.timestamp()}')
+
+
+def overlay(data, recipe, sets):
+    '''Подставляет во фрагмент поля, которые не входят в его версию.'''
+    data['is_favorited'] = sets.is_favorited(recipe.id)
+    data['is_in_shopping_cart'] = sets.is_in_shopping_cart(recipe.id)
+    data['favorites_count'] = recipe.favorites_count
+    data['in_carts_count'] = recipe.in_carts_count
+    author = data['author']
+    author['is_subscribed'] = sets.is_subscribed(recipe.author_id)
+    author['recipes_count'] = recipe.author.recipes_count
+    author['followers_count'] = recipe.author.followers_count
+    return data
+
+
+def recipe_data(recipes, request):
+    '''То же, что RecipeSerializer(recipes, many=True).data, для рецептов
+    с загруженным автором (select_related('author')).'''
+    # Ссылки на картинки абсолютные, поэтому фрагмент зависит от схемы
+    # и хоста запроса.
+    origin = md5(request.build_absolute_uri('/').encode()).hexdigest()
+    keys = [fragment_key(origin, recipe) for recipe in recipes]
+    fragments = cache.get_many(keys)
+    misses = [recipe for recipe, key in zip(recipes, keys)
+              if key not in fragments]
+    if misses:
+        built = {
+            fragment_key(origin, recipe): data
+            for recipe, data in zip(misses, recipes_data(misses, request))
+        }
+        cache.set_many(built, FRAGMENT_TIMEOUT)
+        fragments.update(built)
+    sets = user_sets(request)
+    return [overlay(fragments[key], recipe, sets)
+            for recipe, key in zip(recipes, keys)]
+
+
+def display_queryset():
+    '''Рецепты для recipe_data: связи догружаются только для промахов.'''
+    return Recipe.objects.select_related('author')
+
+
+class FragmentCacheMixin:
+    '''list и retrieve рецептов через recipe_data вместо сериализатора.'''
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        with section('serialize'):
+            data = recipe_data(
+                list(queryset) if page is None else page, request)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        with section('serialize'):
+            return Response(recipe_data([recipe], request)[0])
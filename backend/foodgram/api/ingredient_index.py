@@ -0,0 +1,79 @@
+import threading
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Ingredient
+
+VERSION_KEY = 'ingredient_index:version'
+
+
+class IngredientIndex:
+    '''Индекс названий ингредиентов в памяти процесса.
+
+    Названия хранятся отсортированными в нижнем регистре, поэтому поиск
+    по префиксу — это bisect без обращения к базе. Версия индекса лежит
+    в общем кэше: после изменения ингредиентов каждый воркер при первом
+    же запросе замечает новую версию и перестраивает свой индекс.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = ([], [])
+
+    def search(self, query, limit):
+        keys, rows = self._snapshot()
+        folded = query.casefold()
+        start = bisect_left(keys, folded)
+        prefix = []
+        for position in range(start, len(keys)):
+            if not keys[position].startswith(folded):
+                break
+            prefix.append(rows[position])
+        prefix.sort(key=lambda row: not row['name'].startswith(query))
+        prefix = prefix[:limit]
+
+        substring = []
+        if len(prefix) < limit:
+            for key, row in zip(keys, rows):
+                if folded in key and not key.startswith(folded):
+                    substring.append(row)
+                    if len(prefix) + len(substring) >= limit:
+                        break
+        return prefix + substring
+
+    def _snapshot(self):
+        version = current_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+        return self._data
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['id'])
+        )
+        keys = [row['name'].casefold() for row in ingredients]
+        self._data = (keys, ingredients)
+        self._version = version
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is not None:
+        return version
+    cache.add(VERSION_KEY, uuid4().hex, None)
+    return cache.get(VERSION_KEY)
+
+
+def invalidate():
+    transaction.on_commit(
+        lambda: cache.set(VERSION_KEY, uuid4().hex, None))
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,208 @@
+'''Замеры каждого запроса: SQL, представление, фильтры, сериализатор,
+рендерер и размер ответа.
+
+Middleware заводит на запрос RequestTimings и кладёт его в contextvar:
+так до него дотягиваются и обёртка запросов к базе, и хуки DRF,
+в том числе в потоках sync_to_async под ASGI. Обёртка ставится
+в connection.execute_wrappers каждого соединения при его открытии
+и вне запроса сводится к одной проверке contextvar. Итог уходит
+в гистограммы api.metrics и в заголовок Server-Timing — его получают
+только сотрудники (is_staff) или все, если включён SERVER_TIMING.
+'''
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import StreamingHttpResponse
+
+from . import query_inspection
+from .metrics import registry
+
+# Порядок этапов в Server-Timing.
+SECTIONS = ('db', 'filter', 'serialize', 'view', 'render', 'total')
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                     'OPTIONS'))
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections = defaultdict(float)
+        self.queries = 0
+        self.inspector = query_inspection.start()
+        self.action = None
+        self.budget = None
+
+    def server_timing(self, size):
+        entries = [
+            f'{name};dur={self.sections[name] * 1000:.1f}'
+            + (f';desc="{self.queries} SQL"' if name == 'db' else '')
+            for name in SECTIONS if name in self.sections
+        ]
+        if size is not None:
+            entries.append(f'size;desc="{size} B"')
+        return ', '.join(entries)
+
+
+@contextmanager
+def section(name):
+    '''Добавляет время блока к этапу name текущего запроса.'''
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.sections[name] += time.perf_counter() - started
+
+
+def query_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    if timings.inspector is not None:
+        timings.inspector.record(sql)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sections['db'] += time.perf_counter() - started
+        timings.queries += 1
+
+
+@receiver(connection_created)
+def install_query_wrapper(connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def timed(serializer):
+    '''Время to_representation сериализатора уходит в этап serialize.'''
+    to_representation = serializer.to_representation
+
+    def timed_to_representation(instance):
+        with section('serialize'):
+            return to_representation(instance)
+
+    serializer.to_representation = timed_to_representation
+    return serializer
+
+
+class TimedViewMixin:
+    '''Хуки DRF: время представления, фильтров и сериализатора.
+    Рендер замеряет middleware: DRF рендерит ответ уже после dispatch.
+
+    query_budgets — {действие: сколько SQL-запросов ему можно}; бюджет
+    проверяет api.query_inspection.'''
+
+    query_budgets = {}
+
+    def initial(self, request, *args, **kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.action = f'{type(self).__name__}.{self.action}'
+            timings.budget = self.query_budgets.get(self.action)
+        super().initial(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        with section('view'):
+            return super().dispatch(request, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        with section('filter'):
+            return super().filter_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        return timed(super().get_serializer(*args, **kwargs))
+
+
+class ServerTimingMiddleware:
+    '''Ставится первым, чтобы total покрывал всю обработку.'''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        '''DRF рендерит Response после всех process_template_response;
+        время до post-render callback — этап render.'''
+        timings = _current.get()
+        if timings is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                timings.sections['render'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, timings):
+        timings.sections['total'] = time.perf_counter() - timings.started
+        if timings.inspector is not None:
+            problems = timings.inspector.violations(
+                timings.queries, timings.budget,
+                timings.action or request.path)
+            if problems:
+                query_inspection.report(problems)
+        size = (None if isinstance(response, StreamingHttpResponse)
+                else len(response.content))
+        if self.show_timings(request):
+            response['Server-Timing'] = timings.server_timing(size)
+        registry.record(
+            (('endpoint', self.endpoint(request)),
+             ('method', request.method if request.method in METHODS
+              else 'other')),
+            timings.sections, timings.queries, size, response.status_code)
+        return response
+
+    @staticmethod
+    def show_timings(request):
+        '''Заголовок раскрывает устройство и нагрузку сервиса. DRF
+        передаёт пользователя, аутентифицированного по токену,
+        в request.user исходного запроса.'''
+        if settings.SERVER_TIMING:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    @staticmethod
+    def endpoint(request):
+        '''Имя маршрута, а не путь: у меток должно быть мало значений.'''
+        match = request.resolver_match
+        if match is None:
+            return 'unmatched'
+        return match.url_name or match.view_name
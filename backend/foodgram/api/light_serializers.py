@@ -0,0 +1,139 @@
+'''Представления для горячих списков без DRF-сериализаторов.
+
+На больших страницах рецептов, ингредиентов и подписок время уходит
+не на запросы, а на сериализаторы: для каждой строки обходятся поля
+RecipeSerializer и вложенных TagSerializer, UserSerializer,
+IngredientInRecipeSerializer. Здесь те же словари собираются напрямую
+из строк values() и словарей связей, загруженных одним запросом на
+страницу. Ключи, их порядок и значения совпадают с сериализаторами
+из api.serializers байт в байт — это проверяет команда
+check_read_serializers; меняя поля сериализатора, меняйте и функцию
+здесь.
+'''
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from rest_framework.response import Response
+
+from .relation_sets import user_sets
+from .serializers import IngredientSerializer, TagSerializer
+from recipes.models import RecipeIngredient, Tag
+
+USER_VALUES = ('email', 'id', 'username', 'first_name', 'last_name',
+               'recipes_count', 'followers_count')
+SUBSCRIPTION_VALUES = ('id', 'user_id', 'author_id', *(
+    f'author__{field}' for field in USER_VALUES))
+SHORT_RECIPE_VALUES = ('author_id', 'id', 'name', 'image', 'thumbnails',
+                       'cooking_time')
+
+
+def file_url(name, request=None):
+    '''Как ImageField.to_representation для имени файла.'''
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def thumbnail_urls(thumbnails, request=None):
+    return {size: file_url(name, request)
+            for size, name in thumbnails.items()}
+
+
+def recipe_tags(recipe_ids):
+    '''{id рецепта: [теги]}; тот же запрос и порядок строк, что у
+    prefetch_related('tags').'''
+    tags = defaultdict(list)
+    for row in Tag.objects.filter(recipes__id__in=recipe_ids).values(
+            *TagSerializer.Meta.fields, 'recipes__id'):
+        tags[row.pop('recipes__id')].append(row)
+    return tags
+
+
+def recipe_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for recipe_id, *values in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'):
+        ingredients[recipe_id].append(dict(zip(
+            ('id', 'name', 'measurement_unit', 'amount'), values)))
+    return ingredients
+
+
+def author_data(author, is_subscribed):
+    return {
+        'email': author.email,
+        'id': author.id,
+        'username': author.username,
+        'first_name': author.first_name,
+        'last_name': author.last_name,
+        'is_subscribed': is_subscribed,
+        'recipes_count': author.recipes_count,
+        'followers_count': author.followers_count,
+    }
+
+
+def recipes_data(recipes, request):
+    '''То же, что RecipeSerializer(recipes, many=True).data, для рецептов
+    с загруженным автором; теги и ингредиенты читаются здесь.'''
+    ids = [recipe.id for recipe in recipes]
+    tags = recipe_tags(ids)
+    ingredients = recipe_ingredients(ids)
+    sets = user_sets(request)
+    return [{
+        'id': recipe.id,
+        'tags': tags.get(recipe.id, []),
+        'author': author_data(
+            recipe.author, sets.is_subscribed(recipe.author_id)),
+        'ingredients': ingredients.get(recipe.id, []),
+        'is_favorited': sets.is_favorited(recipe.id),
+        'is_in_shopping_cart': sets.is_in_shopping_cart(recipe.id),
+        'favorites_count': recipe.favorites_count,
+        'in_carts_count': recipe.in_carts_count,
+        'name': recipe.name,
+        'image': file_url(recipe.image.name, request),
+        'thumbnails': thumbnail_urls(recipe.thumbnails, request),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    } for recipe in recipes]
+
+
+def subscriptions_data(rows, recipes, request):
+    '''То же, что SubscriptionSerializer(..., many=True).data, для строк
+    SUBSCRIPTION_VALUES; recipes — queryset последних рецептов авторов,
+    как в CustomUserViewSet.get_recent_recipes.'''
+    recent = defaultdict(list)
+    for recipe in recipes.filter(
+            author_id__in=[row['author_id'] for row in rows]
+    ).values(*SHORT_RECIPE_VALUES):
+        # ShortRecipeSerializer в SubscriptionSerializer строится без
+        # request, поэтому ссылки на картинки относительные.
+        recipe['image'] = file_url(recipe['image'])
+        recipe['thumbnails'] = thumbnail_urls(recipe['thumbnails'])
+        recent[recipe.pop('author_id')].append(recipe)
+    sets = user_sets(request)
+    return [{
+        'email': row['author__email'],
+        'id': row['author__id'],
+        'username': row['author__username'],
+        'first_name': row['author__first_name'],
+        'last_name': row['author__last_name'],
+        'is_subscribed': (row['user_id'] == request.user.id
+                          or sets.is_subscribed(row['author_id'])),
+        'recipes': recent.get(row['author_id'], []),
+        'recipes_count': row['author__recipes_count'],
+        'followers_count': row['author__followers_count'],
+    } for row in rows]
+
+
+class IngredientValuesMixin:
+    '''list ингредиентов строками values() вместо IngredientSerializer.'''
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *IngredientSerializer.Meta.fields)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(list(queryset))
+        return self.get_paginated_response(page)
@@ -0,0 +1,194 @@
+'''Сценарии нагрузочного теста API.
+
+Каждый сценарий — один эндпоинт из api/urls.py: анонимные списки и
+карточки, те же списки с токеном, переключатели избранного, корзины и
+подписок (добавление и сразу удаление, так что данные после прогона не
+меняются) и выгрузки списка покупок. Запросы идут от пользователя
+loadtest, которого Fixture создаёт с небольшим избранным, корзиной и
+подписками. Создание, изменение и удаление рецептов, загрузка картинок,
+регистрация, смена пароля и выход не нагружаются: они необратимо меняют
+базу или отзывают токен.
+'''
+import json
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from .benchmark import as_request
+from .documents import request_document
+from recipes import relations
+from recipes.models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscribe, User
+
+EMAIL = 'loadtest@example.com'
+PASSWORD = 'loadtest-password'
+FIXTURE_SIZE = 5
+BULK_SIZE = 10
+
+
+def get(path):
+    return lambda context: [path.format(**context)]
+
+
+def toggle(path, body=None):
+    '''POST и следом DELETE того же пути с тем же телом.'''
+    def requests(context):
+        path_ = path.format(**context)
+        body_ = body(context) if body else None
+        return [('POST', path_, body_), ('DELETE', path_, body_)]
+    return requests
+
+
+def post(path, body):
+    return lambda context: [('POST', path, body(context))]
+
+
+def bulk_body(context):
+    return {'recipes': context['recipes']}
+
+
+# Имя, нужен ли токен, запросы одного потока по его контексту.
+SCENARIOS = (
+    ('recipes', False, get('/api/recipes/')),
+    ('recipes?tags', False, get('/api/recipes/?tags={tag}&tags={tag2}')),
+    ('recipes?author', False, get('/api/recipes/?author={author}')),
+    ('recipe', False, get('/api/recipes/{recipe}/')),
+    ('recipes/changes', False,
+     get('/api/recipes/changes/?updated_since={since}')),
+    ('tags', False, get('/api/tags/')),
+    ('tag', False, get('/api/tags/{tag_id}/')),
+    ('ingredients?name', False, get('/api/ingredients/?name={prefix}')),
+    ('ingredient', False, get('/api/ingredients/{ingredient_id}/')),
+    ('users', False, get('/api/users/')),
+    ('auth/token/login', False, post(
+        '/api/auth/token/login/',
+        lambda context: {'email': EMAIL, 'password': PASSWORD})),
+    ('recipes', True, get('/api/recipes/')),
+    ('recipes?tags', True, get('/api/recipes/?tags={tag}&tags={tag2}')),
+    ('recipes?is_favorited', True, get('/api/recipes/?is_favorited=1')),
+    ('recipes?is_in_shopping_cart', True,
+     get('/api/recipes/?is_in_shopping_cart=1')),
+    ('recipe', True, get('/api/recipes/{recipe}/')),
+    ('users', True, get('/api/users/')),
+    ('user', True, get('/api/users/{author}/')),
+    ('users/me', True, get('/api/users/me/')),
+    ('users/subscriptions', True,
+     get('/api/users/subscriptions/?recipes_limit=3')),
+    ('subscribe', True, toggle('/api/users/{toggle_author}/subscribe/')),
+    ('favorite', True, toggle('/api/recipes/{toggle_recipe}/favorite/')),
+    ('shopping_cart', True,
+     toggle('/api/recipes/{toggle_recipe}/shopping_cart/')),
+    ('favorite (пачка)', True, toggle('/api/recipes/favorite/', bulk_body)),
+    ('shopping_cart (пачка)', True,
+     toggle('/api/recipes/shopping_cart/', bulk_body)),
+    ('shopping_list', True, get('/api/recipes/shopping_list/')),
+    ('download_shopping_cart', True,
+     get('/api/recipes/download_shopping_cart/')),
+    ('download_shopping_cart/jobs', True, post(
+        '/api/recipes/download_shopping_cart/jobs/',
+        lambda context: {'format': 'txt'})),
+    ('download_shopping_cart/jobs/<id>', True,
+     get('/api/recipes/download_shopping_cart/jobs/{job}/')),
+)
+
+
+def scenario_name(name, auth):
+    return f'{name} ({"токен" if auth else "аноним"})'
+
+
+class Fixture:
+    '''Пользователь loadtest и id из базы, которые подставляются в пути.
+    Переключатели каждого потока работают со своими рецептами и авторами,
+    чтобы параллельные потоки не мешали друг другу.'''
+
+    def __init__(self):
+        self.user = self.prepare_user()
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        recipes = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True)[:FIXTURE_SIZE * 2 + 1000])
+        authors = list(User.objects.filter(
+            Exists(Recipe.objects.filter(author=OuterRef('pk')))
+        ).exclude(id=self.user.id).order_by('id').values_list(
+            'id', flat=True)[:FIXTURE_SIZE + 1000])
+        if not recipes or not authors:
+            raise ValueError(
+                'В базе нет рецептов других пользователей; заполните её '
+                'командой seed_synthetic.')
+        self.fill(Favourite, recipes[:FIXTURE_SIZE])
+        self.fill(ShoppingCart, recipes[FIXTURE_SIZE:FIXTURE_SIZE * 2])
+        Subscribe.objects.filter(user=self.user).exclude(
+            author_id__in=authors[:FIXTURE_SIZE]).delete()
+        for author_id in authors[:FIXTURE_SIZE]:
+            Subscribe.objects.get_or_create(
+                user=self.user, author_id=author_id)
+        self.toggle_recipes = recipes[FIXTURE_SIZE * 2:] or recipes
+        self.toggle_authors = authors[FIXTURE_SIZE:] or authors
+        tags = list(Tag.objects.order_by('id').values_list('id', 'slug'))
+        ingredient = Ingredient.objects.order_by('id').first()
+        updated = Recipe.objects.order_by('-updated_at').values_list(
+            'updated_at', flat=True)
+        job, _ = request_document(self.user, 'txt')
+        self.common = {
+            'recipe': recipes[0],
+            'author': authors[0],
+            'tag_id': tags[0][0] if tags else 0,
+            'tag': tags[0][1] if tags else '',
+            'tag2': tags[-1][1] if tags else '',
+            'ingredient_id': ingredient.id if ingredient else 0,
+            'prefix': ingredient.name[:2] if ingredient else 'а',
+            'since': updated[min(FIXTURE_SIZE, len(recipes) - 1)].isoformat(),
+            'job': job.id,
+        }
+
+    @staticmethod
+    def prepare_user():
+        user = User.objects.filter(email=EMAIL).first()
+        if user is None:
+            user = User.objects.create_user(
+                email=EMAIL, username='loadtest', first_name='Нагрузочный',
+                last_name='Тест', password=PASSWORD)
+        elif not user.check_password(PASSWORD):
+            user.set_password(PASSWORD)
+            user.save(update_fields=['password'])
+        return user
+
+    def fill(self, model, recipe_ids):
+        '''Оставляет у пользователя ровно recipe_ids.'''
+        extra = set(relations.recipe_ids(model, self.user.id)) - set(
+            recipe_ids)
+        relations.remove(model, self.user.id, extra)
+        relations.add(model, self.user.id, recipe_ids)
+
+    def context(self, worker):
+        start = worker * BULK_SIZE % len(self.toggle_recipes)
+        return {
+            **self.common,
+            'toggle_recipe': self.toggle_recipes[
+                worker % len(self.toggle_recipes)],
+            'toggle_author': self.toggle_authors[
+                worker % len(self.toggle_authors)],
+            'recipes': self.toggle_recipes[start:start + BULK_SIZE],
+        }
+
+    def headers(self, auth):
+        return {'Authorization': f'Token {self.token}'} if auth else {}
+
+    def count_queries(self, requests, auth):
+        '''Число SQL-запросов на каждый запрос сценария внутри процесса;
+        сценарий выполняется дважды, считается второй, прогретый раз.'''
+        client = Client(headers=self.headers(auth),
+                        raise_request_exception=False)
+        counts = []
+        for _ in range(2):
+            counts = []
+            for method, path, body in map(as_request, requests):
+                with CaptureQueriesContext(connection) as queries:
+                    client.generic(
+                        method, path,
+                        data='' if body is None else json.dumps(body),
+                        content_type='application/json')
+                counts.append(len(queries))
+        return counts
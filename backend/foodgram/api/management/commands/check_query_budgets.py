@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.benchmark import as_request
+from api.loadtest import SCENARIOS, Fixture, scenario_name
+from api.query_inspection import STRICT, QueryInspectionError
+
+
+class Command(BaseCommand):
+    help = ('Выполняет сценарии нагрузочного теста внутри процесса '
+            'в строгом режиме QUERY_INSPECTION и завершается с ошибкой, '
+            'если действие превысило бюджет SQL-запросов или повторяет '
+            'один запрос в цикле.')
+
+    def handle(self, *args, **options):
+        try:
+            fixture = Fixture()
+        except ValueError as error:
+            raise CommandError(error)
+        failures = []
+        with override_settings(QUERY_INSPECTION=STRICT):
+            for name, auth, requests in SCENARIOS:
+                name = scenario_name(name, auth)
+                counts, problems = self.run(
+                    fixture, requests(fixture.context(0)), auth)
+                failures += problems
+                self.stdout.write(
+                    f'{name}: {"/".join(map(str, counts))}'
+                    + (' — превышение' if problems else ''))
+        if failures:
+            raise CommandError(
+                'Нарушения бюджетов SQL-запросов:\n'
+                + '\n'.join(dict.fromkeys(failures)))
+        self.stdout.write(self.style.SUCCESS(
+            'Все действия укладываются в бюджеты SQL-запросов.'))
+
+    @staticmethod
+    def run(fixture, requests, auth):
+        '''Выполняет запросы сценария дважды — с холодным и прогретым
+        кешем; возвращает наибольшее число SQL-запросов на каждый
+        запрос сценария и нарушения.'''
+        client = Client(headers=fixture.headers(auth))
+        counts = [0] * len(requests)
+        problems = []
+        for _ in range(2):
+            for step, (method, path, body) in enumerate(
+                    map(as_request, requests)):
+                with CaptureQueriesContext(connection) as queries:
+                    try:
+                        client.generic(
+                            method, path,
+                            data='' if body is None else json.dumps(body),
+                            content_type='application/json')
+                    except QueryInspectionError as error:
+                        problems.append(str(error))
+                counts[step] = max(counts[step], len(queries))
+        return counts, problems
@@ -0,0 +1,132 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.loadtest import Fixture
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)')
+# Проход по результату подзапроса (COUNT(*) по DISTINCT-выборке, qualify,
+# которым Django фильтрует оконные функции) — не проход по таблице:
+# чтения внутри подзапроса видны в плане отдельными строками.
+DERIVED_TABLES = frozenset(('subquery', 'qualify'))
+# Кэш выключен, чтобы представления выполняли все свои запросы.
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def endpoint_requests(context):
+    '''GET-запросы горячих путей API: имя, путь, нужен ли токен,
+    таблицы, полный проход по которым допустим (например, чтение по
+    порядку первичного ключа с LIMIT или COUNT(*) для пагинации),
+    и, если проверка имеет смысл не везде, базы, где её выполнять:
+    SQLite, например, не использует индекс для LIKE с ESCAPE.'''
+    return [
+        ('recipes: список', '/api/recipes/', False, {'recipes_recipe'}),
+        ('recipes: по автору', f'/api/recipes/?author={context["author"]}',
+         False, ()),
+        ('recipes: по тегам',
+         f'/api/recipes/?tags={context["tag"]}&tags={context["tag2"]}',
+         False, {'recipes_recipe'}),
+        ('recipes: избранное', '/api/recipes/?is_favorited=1', True, ()),
+        ('recipes: в корзине', '/api/recipes/?is_in_shopping_cart=1', True,
+         ()),
+        ('recipes: карточка', f'/api/recipes/{context["recipe"]}/', True,
+         ()),
+        ('recipes: changes',
+         f'/api/recipes/changes/?updated_since={context["since"]}', False,
+         ()),
+        ('recipes: поиск', '/api/recipes/?search=блины', False,
+         {'recipes_recipe'}, ('postgresql',)),
+        ('tags: список', '/api/tags/', False, {'recipes_tag'}),
+        ('ingredients: поиск по префиксу',
+         f'/api/ingredients/?name={context["prefix"]}', False,
+         {'recipes_ingredient'}),
+        ('users: список', '/api/users/', False, {'users_user'}),
+        ('shopping list: чтение', '/api/recipes/shopping_list/', True, ()),
+        ('shopping list: выгрузка', '/api/recipes/download_shopping_cart/',
+         True, ()),
+        ('subscriptions: страница',
+         '/api/users/subscriptions/?recipes_limit=3', True, ()),
+    ]
+
+
+def executed_selects(client, path):
+    '''SELECT-запросы, которые выполнило представление по пути path.'''
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    if response.status_code != 200:
+        raise CommandError(f'{path}: ответ {response.status_code}.')
+    return [query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')]
+
+
+def explain(sql):
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return postgresql_seq_scans(plan[0]['Plan'])
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return {
+                match.group(1) for *_, detail in cursor.fetchall()
+                for match in [SQLITE_SCAN.match(detail)] if match
+            } - DERIVED_TABLES
+    raise CommandError(
+        f'Проверка планов для {connection.vendor} не поддерживается.')
+
+
+def postgresql_seq_scans(node):
+    '''С enable_seqscan = off планировщик выбирает Seq Scan только тогда,
+    когда подходящего индекса нет, поэтому результат не зависит
+    от объёма данных и собранной статистики.'''
+    scans = set()
+    if node['Node Type'] == 'Seq Scan':
+        scans.add(node['Relation Name'])
+    for child in node.get('Plans', ()):
+        scans |= postgresql_seq_scans(child)
+    return scans
+
+
+class Command(BaseCommand):
+    help = ('Выполняет GET-запросы горячих путей API внутри процесса, '
+            'делает EXPLAIN для каждого SQL-запроса представлений '
+            'и завершается с ошибкой, если какой-либо из них читает таблицу '
+            'целиком. Нужна заполненная база (seed_synthetic).')
+
+    def handle(self, *args, **options):
+        try:
+            fixture = Fixture()
+        except ValueError as error:
+            raise CommandError(error)
+        failures = []
+        with override_settings(CACHES=NO_CACHE):
+            for name, path, auth, allowed, *vendors in endpoint_requests(
+                    fixture.context(0)):
+                if vendors and connection.vendor not in vendors[0]:
+                    continue
+                client = Client(headers=fixture.headers(auth))
+                scans = set().union(*map(
+                    explain, executed_selects(client, path))) - set(allowed)
+                if scans:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: полный проход по '
+                        f'{", ".join(sorted(scans))}'))
+                else:
+                    self.stdout.write(f'{name}: OK')
+        if failures:
+            raise CommandError(
+                f'Запросов без подходящего индекса: {len(failures)}.')
+        self.stdout.write(
+            self.style.SUCCESS('Все запросы используют индексы.'))
@@ -0,0 +1,131 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.fragments import display_queryset
+from api.light_serializers import recipes_data, subscriptions_data
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             SubscriptionSerializer)
+from api.views import CustomUserViewSet
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+def make_request(user, path='/'):
+    request = Request(RequestFactory().get(path))
+    request.user = user
+    return request
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает ответы api.light_serializers с DRF-сериализаторами '
+            'на данных из базы и завершается с ошибкой, если они '
+            'отличаются хоть на байт; с --benchmark печатает время '
+            'процессора на 100 строк для обоих путей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=100,
+            help='Строк в каждой проверке.')
+        parser.add_argument('--benchmark', action='store_true')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Повторов каждого пути для --benchmark.')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        failures = []
+        for name, serializer, light, count in self.cases(rows):
+            expected = JSONRenderer().render(serializer())
+            actual = JSONRenderer().render(light())
+            if expected != actual:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: ответы различаются\n'
+                    f'  сериализатор: {expected[:300]}\n'
+                    f'  values():     {actual[:300]}'))
+                continue
+            line = f'{name}: {count} строк, {len(expected)} байт совпадают'
+            if options['benchmark'] and count:
+                before, after = (
+                    self.cpu_time(build, options['repeat']) * 100 / count
+                    for build in (serializer, light))
+                line += (f'; на 100 строк {before:.1f} → {after:.1f} мс '
+                         f'процессора (−{before - after:.1f})')
+            self.stdout.write(line)
+        if failures:
+            raise CommandError(
+                f'Ответы values() отличаются от сериализаторов: '
+                f'{", ".join(failures)}.')
+        self.stdout.write(self.style.SUCCESS(
+            'Ответы values() совпадают с сериализаторами.'))
+
+    @staticmethod
+    def cpu_time(build, repeat):
+        '''Время процессора на один вызов build в мс — вместе с чтением
+        строк из базы, которое каждому пути нужно своё.'''
+        started = time.process_time()
+        for _ in range(repeat):
+            build()
+        return (time.process_time() - started) / repeat * 1000
+
+    def cases(self, rows):
+        '''(имя, ответ сериализатора, ответ values(), число строк).'''
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:rows])
+        viewer = User.objects.annotate(
+            favorites_total=Count('favorites')
+        ).order_by('-favorites_total').first()
+        for user in (AnonymousUser(), viewer):
+            if user is None:
+                continue
+            request = make_request(user)
+            label = 'аноним' if user.is_anonymous else f'user {user.id}'
+
+            def serializer(request=request):
+                return RecipeSerializer(
+                    Recipe.objects.for_display().filter(id__in=recipe_ids),
+                    many=True, context={'request': request}).data
+
+            def light(request=request):
+                return recipes_data(
+                    list(display_queryset().filter(id__in=recipe_ids)),
+                    request)
+
+            yield f'recipes ({label})', serializer, light, len(recipe_ids)
+
+        yield ('ingredients',
+               lambda: IngredientSerializer(
+                   Ingredient.objects.all()[:rows], many=True).data,
+               lambda: list(Ingredient.objects.values(
+                   *IngredientSerializer.Meta.fields)[:rows]),
+               Ingredient.objects.all()[:rows].count())
+
+        follower = User.objects.annotate(
+            subscriptions_total=Count('follower')
+        ).order_by('-subscriptions_total').first()
+        if follower is None:
+            return
+        for limit in ('', '3'):
+            view = CustomUserViewSet()
+            view.request = make_request(
+                follower, f'/?recipes_limit={limit}')
+            count = view.get_subscription_rows(
+                user=follower)[:rows].count()
+
+            def serializer(view=view):
+                return SubscriptionSerializer(
+                    view.get_subscriptions(user=follower)[:rows],
+                    many=True, context={'request': view.request}).data
+
+            def light(view=view):
+                return subscriptions_data(
+                    list(view.get_subscription_rows(user=follower)[:rows]),
+                    view.get_recent_recipes(), view.request)
+
+            yield (f'subscriptions (recipes_limit={limit or "все"})',
+                   serializer, light, count)
@@ -0,0 +1,120 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api import cache
+from api.ingredient_index import invalidate
+from recipes import catalog_import, counters, shopping_list
+from users.models import User
+
+SUFFIXES = {
+    '.json': catalog_import.JSON,
+    '.ndjson': catalog_import.NDJSON,
+    '.jsonl': catalog_import.NDJSON,
+    '.csv': catalog_import.CSV,
+}
+ORDER = (catalog_import.INGREDIENT, catalog_import.TAG,
+         catalog_import.RECIPE)
+NAMES = {
+    catalog_import.INGREDIENT: 'Ингредиенты',
+    catalog_import.TAG: 'Теги',
+    catalog_import.RECIPE: 'Рецепты',
+}
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты, теги и рецепты из JSON, NDJSON или CSV '
+            'пачками; повторная загрузка того же файла ничего '
+            'не дублирует.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с записями.')
+        parser.add_argument(
+            '--format', choices=catalog_import.FORMATS,
+            help='Формат файла; по умолчанию — по расширению.')
+        parser.add_argument(
+            '--model', choices=catalog_import.MODELS,
+            default=catalog_import.INGREDIENT,
+            help='Тип записей без поля "model" (не фикстур loaddata).')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or SUFFIXES.get(path.suffix.lower())
+        if file_format is None:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        self.importer = catalog_import.CatalogImporter(options['database'])
+        self.savers = {
+            catalog_import.INGREDIENT: self.importer.save_ingredients,
+            catalog_import.TAG: self.importer.save_tags,
+            catalog_import.RECIPE: self.importer.save_recipes,
+        }
+        self.batches = {model: [] for model in ORDER}
+        self.saved = dict.fromkeys(ORDER, 0)
+        self.skipped = 0
+        self.started = time.monotonic()
+
+        try:
+            with path.open(encoding='utf-8', newline='') as file:
+                for model, fields in catalog_import.read_records(
+                        file, file_format, options['model']):
+                    batch = self.batches[model]
+                    batch.append(fields)
+                    if len(batch) >= options['batch_size']:
+                        self.flush(model)
+            for model in ORDER:
+                self.flush(model)
+        except (OSError, ValueError, KeyError) as error:
+            # Сохранённые пачки остаются в базе, а производные данные
+            # обновит повторный импорт исправленного файла.
+            raise CommandError(
+                f'Ошибка импорта: {error!r}. Сохранено записей: '
+                f'{sum(self.saved.values())}; повторите импорт после '
+                f'исправления файла — дубликатов он не создаст.'
+            ) from error
+        self.refresh_derived_data()
+
+        total = sum(self.saved.values())
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с); '
+            f'пропущено без автора: {self.skipped}.'))
+
+    def flush(self, model):
+        '''Рецепты ссылаются на ингредиенты и теги, поэтому перед пачкой
+        рецептов сохраняются накопленные записи остальных типов.'''
+        for dependency in ORDER[:ORDER.index(model)]:
+            self.flush(dependency)
+        batch = self.batches[model]
+        if not batch:
+            return
+        skipped = self.savers[model](batch) or 0
+        self.skipped += skipped
+        self.saved[model] += len(batch) - skipped
+        self.batches[model] = []
+        elapsed = time.monotonic() - self.started
+        done = sum(self.saved.values())
+        self.stdout.write(
+            f'{NAMES[model]}: {self.saved[model]}; всего {done} '
+            f'({done / max(elapsed, 1e-6):.0f} строк/с)')
+
+    def refresh_derived_data(self):
+        '''Пачки пишутся мимо сигналов моделей, поэтому производные
+        данные обновляются здесь: индекс ингредиентов, кэш ответов,
+        счётчики рецептов авторов и списки покупок тех, у кого
+        изменённые рецепты в корзине.'''
+        invalidate()
+        cache.bump_catalog()
+        counters.reconcile(User.objects.filter(
+            id__in=self.importer.author_ids_seen), 'recipes_count')
+        user_ids = sorted(self.importer.cart_user_ids)
+        for start in range(0, len(user_ids), 500):
+            shopping_list.rebuild(user_ids[start:start + 500])
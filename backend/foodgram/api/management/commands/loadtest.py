@@ -0,0 +1,182 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import (run_load, start_server, stop_servers,
+                           wait_until_ready)
+from api.loadtest import SCENARIOS, Fixture, scenario_name
+
+COLUMNS = ('requests', 'errors', 'rps', 'p50', 'p95', 'p99', 'queries')
+BASELINE = os.path.join(settings.BASE_DIR, 'loadtest_baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Нагружает эндпоинты API, считает пропускную способность, '
+            'задержки и SQL-запросы и сравнивает их с базовым прогоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8003')
+        parser.add_argument(
+            '--server', choices=('wsgi', 'runserver'),
+            help='Запустить сервер на адресе из --url и остановить после '
+                 'прогона; без опции нагружается уже запущенный сервер.')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Воркеров gunicorn (для --server wsgi).')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Запросов на каждый сценарий.')
+        parser.add_argument(
+            '--warmup', type=int, default=50,
+            help='Запросов на прогрев перед каждым сценарием.')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Прогнать только сценарии с этим началом имени; можно '
+                 'повторять.')
+        parser.add_argument('--baseline', default=BASELINE)
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Записать результаты прогона в файл базового прогона.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимое ухудшение rps, p95 и p99 (доля).')
+        parser.add_argument(
+            '--slack', type=float, default=5,
+            help='Рост задержки в мс, который не считается регрессией, '
+                 'даже если превышает --tolerance.')
+
+    def handle(self, *args, **options):
+        scenarios = [
+            (scenario_name(name, auth), auth, requests)
+            for name, auth, requests in SCENARIOS
+            if not options['scenarios'] or any(
+                scenario_name(name, auth).startswith(prefix)
+                for prefix in options['scenarios'])
+        ]
+        if not scenarios:
+            raise CommandError('Нет сценариев с такими именами.')
+        try:
+            fixture = Fixture()
+        except ValueError as error:
+            raise CommandError(error)
+        url = options['url']
+        servers = []
+        if options['server']:
+            try:
+                servers.append(start_server(
+                    options['server'], url, options['workers'],
+                    settings.BASE_DIR))
+            except RuntimeError as error:
+                raise CommandError(error)
+        try:
+            if not wait_until_ready(url, '/api/tags/'):
+                raise CommandError(f'Сервер {url} не отвечает.')
+            results = {
+                name: self.run(fixture, auth, requests, options)
+                for name, auth, requests in scenarios
+            }
+        finally:
+            stop_servers(servers)
+        self.report(results, options)
+        if options['update_baseline']:
+            with open(options['baseline'], 'w') as file:
+                json.dump({
+                    'concurrency': options['concurrency'],
+                    'requests': options['requests'],
+                    'scenarios': results,
+                }, file, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(
+                f'Базовый прогон записан в {options["baseline"]}.')
+            return
+        self.compare(results, options)
+
+    def run(self, fixture, auth, requests, options):
+        if options['verbosity'] > 1:
+            self.stdout.write(f'  {requests(fixture.context(0))}')
+        headers = fixture.headers(auth)
+
+        def plan(worker):
+            return requests(fixture.context(worker))
+
+        run_load(options['url'], plan, options['concurrency'],
+                 options['warmup'], headers)
+        summary = run_load(options['url'], plan, options['concurrency'],
+                           options['requests'], headers).summary()
+        summary['queries'] = fixture.count_queries(
+            requests(fixture.context(0)), auth)
+        return summary
+
+    def report(self, results, options):
+        self.stdout.write(
+            f'{options["requests"]} запросов на сценарий, '
+            f'{options["concurrency"]} одновременно; задержки в мс, '
+            f'queries — SQL-запросов на каждый запрос сценария.')
+        self.stdout.write(self.row('', COLUMNS))
+        for name, summary in results.items():
+            self.stdout.write(self.row(name, self.values(summary)))
+
+    def compare(self, results, options):
+        try:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(
+                f'Нет базового прогона {options["baseline"]}; запишите его '
+                f'с --update-baseline.'))
+            return
+        if (baseline['concurrency'], baseline['requests']) != (
+                options['concurrency'], options['requests']):
+            self.stdout.write(self.style.WARNING(
+                f'Базовый прогон снят с --concurrency '
+                f'{baseline["concurrency"]} и --requests '
+                f'{baseline["requests"]}: задержки сравнимы лишь примерно.'))
+        regressions = []
+        for name, summary in results.items():
+            before = baseline['scenarios'].get(name)
+            if before is not None:
+                regressions += [
+                    f'{name}: {problem}'
+                    for problem in self.regressions(before, summary, options)
+                ]
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базового прогона:\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно базового прогона нет.'))
+
+    @staticmethod
+    def regressions(before, after, options):
+        tolerance = options['tolerance']
+        if after['errors'] > before['errors']:
+            yield f'ошибок {before["errors"]} → {after["errors"]}'
+        if len(after['queries']) > len(before['queries']) or any(
+                new > old for old, new in zip(before['queries'],
+                                              after['queries'])):
+            yield f'SQL-запросов {before["queries"]} → {after["queries"]}'
+        if after['rps'] < before['rps'] * (1 - tolerance):
+            yield f'rps {before["rps"]:.1f} → {after["rps"]:.1f}'
+        for column in ('p95', 'p99'):
+            old, new = before[column], after[column]
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > options['slack']:
+                yield f'{column} {old:.1f} → {new:.1f} мс'
+
+    @staticmethod
+    def values(summary):
+        return [
+            '—' if summary[column] is None
+            else '/'.join(map(str, summary[column]))
+            if isinstance(summary[column], list)
+            else f'{summary[column]:.1f}' if isinstance(summary[column], float)
+            else str(summary[column])
+            for column in COLUMNS
+        ]
+
+    @staticmethod
+    def row(title, values):
+        return f'{title:<48}' + ''.join(f'{value:>10}' for value in values)
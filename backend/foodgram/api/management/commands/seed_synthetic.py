@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api import cache
+from api.ingredient_index import invalidate
+from recipes import synthetic
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, подписками, '
+            'рецептами, избранным и корзинами; при том же зерне и размерах '
+            'данные получаются те же. Пароль пользователей — '
+            f'«{synthetic.PASSWORD}».')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--tags', type=int, default=10,
+            help='Сколько тегов должно быть в базе; недостающие создаются.')
+        parser.add_argument(
+            '--ingredients', type=int, default=1000,
+            help='Сколько ингредиентов должно быть в базе; недостающие '
+                 'создаются.')
+        parser.add_argument(
+            '--subscriptions', type=float, default=5,
+            help='Подписок на пользователя в среднем.')
+        parser.add_argument(
+            '--favorites', type=float, default=10,
+            help='Рецептов в избранном у пользователя в среднем.')
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='Рецептов в корзине у пользователя в среднем.')
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько картинок-заглушек создать в media/recipes; '
+                 'рецепты ссылаются на них по кругу. Миниатюры потом '
+                 'делает generate_thumbnails.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        started = time.monotonic()
+
+        def log(message):
+            self.stdout.write(
+                f'{message} ({time.monotonic() - started:.1f} с)')
+
+        seeder = synthetic.SyntheticSeeder(
+            options['seed'], options['database'], options['batch_size'], log)
+        try:
+            user_ids, recipe_ids = seeder.run(
+                options['users'], options['recipes'], options['tags'],
+                options['ingredients'], options['subscriptions'],
+                options['favorites'], options['carts'], options['images'])
+        except synthetic.SyntheticError as error:
+            raise CommandError(error)
+        finally:
+            invalidate()
+            cache.bump_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, рецептов: '
+            f'{len(recipe_ids)} за {time.monotonic() - started:.1f} с.'))
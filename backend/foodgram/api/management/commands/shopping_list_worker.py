@@ -0,0 +1,59 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import documents
+
+
+class Command(BaseCommand):
+    help = ('Собирает файлы списков покупок, заказанные через '
+            'POST /api/recipes/download_shopping_cart/jobs/.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов; каждый собирает по одному файлу.')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунд.')
+        parser.add_argument(
+            '--timeout', type=int, default=600,
+            help='Через сколько секунд без сигнала от воркера заказ '
+                 'считается брошенным и возвращается в очередь.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти.')
+
+    def handle(self, *args, **options):
+        if options['timeout'] <= documents.HEARTBEAT_INTERVAL:
+            raise CommandError(
+                f'--timeout должен быть больше интервала сигналов '
+                f'воркера ({documents.HEARTBEAT_INTERVAL} с).')
+        if options['workers'] == 1:
+            self.work(options)
+            return
+        # Дочерние процессы не должны делить соединения родителя.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=self.work, args=(options,))
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    def work(self, options):
+        worker = documents.worker_name()
+        while True:
+            documents.requeue_stale(options['timeout'])
+            job = documents.next_job(worker)
+            if job is not None:
+                status = documents.run(job)
+                self.stdout.write(f'Заказ {job.id}: {status}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,207 @@
+'''Гистограммы по эндпоинтам в текстовом формате Prometheus.
+
+Каждый процесс копит значения в памяти — запрос платит только за
+несколько сложений под блокировкой — и не чаще раза
+в METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл
+в METRICS_DIR. /metrics складывает файлы всех живых воркеров, поэтому
+неважно, какой из них ответил на запрос сборщика. Файлы завершившихся
+процессов удаляет первый сброс каждого нового воркера. Отдаются метрики
+только с заголовком Authorization: Bearer <METRICS_TOKEN>; без токена
+в настройках эндпоинт выключен.
+'''
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUEST_SECONDS = 'foodgram_request_seconds'
+REQUEST_QUERIES = 'foodgram_request_queries'
+RESPONSE_BYTES = 'foodgram_response_bytes'
+REQUESTS_TOTAL = 'foodgram_requests_total'
+
+# Имя: тип, описание, границы корзин гистограммы.
+METRICS = {
+    REQUEST_SECONDS: (
+        'histogram', 'Время обработки запроса по этапам (section).',
+        SECONDS_BUCKETS),
+    REQUEST_QUERIES: (
+        'histogram', 'SQL-запросов на запрос.', QUERIES_BUCKETS),
+    RESPONSE_BYTES: (
+        'histogram', 'Размер тела ответа в байтах.', BYTES_BUCKETS),
+    REQUESTS_TOTAL: ('counter', 'Ответов по кодам статуса.', None),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+
+class Registry:
+    '''Серии метрик процесса: для гистограммы — число наблюдений в каждой
+    корзине (последняя — +Inf) и сумма, для счётчика — значение.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.flushed_at = time.monotonic()
+        # Процесс, который уже убрал чужие устаревшие файлы: после fork
+        # у потомка другой pid, и уборку он сделает заново.
+        self.cleaned_by = None
+
+    def _observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        series = self.series.get((name, labels))
+        if series is None:
+            series = self.series[name, labels] = [0] * (len(buckets) + 2)
+        series[bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+    def record(self, labels, sections, queries, size, status):
+        '''Один обработанный запрос: sections — {этап: секунды}.'''
+        with self.lock:
+            for section, seconds in sections.items():
+                self._observe(REQUEST_SECONDS,
+                              (*labels, ('section', section)), seconds)
+            self._observe(REQUEST_QUERIES, labels, queries)
+            if size is not None:
+                self._observe(RESPONSE_BYTES, labels, size)
+            self.series.setdefault(
+                (REQUESTS_TOTAL, (*labels, ('status', str(status)))), [0]
+            )[0] += 1
+            due = (time.monotonic() - self.flushed_at
+                   >= settings.METRICS_FLUSH_INTERVAL)
+            if due:
+                self.flushed_at = time.monotonic()
+                snapshot = self.snapshot()
+        if due:
+            try:
+                self.flush(snapshot)
+            except OSError:
+                logger.exception('Не удалось сохранить метрики процесса')
+
+    def snapshot(self):
+        return [[name, [list(pair) for pair in labels], list(series)]
+                for (name, labels), series in self.series.items()]
+
+    def flush(self, snapshot):
+        '''Пишет значения процесса в его файл; замена файла атомарна,
+        так что /metrics не увидит его наполовину записанным.'''
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.cleaned_by != os.getpid():
+            remove_stale_files(directory)
+            self.cleaned_by = os.getpid()
+        temporary = directory / f'{os.getpid()}.tmp'
+        temporary.write_text(json.dumps(snapshot))
+        os.replace(temporary, directory / f'{os.getpid()}.json')
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def file_pid(path):
+    return int(path.stem) if path.stem.isdigit() else None
+
+
+def remove_stale_files(directory):
+    '''Удаляет файлы процессов, которых больше нет: перезапущенных
+    воркеров и прошлых запусков сервера.'''
+    for path in directory.iterdir():
+        pid = file_pid(path)
+        if pid is not None and not process_alive(pid):
+            path.unlink(missing_ok=True)
+
+
+registry = Registry()
+
+
+def collect():
+    '''Сумма серий всех процессов: свой — из памяти, остальные —
+    из файлов.'''
+    with registry.lock:
+        snapshots = [registry.snapshot()]
+    own = f'{os.getpid()}.json'
+    directory = Path(settings.METRICS_DIR)
+    for path in directory.glob('*.json') if directory.is_dir() else ():
+        pid = file_pid(path)
+        if path.name == own or pid is None or not process_alive(pid):
+            continue
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    total = {}
+    for snapshot in snapshots:
+        for name, labels, series in snapshot:
+            key = (name, tuple(map(tuple, labels)))
+            if key not in total:
+                total[key] = list(series)
+            else:
+                total[key] = [a + b for a, b in zip(total[key], series)]
+    return total
+
+
+def format_labels(labels):
+    def escape(value):
+        return (value.replace('\\', r'\\').replace('"', r'\"')
+                .replace('\n', r'\n'))
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+def render(series):
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (series_name, labels), values in sorted(series.items()):
+            if series_name != name:
+                continue
+            if kind == 'counter':
+                lines.append(f'{name}{{{format_labels(labels)}}} {values[0]}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), values):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{'
+                    f'{format_labels((*labels, ("le", str(bound))))}}} '
+                    f'{cumulative}')
+            lines.append(f'{name}_sum{{{format_labels(labels)}}} '
+                         f'{values[-1]}')
+            lines.append(f'{name}_count{{{format_labels(labels)}}} '
+                         f'{cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode(), settings.METRICS_TOKEN.encode())
+
+
+def metrics_view(request):
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not authorized(request):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -1,6 +1,87 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+
+from recipes.paginator import ApproximateCountPaginator, approximate_count
+
+APPROXIMATE = 'approximate'
 
 
 class PageLimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param) == APPROXIMATE:
+            self.django_paginator_class = ApproximateCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CursorLimitPagination(CursorPagination):
+    '''Пагинация по ключу: без COUNT(*) и без OFFSET, поэтому глубокие
+    страницы стоят столько же, сколько первая. Число записей отдаётся
+    только по ?count=approximate и только оценкой.'''
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+    ordering = '-id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) == APPROXIMATE:
+            self.count = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        '''Всегда ordering пагинатора: CursorPagination взял бы его
+        у OrderingFilter представления, а без ?ordering= тот вернул бы
+        None.'''
+        if isinstance(self.ordering, str):
+            return (self.ordering,)
+        return tuple(self.ordering)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+            response.data.move_to_end('count', last=False)
+        return response
+
+
+class SelectablePagination(BasePagination):
+    '''Номера страниц по умолчанию, курсор — по ?pagination=cursor.
+    Поле ключа курсора берётся из cursor_ordering представления; курсор
+    держится только на нём, поэтому сортировку по релевантности поиска
+    и ?ordering= с ним не совмещаем.'''
+
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    ordering_query_params = ('search', 'ordering')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == self.cursor_mode:
+            conflicts = [param for param in self.ordering_query_params
+                         if request.query_params.get(param)]
+            if conflicts:
+                raise ValidationError({
+                    param: 'Не поддерживается вместе с '
+                           f'{self.mode_query_param}={self.cursor_mode}.'
+                    for param in conflicts
+                })
+            self.paginator = CursorLimitPagination()
+            self.paginator.ordering = getattr(
+                view, 'cursor_ordering', self.paginator.ordering)
+        else:
+            self.paginator = PageLimitPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PageLimitPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return PageLimitPagination().get_schema_operation_parameters(view)
@@ -0,0 +1,124 @@
+'''Поиск N+1 и бюджеты запросов к базе.
+
+Для проверяемого запроса каждый SQL сводится к «форме» — без литералов
+и с IN (...) любой длины, — и формы считаются. Форма, повторённая
+больше QUERY_REPEAT_LIMIT раз, — признак запроса в цикле; на первом
+лишнем повторе запоминаются поле сериализатора, которое его вызвало,
+и стек кода проекта. Кроме того, у ViewSet'а в query_budgets можно
+задать бюджет запросов для действия.
+
+Режим QUERY_INSPECTION: strict — проверяется каждый запрос, а
+нарушение поднимает QueryInspectionError (для тестов и
+check_query_budgets); sample — проверяется доля
+QUERY_INSPECTION_SAMPLE_RATE запросов, нарушения пишутся в лог;
+off — проверок нет.
+'''
+import logging
+import os
+import random
+import re
+import sys
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.serializers import Serializer
+
+OFF = 'off'
+SAMPLE = 'sample'
+STRICT = 'strict'
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+SPACES = re.compile(r'\s+')
+
+SERIALIZE_FIELDS = Serializer.to_representation.__code__
+# Кадры самой проверки и обёрток api.instrumentation в стек не попадают.
+INTERNAL_FILES = frozenset(
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('query_inspection.py', 'instrumentation.py'))
+
+logger = logging.getLogger(__name__)
+
+
+class QueryInspectionError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    sql = LITERALS.sub('?', sql)
+    sql = IN_LISTS.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def serializer_fields(frame):
+    '''Поля сериализаторов, которые сейчас выводятся, от внешнего
+    к внутреннему: «RecipeSerializer.author → UserSerializer.email».'''
+    fields = []
+    while frame is not None:
+        if frame.f_code is SERIALIZE_FIELDS:
+            serializer = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if field is not None:
+                fields.append(
+                    f'{type(serializer).__name__}.{field.field_name}')
+        frame = frame.f_back
+    return ' → '.join(reversed(fields))
+
+
+def project_stack(frame):
+    '''Кадры кода проекта, без библиотек и INTERNAL_FILES.'''
+    return [
+        f'{entry.filename[len(settings.BASE_DIR) + 1:]}:{entry.lineno} '
+        f'в {entry.name}'
+        for entry in traceback.extract_stack(frame)
+        if entry.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in entry.filename
+        and entry.filename not in INTERNAL_FILES
+    ]
+
+
+class QueryInspector:
+    def __init__(self, limit):
+        self.limit = limit
+        self.shapes = Counter()
+        self.culprits = {}
+
+    def record(self, sql):
+        shape = fingerprint(sql)
+        self.shapes[shape] += 1
+        if self.shapes[shape] == self.limit + 1:
+            frame = sys._getframe(2)
+            self.culprits[shape] = (
+                serializer_fields(frame), project_stack(frame))
+
+    def violations(self, queries, budget, action):
+        problems = []
+        if budget is not None and queries > budget:
+            problems.append(
+                f'{action}: {queries} SQL-запросов при бюджете {budget}.')
+        for shape, (fields, stack) in self.culprits.items():
+            problems.append('\n'.join((
+                f'{action}: запрос повторён {self.shapes[shape]} раз '
+                f'(предел {self.limit}): {shape}',
+                f'  поле: {fields or "вне сериализатора"}',
+                *(f'  {line}' for line in stack),
+            )))
+        return problems
+
+
+def start():
+    '''Инспектор для нового запроса или None, если запрос
+    не проверяется.'''
+    mode = settings.QUERY_INSPECTION
+    if mode == STRICT or mode == SAMPLE and (
+            random.random() < settings.QUERY_INSPECTION_SAMPLE_RATE):
+        return QueryInspector(settings.QUERY_REPEAT_LIMIT)
+    return None
+
+
+def report(problems):
+    if settings.QUERY_INSPECTION == STRICT:
+        raise QueryInspectionError('\n'.join(problems))
+    for problem in problems:
+        logger.warning(problem)
@@ -0,0 +1,77 @@
+'''Множества id, из которых берутся флаги is_favorited,
+is_in_shopping_cart и is_subscribed.
+
+Избранное, корзина и подписки пользователя читаются из базы одним
+запросом на множество и кладутся в кэш под поколением (как в api.cache);
+любое изменение связи меняет поколение, и следующий запрос перечитывает
+множество. В пределах запроса множества хранятся на объекте request,
+поэтому сериализаторы проверяют флаги без обращений к базе.
+'''
+from django.core.cache import cache
+
+from .cache import bump, generation_key, get_generations
+from recipes.models import Favourite, ShoppingCart
+from users.models import Subscribe
+
+SETS_TIMEOUT = 300
+
+FAVORITES = 'favorites'
+CART = 'cart'
+FOLLOWING = 'following'
+
+SOURCES = {
+    FAVORITES: (Favourite, 'recipe_id'),
+    CART: (ShoppingCart, 'recipe_id'),
+    FOLLOWING: (Subscribe, 'author_id'),
+}
+MODEL_SETS = {model: name for name, (model, _) in SOURCES.items()}
+
+
+def set_generation_key(name, user_id):
+    return generation_key(f'relations:{name}', user_id)
+
+
+def load(name, user_id):
+    generation, = get_generations([set_generation_key(name, user_id)])
+    key = f'relations:{name}:{user_id}:{generation}'
+    ids = cache.get(key)
+    if ids is None:
+        model, field = SOURCES[name]
+        ids = frozenset(model.objects.filter(
+            user_id=user_id).values_list(field, flat=True))
+        cache.set(key, ids, SETS_TIMEOUT)
+    return ids
+
+
+def invalidate(model, *user_ids):
+    bump(*(set_generation_key(MODEL_SETS[model], user_id)
+           for user_id in user_ids))
+
+
+def user_sets(request):
+    '''Множества текущего пользователя; на запрос создаются один раз.'''
+    if not hasattr(request, '_relation_sets'):
+        request._relation_sets = RelationSets(request.user)
+    return request._relation_sets
+
+
+class RelationSets:
+    def __init__(self, user):
+        self.user_id = None if user.is_anonymous else user.id
+        self.loaded = {}
+
+    def get(self, name):
+        if self.user_id is None:
+            return frozenset()
+        if name not in self.loaded:
+            self.loaded[name] = load(name, self.user_id)
+        return self.loaded[name]
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.get(FAVORITES)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.get(CART)
+
+    def is_subscribed(self, author_id):
+        return author_id in self.get(FOLLOWING)
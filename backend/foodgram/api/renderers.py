@@ -0,0 +1,28 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    '''Рендерер выбирает формат файла списка покупок по ?format=.
+    Сам файл отдаётся потоком из представления, а через render()
+    проходят только ошибки — их отдаём как JSON.'''
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
@@ -1,10 +1,13 @@
+from django.core.files.storage import default_storage
 from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from recipes.models import (Favourite, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+from .relation_sets import user_sets
+from recipes import images, shopping_list
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, ShoppingListJob, Tag)
 from users.models import Subscribe, User
 
 
@@ -20,15 +23,14 @@ class UserSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
+            'recipes_count',
+            'followers_count',
             "password",
         )
         extra_kwargs = {'password': {'write_only': True}}
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=obj).exists()
+        return user_sets(self.context['request']).is_subscribed(obj.id)
 
     def create(self, validated_data):
         user = User(
@@ -42,13 +44,33 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class ThumbnailsField(serializers.Field):
+    '''Ссылки на миниатюры изображения рецепта по размерам. Пока
+    миниатюры не готовы, словарь пуст и клиент берёт image.'''
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for size, name in value.items():
+            url = default_storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'thumbnails',
             'cooking_time',
         )
 
@@ -61,7 +83,9 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     last_name = serializers.CharField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(source='author.recipes_count')
+    followers_count = serializers.IntegerField(
+        source='author.followers_count')
 
     class Meta:
         model = Subscribe
@@ -74,18 +98,19 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'is_subscribed',
             'recipes',
             'recipes_count',
+            'followers_count',
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=obj.author).exists()
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        request = self.context['request']
+        if obj.user_id == request.user.id:
+            return True
+        return user_sets(request).is_subscribed(obj.author_id)
 
     def get_recipes(self, obj):
+        if hasattr(obj.author, 'recent_recipes'):
+            return ShortRecipeSerializer(
+                obj.author.recent_recipes, many=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         queryset = Recipe.objects.filter(author=obj.author)
@@ -104,7 +129,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.IntegerField()
+    id = serializers.IntegerField(source='ingredient_id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -133,6 +158,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    thumbnails = ThumbnailsField()
 
     class Meta:
         model = Recipe
@@ -143,23 +169,21 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
+            'in_carts_count',
             'name',
             'image',
+            'thumbnails',
             'text',
             'cooking_time',
         )
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return obj.favorites.filter(user=user).exists()
+        return user_sets(self.context['request']).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return obj.shopping.filter(user=user).exists()
+        return user_sets(
+            self.context['request']).is_in_shopping_cart(obj.id)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -188,14 +212,14 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if not value:
             raise ValidationError('Выбери хотя бы один ингредиент!')
 
-        ingredient_ids = [item['id'] for item in value]
+        ingredient_ids = [item['ingredient_id'] for item in value]
         ingredient_dict = {
             ingredient.id: ingredient for ingredient in Ingredient.objects.filter(id__in=ingredient_ids)
         }
 
         ingredients_list = []
         for item in value:
-            ingredient_id = item['id']
+            ingredient_id = item['ingredient_id']
             amount = item['amount']
             ingredient = ingredient_dict.get(ingredient_id)
 
@@ -226,27 +250,45 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return value
 
-    @transaction.atomic
-    def save_recipe_ingredients(self, recipe, ingredients):
-        '''Здесь я исправляла баг, возникающий при обновлении рецепта,
-        связанный с ингредиентами.'''
-        existing_ingredients = recipe.recipe_ingredients.all()
-        existing_ingredient_ids = [ingredient.id for ingredient in existing_ingredients]
-
-        for ingredient_data in ingredients:
-            ingredient_id = ingredient_data['id']
-            amount = ingredient_data['amount']
-
-            if ingredient_id in existing_ingredient_ids:
-                recipe_ingredient = existing_ingredients.get(id=ingredient_id)
-                recipe_ingredient.amount = amount
-                recipe_ingredient.save()
-            else:
-                RecipeIngredient.objects.create(
-                    ingredient_id=ingredient_id,
-                    recipe=recipe,
-                    amount=amount
-                )
+    def save_recipe_ingredients(self, recipe, ingredients, created=False):
+        '''Приводит состав рецепта к присланному одним сравнением:
+        новые строки добавляются, изменённые обновляются, лишние удаляются —
+        каждое действие одним запросом.'''
+        existing = {} if created else {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.all()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in existing.items()
+        }
+        new_amounts = {
+            item['ingredient_id']: item['amount'] for item in ingredients
+        }
+
+        to_create = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in existing
+        ]
+        to_update = []
+        for ingredient_id, item in existing.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != item.amount:
+                item.amount = amount
+                to_update.append(item)
+        to_delete = [
+            item.pk for ingredient_id, item in existing.items()
+            if ingredient_id not in new_amounts
+        ]
+
+        RecipeIngredient.objects.bulk_create(to_create)
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if not created:
+            shopping_list.update_recipe(recipe.id, old_amounts, new_amounts)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -255,71 +297,90 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         recipe = super().create(validated_data)
         recipe.tags.set(tags)
-        self.save_recipe_ingredients(recipe, ingredients)
+        self.save_recipe_ingredients(recipe, ingredients, created=True)
+        images.schedule(recipe)
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        previous = instance.thumbnails
+        if validated_data.get('image'):
+            validated_data['thumbnails'] = {}
 
         instance = super().update(instance, validated_data)
         instance.tags.set(tags)
         self.save_recipe_ingredients(instance, ingredients)
+        if 'thumbnails' in validated_data:
+            images.schedule(instance, previous)
 
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.for_display().get(pk=instance.pk)
         return RecipeSerializer(instance, context=context).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Favourite
-        fields = ('user', 'recipe')
+class RecipeImageSerializer(serializers.ModelSerializer):
+    '''Замена изображения рецепта отдельным запросом: файлом в multipart
+    или телом запроса, без base64 в JSON.'''
 
-    def validate(self, data):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        recipe = data['recipe']
-        if Favourite.objects.filter(user=request.user, recipe=recipe).exists():
-            raise serializers.ValidationError({
-                'errors': 'Рецепт уже добавлен в избранное!'
-            })
-        return data
+    thumbnails = ThumbnailsField()
 
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        return ShortRecipeSerializer(
-            instance.recipe, context=context).data
+    class Meta:
+        model = Recipe
+        fields = ('image', 'thumbnails')
+        extra_kwargs = {'image': {'required': True}}
 
+    def update(self, instance, validated_data):
+        previous = instance.thumbnails
+        validated_data['thumbnails'] = {}
+        instance = super().update(instance, validated_data)
+        images.schedule(instance, previous)
+        return instance
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
 
     class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
+        model = ShoppingListItem
+        fields = ('id',
+                  'name',
+                  'measurement_unit',
+                  'amount'
+                  )
 
-    def validate(self, data):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return data
 
-        user = request.user
-        recipe = data['recipe']
-        if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError({
-                'errors': 'Рецепт уже есть в списке покупок!'
-            })
+class ShoppingListJobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingListJob
+        fields = ('id',
+                  'format',
+                  'status',
+                  'download',
+                  'error',
+                  'created_at',
+                  'finished_at',
+                  )
+
+    def get_download(self, obj):
+        if obj.status != ShoppingListJob.DONE or not obj.file:
+            return None
+        return self.context['request'].build_absolute_uri(obj.file.url)
 
-        return data
 
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        return ShortRecipeSerializer(
-            instance.recipe, context=context).data
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=1000)
@@ -0,0 +1,97 @@
+import csv
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db.models import F
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import ShoppingListItem
+
+CHUNK_SIZE = 64 * 1024
+PDF_FONT_SIZE = 12
+PDF_LEADING = 7 * mm
+PDF_MARGIN = 20 * mm
+
+
+def list_rows(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        total=F('amount'),
+    ).order_by('ingredient__name')
+
+
+def format_line(item):
+    return (f'{item["ingredient__name"]} '
+            f'({item["ingredient__measurement_unit"]}) — {item["total"]}')
+
+
+def render_txt(ingredients):
+    for item in ingredients:
+        yield f'{format_line(item)}\n'
+
+
+class Echo:
+    '''Псевдобуфер для csv.writer: строка возвращается сразу,
+    ничего не накапливая.'''
+
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['total'],
+        ))
+
+
+@lru_cache(maxsize=None)
+def pdf_font():
+    try:
+        pdfmetrics.registerFont(
+            TTFont('ShoppingListFont', settings.SHOPPING_LIST_PDF_FONT))
+    except TTFError:
+        return 'Helvetica'
+    return 'ShoppingListFont'
+
+
+def render_pdf(ingredients):
+    '''reportlab держит все страницы в памяти до save(), так что
+    память растёт с длиной списка; временный файл избавляет только от
+    второй копии готового PDF при отдаче кусками. Длинные списки лучше
+    заказывать через воркер: POST download_shopping_cart/jobs.'''
+    with SpooledTemporaryFile(max_size=CHUNK_SIZE) as buffer:
+        document = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        font = pdf_font()
+        document.setFont(font, PDF_FONT_SIZE)
+        position = height - PDF_MARGIN
+        for item in ingredients:
+            if position < PDF_MARGIN:
+                document.showPage()
+                document.setFont(font, PDF_FONT_SIZE)
+                position = height - PDF_MARGIN
+            document.drawString(PDF_MARGIN, position, format_line(item))
+            position -= PDF_LEADING
+        document.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'pdf': render_pdf,
+}
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import cache, relation_sets
+from .ingredient_index import invalidate
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.relations import relations_changed
+from recipes.signals import (LOGIN_FIELDS, deleted_in_batch,
+                             deleted_with_recipe, first_in_batch)
+from users.models import Subscribe
+
+User = get_user_model()
+
+
+def bump_recipe(recipe):
+    cache.bump_recipe(recipe.id, recipe.author_id,
+                      recipe.tags.values_list('slug', flat=True))
+
+
+def bump_recipes(recipes):
+    for recipe in recipes.prefetch_related('tags'):
+        cache.bump_recipe(recipe.id, recipe.author_id,
+                          [tag.slug for tag in recipe.tags.all()])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(**kwargs):
+    invalidate()
+    cache.bump_catalog()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(**kwargs):
+    cache.bump_catalog()
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= LOGIN_FIELDS:
+        return
+    if instance.recipes.exists():
+        cache.bump_catalog()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    bump_recipe(instance)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if deleted_with_recipe(**kwargs) or deleted_in_batch(sender, **kwargs):
+        return
+    recipe = Recipe.objects.filter(id=instance.recipe_id).first()
+    if recipe is not None:
+        bump_recipe(recipe)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def recipe_ingredients_deleted(sender, origin=None, **kwargs):
+    if deleted_in_batch(sender, origin) and first_in_batch(
+            origin, __name__):
+        bump_recipes(Recipe.objects.filter(
+            id__in=origin.values('recipe_id')))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'pre_clear'):
+            cache.bump_catalog()
+        return
+    if action == 'pre_clear':
+        bump_recipe(instance)
+    elif action in ('post_add', 'post_remove'):
+        bump_recipe(instance)
+        cache.bump_recipe(
+            instance.id, instance.author_id,
+            Tag.objects.filter(id__in=pk_set).values_list('slug', flat=True))
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_delete, sender=Favourite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def relation_changed(sender, instance, **kwargs):
+    # Избранное и корзину, удаляемые queryset'ом, обрабатывает
+    # recipes.relations и отправляет relations_changed на всю пачку.
+    if sender is not Subscribe and deleted_in_batch(sender, **kwargs):
+        return
+    relation_sets.invalidate(sender, instance.user_id)
+
+
+@receiver(relations_changed)
+def relations_bulk_changed(sender, user_id, **kwargs):
+    relation_sets.invalidate(sender, user_id)
@@ -0,0 +1,70 @@
+'''Данные для тестов API.'''
+from base64 import b64encode
+from io import BytesIO
+
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscribe, User
+
+PASSWORD = 'test-password'
+
+
+def image_data(size=(16, 16), color='red'):
+    '''PNG в виде data URI, как его присылает фронтенд.'''
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return f'data:image/png;base64,{b64encode(buffer.getvalue()).decode()}'
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com', username=f'user{number}',
+        first_name='Имя', last_name='Фамилия', password=PASSWORD)
+
+
+def create_catalog(recipes=60, authors=3, tags=3, ingredients=20):
+    '''Авторы и рецепты с тегами и ингредиентами; у первого рецепта
+    есть миниатюры. Возвращает (авторы, рецепты).'''
+    users = [create_user(number) for number in range(authors)]
+    tag_objects = [
+        Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                           slug=f'tag{number}')
+        for number in range(tags)
+    ]
+    ingredient_objects = [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number:03}', measurement_unit='г')
+        for number in range(ingredients)
+    ]
+    recipe_objects = []
+    for number in range(recipes):
+        recipe = Recipe.objects.create(
+            name=f'Рецепт {number}', author=users[number % authors],
+            image='recipes/test.png', text='Описание', cooking_time=10,
+            thumbnails={'small': 'recipes/thumbnails/test_small.webp'}
+            if number == 0 else {})
+        recipe.tags.set(tag_objects[:1 + number % tags])
+        for offset in range(3):
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient=ingredient_objects[
+                    (number + offset) % ingredients],
+                amount=offset + 1)
+        recipe_objects.append(recipe)
+    return users, recipe_objects
+
+
+def create_viewer(authors, recipes):
+    '''Пользователь с токеном, подписками и последними рецептами
+    в избранном и корзине.'''
+    viewer = create_user('viewer')
+    for recipe in recipes[-4:]:
+        Favourite.objects.create(user=viewer, recipe=recipe)
+    for recipe in recipes[-6:-2]:
+        ShoppingCart.objects.create(user=viewer, recipe=recipe)
+    for author in authors[:2]:
+        Subscribe.objects.create(user=viewer, author=author)
+    return viewer, Token.objects.create(user=viewer).key
@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from .factories import create_catalog
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+# Сессия, пользователь, COUNT(*), страница и один запрос фильтра
+# (теги у рецептов, единицы измерения у ингредиентов).
+CHANGELIST_QUERIES = 5
+
+
+class LargeTableAdminTest(TestCase):
+    '''Число запросов списков в админке не зависит от числа строк.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors, _ = create_catalog(recipes=3, ingredients=3)
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', first_name='Имя',
+            last_name='Фамилия', password='admin-password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, rows):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Добавка {number:03}', measurement_unit='мл')
+            for number in range(rows))
+        Recipe.objects.bulk_create(
+            Recipe(name=f'Блюдо {number}',
+                   author=self.authors[number % len(self.authors)],
+                   image='recipes/test.png', text='Описание',
+                   cooking_time=10)
+            for number in range(rows))
+
+    def assert_changelist_queries(self, path, **params):
+        for rows in (0, 120):
+            self.add_rows(rows)
+            with self.subTest(rows=Recipe.objects.count()):
+                with self.assertNumQueries(CHANGELIST_QUERIES):
+                    response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_recipe_changelist(self):
+        self.assert_changelist_queries('/admin/recipes/recipe/')
+
+    def test_recipe_search(self):
+        self.assert_changelist_queries('/admin/recipes/recipe/', q='Блю')
+
+    def test_ingredient_changelist(self):
+        self.assert_changelist_queries('/admin/recipes/ingredient/')
+
+    def test_ingredient_search(self):
+        self.assert_changelist_queries(
+            '/admin/recipes/ingredient/', q='Доб')
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .factories import create_catalog
+from recipes.models import DeletedRecipe, Recipe, Tag
+
+
+@override_settings(RECIPE_CHANGES_OVERLAP=60,
+                   DELETED_RECIPES_RETENTION_DAYS=30)
+class RecipeChangesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.recipes = create_catalog(recipes=3)
+
+    def changes(self, since):
+        return self.client.get(
+            '/api/recipes/changes/', {'updated_since': since.isoformat()})
+
+    def test_overlap_returns_late_commits(self):
+        '''Строка, закоммиченная после опроса с более ранним updated_at,
+        попадает в следующий ответ.'''
+        since = timezone.now()
+        late, old = self.recipes[:2]
+        Recipe.objects.filter(pk=late.pk).update(
+            updated_at=since - timedelta(seconds=30))
+        Recipe.objects.filter(pk=old.pk).update(
+            updated_at=since - timedelta(seconds=90))
+        DeletedRecipe.objects.create(recipe_id=1000)
+        DeletedRecipe.objects.filter(recipe_id=1000).update(
+            deleted_at=since - timedelta(seconds=30))
+        response = self.changes(since)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(late.pk, response.json()['updated'])
+        self.assertNotIn(old.pk, response.json()['updated'])
+        self.assertEqual(response.json()['deleted'], [1000])
+
+    def test_invalid_since(self):
+        for since in ('', 'вчера', '2023-13-45T00:00:00',
+                      '2023-02-30T10:00:00+03:00'):
+            with self.subTest(since=since):
+                response = self.client.get(
+                    '/api/recipes/changes/', {'updated_since': since})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('updated_since', response.json())
+
+    def test_since_before_retention(self):
+        response = self.changes(timezone.now() - timedelta(days=31))
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(
+            self.changes(timezone.now() - timedelta(days=29)).status_code,
+            200)
+
+    def test_prune(self):
+        DeletedRecipe.objects.create(recipe_id=1)
+        DeletedRecipe.objects.create(recipe_id=2)
+        DeletedRecipe.objects.filter(recipe_id=1).update(
+            deleted_at=timezone.now() - timedelta(days=31))
+        call_command('prune_deleted_recipes', stdout=StringIO())
+        self.assertEqual(
+            list(DeletedRecipe.objects.values_list('recipe_id', flat=True)),
+            [2])
+
+
+class TagValidatorsTest(TestCase):
+    def test_etag_differs_per_tag(self):
+        first, second = (
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(2))
+        etag = self.client.get(f'/api/tags/{first.id}/')['ETag']
+        self.assertEqual(self.client.get(
+            f'/api/tags/{first.id}/',
+            headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(
+            f'/api/tags/{second.id}/',
+            headers={'If-None-Match': etag}).status_code, 200)
+        self.assertNotEqual(
+            self.client.get('/api/tags/')['ETag'], etag)
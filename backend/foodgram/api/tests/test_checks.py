@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from api.checks import shared_cache_check
+from foodgram.test_runner import TEST_CACHES
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/tmp/foodgram_cache',
+    }})
+    def test_file_based_rejected(self):
+        errors = shared_cache_check(None)
+        self.assertEqual([error.id for error in errors], ['api.E001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+    }})
+    def test_redis_accepted(self):
+        self.assertEqual(shared_cache_check(None), [])
+
+    def test_process_local_rejected_without_debug(self):
+        for backend in ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache'):
+            caches = {'default': {'BACKEND': backend}}
+            with self.subTest(backend=backend):
+                with override_settings(CACHES=caches, DEBUG=False):
+                    self.assertEqual(
+                        [error.id for error in shared_cache_check(None)],
+                        ['api.E002'])
+                with override_settings(CACHES=caches, DEBUG=True):
+                    self.assertEqual(shared_cache_check(None), [])
+
+    def test_suite_uses_its_own_cache(self):
+        self.assertEqual(settings.CACHES, TEST_CACHES)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .factories import create_catalog, create_viewer
+from api import documents
+from recipes.models import ShoppingCart, ShoppingListJob
+
+
+class ShoppingListWorkerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_catalog(recipes=6)
+        cls.viewer, cls.token = create_viewer(authors, cls.recipes)
+
+    def setUp(self):
+        self.media = media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def work(self):
+        out = StringIO()
+        call_command('shopping_list_worker', once=True, stdout=out)
+        return out.getvalue()
+
+    def test_done(self):
+        job, _ = documents.request_document(self.viewer, 'txt')
+        self.assertIn(f'Заказ {job.id}: {ShoppingListJob.DONE}', self.work())
+        job.refresh_from_db()
+        self.assertTrue(job.file)
+
+    def test_failed_hides_error(self):
+        job, _ = documents.request_document(self.viewer, 'txt')
+        with mock.patch.object(
+                documents, 'build', side_effect=OSError('/srv/media: 28')):
+            with self.assertLogs('api.documents', 'ERROR'):
+                output = self.work()
+        self.assertIn(f'Заказ {job.id}: {ShoppingListJob.FAILED}', output)
+        job.refresh_from_db()
+        self.assertEqual(job.error, documents.BUILD_ERROR)
+
+    def test_version_follows_list(self):
+        job, created = documents.request_document(self.viewer, 'txt')
+        self.assertTrue(created)
+        self.work()
+        self.assertEqual(
+            documents.request_document(self.viewer, 'txt'), (job, False))
+        ShoppingCart.objects.create(user=self.viewer, recipe=self.recipes[-1])
+        changed, created = documents.request_document(self.viewer, 'txt')
+        self.assertTrue(created)
+        self.assertNotEqual(changed.version, job.version)
+
+    def test_ingredient_rename_changes_version(self):
+        job, _ = documents.request_document(self.viewer, 'txt')
+        ingredient = self.viewer.shopping_list.first().ingredient
+        ingredient.name = 'Переименован'
+        ingredient.save()
+        self.assertNotEqual(
+            documents.request_document(self.viewer, 'txt')[0], job)
+
+    def test_requeue_after_heartbeat_timeout(self):
+        job, _ = documents.request_document(self.viewer, 'txt')
+        self.assertTrue(documents.claim(job.id, 'first'))
+        long_ago = timezone.now() - timedelta(hours=1)
+        jobs = ShoppingListJob.objects.filter(id=job.id)
+        jobs.update(started_at=long_ago)
+        self.assertEqual(documents.requeue_stale(60), 0)
+        jobs.update(heartbeat_at=long_ago)
+        self.assertEqual(documents.requeue_stale(60), 1)
+        self.assertEqual(jobs.get().status, ShoppingListJob.PENDING)
+
+    def test_requeued_job_finished_by_new_owner(self):
+        job, _ = documents.request_document(self.viewer, 'txt')
+        documents.claim(job.id, 'first')
+        lost = ShoppingListJob.objects.get(id=job.id)
+        ShoppingListJob.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1))
+        documents.requeue_stale(60)
+        taken = documents.next_job('second')
+        with self.assertLogs('api.documents', 'WARNING'):
+            self.assertEqual(documents.run(lost), documents.LOST)
+        taken.refresh_from_db()
+        self.assertEqual((taken.status, taken.worker),
+                         (ShoppingListJob.RUNNING, 'second'))
+        self.assertEqual(documents.run(taken), ShoppingListJob.DONE)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.media, 'shopping_lists'))), 1)
+
+
+class ShoppingListDownloadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_catalog(recipes=6)
+        cls.viewer, cls.token = create_viewer(authors, recipes)
+
+    def test_csv_streamed(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=csv',
+            headers={'Authorization': f'Token {self.token}'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(content.decode().count('\n'),
+                         1 + self.viewer.shopping_list.count())
+
+    def test_unknown_format_rejected(self):
+        for file_format in ('json', 'xml'):
+            with self.subTest(format=file_format):
+                response = self.client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': file_format},
+                    headers={'Authorization': f'Token {self.token}'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('format', response.json())
+
+    def test_txt_by_default(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename=shopping_cart.txt')
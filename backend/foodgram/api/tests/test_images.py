@@ -0,0 +1,163 @@
+import os
+from base64 import b64decode
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from .factories import create_catalog, image_data
+from recipes import images
+from recipes.models import Recipe
+
+SIZES = {'small': 8, 'large': 32}
+
+
+def png(size=(64, 48), color='red'):
+    return b64decode(image_data(size, color).partition(',')[2])
+
+
+@override_settings(RECIPE_THUMBNAIL_SIZES=SIZES)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_catalog(recipes=2, authors=1)
+        cls.recipe = recipes[0]
+        cls.token = Token.objects.create(user=authors[0]).key
+
+    def setUp(self):
+        submit = mock.patch.object(images, 'submit')
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+
+    def put_image(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f'/api/recipes/{self.recipe.id}/image/',
+                headers={'Authorization': f'Token {self.token}'}, **kwargs)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['thumbnails'], {})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.thumbnails, {})
+        self.submit.assert_called_once_with(
+            self.recipe.id, self.recipe.image.name)
+        return response
+
+    def render(self, image_name, recipe_id=None):
+        '''Миниатюры image_name, как их сохранил бы пул.'''
+        recipe_id = recipe_id or self.recipe.id
+        names = images.render_thumbnails(
+            *images.render_args(recipe_id, image_name))
+        images.save_thumbnails(recipe_id, image_name, names)
+        return {size: f'{images.THUMBNAILS_DIR}/{name}'
+                for size, name in names.items()}
+
+    def test_render_thumbnails(self):
+        name = default_storage.save('recipes/source.png',
+                                    ContentFile(png()))
+        names = images.render_thumbnails(
+            *images.render_args(self.recipe.id, name))
+        self.assertEqual(set(names), set(SIZES))
+        for size, width in SIZES.items():
+            path = default_storage.path(
+                f'{images.THUMBNAILS_DIR}/{names[size]}')
+            with Image.open(path) as thumbnail:
+                self.assertEqual(max(thumbnail.size), width)
+
+    def test_generate_thumbnails_command(self):
+        name = default_storage.save('recipes/command.png',
+                                    ContentFile(png()))
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image=name, thumbnails={})
+        call_command('generate_thumbnails', workers=1, stdout=StringIO(),
+                     stderr=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual(set(self.recipe.thumbnails), set(SIZES))
+        for thumbnail in self.recipe.thumbnails.values():
+            self.assertTrue(default_storage.exists(thumbnail))
+
+    def test_names_do_not_collide(self):
+        '''a.png и a.jpg, а также одна картинка у двух рецептов дают
+        разные миниатюры.'''
+        png_name = default_storage.save('recipes/a.png', ContentFile(png()))
+        jpg_name = default_storage.save('recipes/a.jpg', ContentFile(png()))
+        other = Recipe.objects.exclude(id=self.recipe.id).get()
+        stems = {
+            images.thumbnail_stem(self.recipe.id, png_name),
+            images.thumbnail_stem(self.recipe.id, jpg_name),
+            images.thumbnail_stem(other.id, png_name),
+        }
+        self.assertEqual(len(stems), 3)
+        Recipe.objects.filter(id=self.recipe.id).update(image=png_name)
+        Recipe.objects.filter(id=other.id).update(image=png_name)
+        first = self.render(png_name)
+        second = self.render(png_name, other.id)
+        self.assertTrue(set(first.values()).isdisjoint(second.values()))
+
+    def test_late_thumbnails_dropped(self):
+        name = default_storage.save('recipes/late.png', ContentFile(png()))
+        late = self.render(name)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.thumbnails, late)
+        for thumbnail in late.values():
+            self.assertFalse(default_storage.exists(thumbnail))
+
+    def test_new_image_deletes_previous_thumbnails(self):
+        name = default_storage.save('recipes/old.png', ContentFile(png()))
+        Recipe.objects.filter(id=self.recipe.id).update(image=name)
+        previous = self.render(name)
+        for thumbnail in previous.values():
+            self.assertTrue(default_storage.exists(thumbnail))
+        self.put_image(
+            data=png(color='blue'), content_type='image/png',
+            HTTP_CONTENT_DISPOSITION='attachment; filename=old.png')
+        for thumbnail in previous.values():
+            self.assertFalse(default_storage.exists(thumbnail))
+
+    def test_rolled_back_update_keeps_thumbnails(self):
+        name = default_storage.save('recipes/kept.png', ContentFile(png()))
+        Recipe.objects.filter(id=self.recipe.id).update(image=name)
+        previous = self.render(name)
+        self.recipe.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            images.schedule(self.recipe, previous)
+        self.assertEqual(len(callbacks), 1)
+        for thumbnail in previous.values():
+            self.assertTrue(default_storage.exists(thumbnail))
+        self.submit.assert_not_called()
+
+    def test_multipart_upload(self):
+        self.put_image(
+            data=encode_multipart(
+                BOUNDARY, {'image': ContentFile(png(), name='photo.png')}),
+            content_type=MULTIPART_CONTENT)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_raw_body_upload(self):
+        self.put_image(
+            data=png(), content_type='image/png',
+            HTTP_CONTENT_DISPOSITION='attachment; filename=photo.png')
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.size, (64, 48))
+
+    def test_recipe_update_resets_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {'tags': [self.recipe.tags.first().id],
+                 'ingredients': [
+                     {'id': item.ingredient_id, 'amount': item.amount}
+                     for item in self.recipe.recipe_ingredients.all()],
+                 'image': image_data(color='blue')},
+                content_type='application/json',
+                headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['thumbnails'], {})
+        self.recipe.refresh_from_db()
+        self.submit.assert_called_once_with(
+            self.recipe.id, self.recipe.image.name)
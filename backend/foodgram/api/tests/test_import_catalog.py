@@ -0,0 +1,194 @@
+import csv
+import json
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from .factories import create_user
+from recipes import catalog_import
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
+
+merge_ingredients = import_module(
+    'recipes.migrations.0007_ingredient_natural_key')
+
+
+class ImportCatalogTest(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def write_csv(self, name, rows):
+        path = self.directory / name
+        with path.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return str(path)
+
+    def import_twice(self, path, *args):
+        '''Повторный импорт того же файла не должен ничего менять.'''
+        call_command('import_catalog', path, *args, stdout=StringIO())
+        ingredients = set(Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'))
+        recipes = set(Recipe.objects.values_list('id', 'author_id', 'name'))
+        call_command('import_catalog', path, *args, stdout=StringIO())
+        self.assertEqual(set(Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit')), ingredients)
+        self.assertEqual(set(Recipe.objects.values_list(
+            'id', 'author_id', 'name')), recipes)
+
+    def test_json_fixture_keeps_pks(self):
+        path = self.write('ingredients.json', json.dumps([
+            {'model': 'recipes.ingredient', 'pk': 101,
+             'fields': {'name': 'Мука', 'measurement_unit': 'г'}},
+            {'model': 'recipes.ingredient', 'pk': 102,
+             'fields': {'name': 'Соль', 'measurement_unit': 'г'}},
+            {'model': 'recipes.ingredient', 'pk': 103,
+             'fields': {'name': 'Мука ', 'measurement_unit': 'г'}},
+            {'model': 'recipes.tag', 'pk': 7,
+             'fields': {'name': 'Завтрак', 'color': '#E26C2D',
+                        'slug': 'breakfast'}},
+        ]))
+        self.import_twice(path)
+        self.assertEqual(
+            dict(Ingredient.objects.values_list('id', 'name')),
+            {101: 'Мука', 102: 'Соль'})
+        self.assertEqual(Tag.objects.get().slug, 'breakfast')
+        created = Ingredient.objects.create(
+            name='Сахар', measurement_unit='г')
+        self.assertGreater(created.id, 102)
+
+    def test_json_read_in_chunks(self):
+        records = [
+            {'name': f'Ингредиент {number}', 'measurement_unit': 'г'}
+            for number in range(50)
+        ]
+        path = self.write('ingredients.json', json.dumps(records))
+        with mock.patch.object(catalog_import, 'CHUNK_SIZE', 16):
+            self.import_twice(path, '--batch-size', '7')
+        self.assertEqual(Ingredient.objects.count(), 50)
+
+    def test_json_separators(self):
+        record = json.dumps({'name': 'Соль', 'measurement_unit': 'г'})
+        for content in (f'[{record},,{record}]', f'[,{record}]',
+                        f'[{record},]', f'[{record} {record}]',
+                        f'[{record}'):
+            with self.subTest(content=content):
+                path = self.write('bad.json', content)
+                with self.assertRaises(CommandError):
+                    call_command('import_catalog', path, stdout=StringIO())
+        path = self.write('ok.json', f'[ {record} ,\n {record} ]')
+        with open(path, encoding='utf-8') as file:
+            with mock.patch.object(catalog_import, 'CHUNK_SIZE', 3):
+                self.assertEqual(
+                    len(list(catalog_import.iter_json_array(file))), 2)
+        self.assertEqual(list(catalog_import.iter_json_array(
+            StringIO(' [ ] '))), [])
+
+    def test_derived_data_refreshed_only_on_success(self):
+        record = json.dumps({'name': 'Соль', 'measurement_unit': 'г'})
+        path = self.write('broken.json', f'[{record},,{record}]')
+        command = 'api.management.commands.import_catalog.Command'
+        with mock.patch(f'{command}.refresh_derived_data') as refresh:
+            with self.assertRaisesMessage(CommandError, 'Сохранено'):
+                call_command('import_catalog', path, '--batch-size', '1',
+                             stdout=StringIO())
+            refresh.assert_not_called()
+            self.assertEqual(Ingredient.objects.count(), 1)
+            path = self.write('fixed.json', f'[{record}]')
+            call_command('import_catalog', path, stdout=StringIO())
+            refresh.assert_called_once_with()
+
+    def test_ndjson_without_pks(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        path = self.write('ingredients.ndjson', '\n'.join([
+            json.dumps({'name': 'Соль', 'measurement_unit': 'г'}),
+            '',
+            json.dumps({'name': 'Соль', 'measurement_unit': 'кг'}),
+            json.dumps({'name': 'Перец', 'measurement_unit': 'г'}),
+        ]))
+        self.import_twice(path, '--batch-size', '1')
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            {('Соль', 'г'), ('Соль', 'кг'), ('Перец', 'г')})
+
+    def test_csv_recipes(self):
+        author = create_user(1)
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        flour = Ingredient.objects.create(name='Мука', measurement_unit='г')
+        path = self.write_csv('recipes.csv', [
+            {'author': author.email, 'name': 'Блины', 'text': 'Жарить.',
+             'cooking_time': '20', 'tags': json.dumps(['lunch']),
+             'ingredients': json.dumps([
+                 {'id': flour.id, 'amount': 200},
+                 {'name': 'Мука', 'measurement_unit': 'г', 'amount': 50},
+                 {'name': 'Молоко', 'measurement_unit': 'мл',
+                  'amount': 500},
+             ])},
+            {'author': 'nobody@example.com', 'name': 'Каша', 'text': '',
+             'cooking_time': '10', 'tags': '[]', 'ingredients': '[]'},
+        ])
+        self.import_twice(path, '--model', 'recipe')
+        recipe = Recipe.objects.get()
+        self.assertEqual((recipe.author, recipe.name), (author, 'Блины'))
+        self.assertEqual(list(recipe.tags.values_list('slug', flat=True)),
+                         ['lunch'])
+        self.assertEqual(
+            dict(RecipeIngredient.objects.values_list(
+                'ingredient__name', 'amount')),
+            {'Мука': 250, 'Молоко': 500})
+        self.assertEqual(Ingredient.objects.count(), 2)
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_reimport_updates_shopping_lists(self):
+        author = create_user(1)
+        buyer = create_user(2)
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        path = self.write('recipes.ndjson', json.dumps({
+            'author': author.id, 'name': 'Суп', 'cooking_time': 30,
+            'ingredients': [{'id': salt.id, 'amount': 5}]}))
+        call_command('import_catalog', path, '--model', 'recipe',
+                     stdout=StringIO())
+        ShoppingCart.objects.create(user=buyer, recipe=Recipe.objects.get())
+        self.assertEqual(ShoppingListItem.objects.get(user=buyer).amount, 5)
+        self.write('recipes.ndjson', json.dumps({
+            'author': author.id, 'name': 'Суп', 'cooking_time': 30,
+            'ingredients': [{'id': salt.id, 'amount': 8}]}))
+        call_command('import_catalog', path, '--model', 'recipe',
+                     stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(ShoppingListItem.objects.get(user=buyer).amount, 8)
+
+
+class MergeDuplicatesTest(SimpleTestCase):
+    def test_rows_merged_into_keeper(self):
+        rows = [
+            SimpleNamespace(pk=1, recipe_id=10, ingredient_id=5, amount=3),
+            SimpleNamespace(pk=2, recipe_id=10, ingredient_id=2, amount=4),
+            SimpleNamespace(pk=3, recipe_id=11, ingredient_id=5, amount=7),
+            SimpleNamespace(pk=4, recipe_id=12, ingredient_id=2, amount=1),
+            SimpleNamespace(pk=5, recipe_id=12, ingredient_id=5,
+                            amount=32767),
+        ]
+        deleted = merge_ingredients.merge_rows(
+            rows, 'recipe_id', keeper_id=2,
+            limit=merge_ingredients.MAX_RECIPE_AMOUNT)
+        self.assertEqual({row.pk for row in deleted}, {1, 5})
+        self.assertEqual(
+            {row.pk: (row.ingredient_id, row.amount)
+             for row in rows if row not in deleted},
+            {2: (2, 7), 3: (2, 7), 4: (2, 32767)})
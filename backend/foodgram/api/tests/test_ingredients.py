@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.ingredient_index import VERSION_KEY, current_version, ingredient_index
+from recipes.models import Ingredient
+
+NAMES = ('соль морская', 'Мука', 'Морская соль', 'Сольный раствор', 'Соль')
+
+
+class IngredientSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in NAMES:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        # Объекты класса создаются без on_commit: индекс, собранный
+        # в других тестах, перестраивается по новой версии.
+        cache.delete(VERSION_KEY)
+
+    def search(self, name, **headers):
+        return self.client.get('/api/ingredients/', {'name': name},
+                               headers=headers)
+
+    def names(self, name):
+        return [row['name'] for row in self.search(name).json()]
+
+    def test_prefix_then_substring(self):
+        self.assertEqual(self.names('Соль'), [
+            'Соль', 'Сольный раствор', 'соль морская', 'Морская соль'])
+        self.assertEqual(self.names('мук'), ['Мука'])
+
+    def test_limit(self):
+        self.assertEqual(
+            [row['name'] for row in ingredient_index.search('соль', 2)],
+            ['соль морская', 'Соль'])
+
+    def test_rebuilt_after_commit(self):
+        etag = self.search('Соль')['ETag']
+        version = current_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            ingredient = Ingredient.objects.create(
+                name='Соль каменная', measurement_unit='г')
+        self.assertEqual(current_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertIn('Соль каменная', self.names('Соль'))
+        response = self.search('Соль', If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'Каменная соль'
+            ingredient.save()
+        names = self.names('Соль')
+        self.assertNotIn('Соль каменная', names)
+        self.assertEqual(names[-2:], ['Каменная соль', 'Морская соль'])
+
+    def test_not_modified_until_changed(self):
+        etag = self.search('Соль')['ETag']
+        self.assertEqual(
+            self.search('Соль', If_None_Match=etag).status_code, 304)
+
+    def test_etag_depends_on_query(self):
+        etags = {name: self.search(name)['ETag']
+                 for name in ('Соль', 'Мука', 'СОЛЬ')}
+        self.assertNotEqual(etags['Соль'], etags['Мука'])
+        self.assertEqual(etags['Соль'], etags['СОЛЬ'])
+        self.assertEqual(
+            self.search('Мука', If_None_Match=etags['Соль']).status_code,
+            200)
+        first, second = Ingredient.objects.order_by('id')[:2]
+        self.assertNotEqual(
+            self.client.get(f'/api/ingredients/{first.id}/')['ETag'],
+            self.client.get(f'/api/ingredients/{second.id}/')['ETag'])
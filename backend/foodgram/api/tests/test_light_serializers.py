@@ -0,0 +1,64 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .factories import create_catalog, create_viewer
+from api.fragments import display_queryset
+from api.light_serializers import recipes_data, subscriptions_data
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             SubscriptionSerializer)
+from api.views import CustomUserViewSet
+from recipes.models import Ingredient, Recipe
+
+
+def make_request(user, path='/'):
+    request = Request(RequestFactory().get(path))
+    request.user = user
+    return request
+
+
+class LightSerializersTest(TestCase):
+    '''Ответы из строк values() совпадают с DRF-сериализаторами байт
+    в байт — так же, как проверяет команда check_read_serializers.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_catalog(recipes=12)
+        cls.viewer, _ = create_viewer(authors, recipes)
+
+    def assert_same_json(self, expected, actual):
+        self.assertEqual(JSONRenderer().render(expected),
+                         JSONRenderer().render(actual))
+
+    def test_recipes(self):
+        for user in (AnonymousUser(), self.viewer):
+            with self.subTest(anonymous=user.is_anonymous):
+                request = make_request(user)
+                self.assert_same_json(
+                    RecipeSerializer(
+                        Recipe.objects.for_display(), many=True,
+                        context={'request': request}).data,
+                    recipes_data(list(display_queryset()), request))
+
+    def test_subscriptions(self):
+        for limit in ('', '1', '10'):
+            with self.subTest(recipes_limit=limit):
+                view = CustomUserViewSet()
+                view.request = make_request(
+                    self.viewer, f'/?recipes_limit={limit}')
+                self.assert_same_json(
+                    SubscriptionSerializer(
+                        view.get_subscriptions(user=self.viewer),
+                        many=True, context={'request': view.request}).data,
+                    subscriptions_data(
+                        list(view.get_subscription_rows(user=self.viewer)),
+                        view.get_recent_recipes(), view.request))
+
+    def test_ingredients(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(IngredientSerializer(
+                Ingredient.objects.all(), many=True).data))
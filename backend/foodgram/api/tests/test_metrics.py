@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from .factories import create_user
+from api import metrics
+
+
+class MetricsAccessTest(TestCase):
+    def get(self, **headers):
+        return self.client.get('/metrics', headers=headers)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_token(self):
+        self.assertEqual(
+            self.get(Authorization='Bearer ').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(
+            self.get(Authorization='Bearer wrong').status_code, 401)
+        self.assertEqual(
+            self.get(Authorization='Token secret').status_code, 401)
+        response = self.get(Authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE foodgram_requests_total counter',
+                      response.content)
+
+
+class MetricsFilesTest(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write(self, pid, value):
+        path = self.directory / f'{pid}.json'
+        path.write_text(json.dumps(
+            [[metrics.REQUESTS_TOTAL, [['endpoint', 'test']], [value]]]))
+        return path
+
+    def test_dead_processes_ignored_and_removed(self):
+        dead = subprocess.run([sys.executable, '-c', 'import os; '
+                               'print(os.getpid())'],
+                              capture_output=True, check=True)
+        stale = self.write(int(dead.stdout), 5)
+        self.write(os.getppid(), 2)
+        key = (metrics.REQUESTS_TOTAL, (('endpoint', 'test'),))
+        self.assertEqual(metrics.collect()[key], [2])
+        registry = metrics.Registry()
+        registry.flush(registry.snapshot())
+        self.assertFalse(stale.exists())
+        self.assertTrue((self.directory / f'{os.getpid()}.json').exists())
+        self.assertTrue((self.directory / f'{os.getppid()}.json').exists())
+
+
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.staff = create_user(2)
+        cls.staff.is_staff = True
+        cls.staff.save()
+
+    def timing(self, user=None):
+        headers = {}
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['Authorization'] = f'Token {token.key}'
+        return self.client.get('/api/tags/', headers=headers).get(
+            'Server-Timing')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_staff_only(self):
+        self.assertIsNone(self.timing())
+        self.assertIsNone(self.timing(self.user))
+        self.assertIn('total;dur=', self.timing(self.staff))
+
+    @override_settings(SERVER_TIMING=True)
+    def test_enabled_for_all(self):
+        self.assertIn('total;dur=', self.timing())
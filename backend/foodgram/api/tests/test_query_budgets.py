@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .factories import create_catalog, create_viewer
+from api.query_inspection import STRICT, QueryInspectionError
+from api.views import RecipeViewSet
+
+
+@override_settings(QUERY_INSPECTION=STRICT)
+class StrictQueryInspectionTest(TestCase):
+    '''Чтения укладываются в бюджеты query_budgets и не повторяют один
+    запрос в цикле: в строгом режиме нарушение поднимает
+    QueryInspectionError прямо из client.get.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_catalog()
+        cls.viewer, token = create_viewer(authors, cls.recipes)
+        cls.auth = {'Authorization': f'Token {token}'}
+        cls.paths = [
+            '/api/recipes/?limit=50',
+            '/api/recipes/?limit=50&ordering=-favorites_count',
+            f'/api/recipes/?limit=50&tags={cls.recipes[0].tags.first().slug}',
+            f'/api/recipes/{cls.recipes[-1].id}/',
+            '/api/tags/',
+            f'/api/tags/{cls.recipes[0].tags.first().id}/',
+            '/api/ingredients/',
+            '/api/ingredients/?name=Ингр',
+            f'/api/ingredients/{cls.recipes[0].ingredients.first().id}/',
+            '/api/users/?limit=50',
+        ]
+        cls.authenticated_paths = [
+            f'/api/users/{authors[0].id}/',
+            '/api/users/me/',
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=2',
+            '/api/recipes/?limit=50&is_favorited=1',
+            '/api/recipes/?limit=50&is_in_shopping_cart=1',
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def requests(self):
+        for path in self.paths:
+            yield path, {}
+            yield path, self.auth
+        for path in self.authenticated_paths:
+            yield path, self.auth
+
+    def test_sync_views(self):
+        for path, headers in self.requests():
+            with self.subTest(path=path, auth=bool(headers)):
+                cache.clear()
+                response = self.client.get(path, headers=headers)
+                self.assertEqual(response.status_code, 200)
+
+    def test_budget_exceeded(self):
+        budgets = {**RecipeViewSet.query_budgets, 'list': 2}
+        with mock.patch.object(RecipeViewSet, 'query_budgets', budgets):
+            with self.assertRaises(QueryInspectionError):
+                self.client.get('/api/recipes/')
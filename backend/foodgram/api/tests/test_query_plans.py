@@ -0,0 +1,59 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from api.management.commands import check_query_plans
+
+
+class CheckQueryPlansTest(TestCase):
+    '''check_query_plans на SQLite тестов: небольшая синтетическая база,
+    EXPLAIN QUERY PLAN каждого запроса горячих путей.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_synthetic', '--users', '20', '--recipes', '60',
+            '--tags', '4', '--ingredients', '30', stdout=StringIO())
+
+    def run_check(self):
+        stdout = StringIO()
+        try:
+            call_command('check_query_plans', stdout=stdout)
+        finally:
+            self.output = stdout.getvalue().splitlines()
+
+    def test_all_paths_use_indexes(self):
+        self.run_check()
+        context = mock.MagicMock()
+        expected = [
+            f'{name}: OK' for name, _, _, _, *vendors
+            in check_query_plans.endpoint_requests(context)
+            if not vendors or 'sqlite' in vendors[0]
+        ]
+        self.assertEqual(self.output[:-1], expected)
+        self.assertEqual(self.output[-1], 'Все запросы используют индексы.')
+
+    def test_full_scan_reported(self):
+        '''Без разрешения на полный проход по recipes_tag список тегов
+        становится ошибкой.'''
+        endpoint_requests = check_query_plans.endpoint_requests
+
+        def strict(context):
+            return [
+                (name, path, auth, set(), *vendors)
+                if name == 'tags: список'
+                else (name, path, auth, allowed, *vendors)
+                for name, path, auth, allowed, *vendors
+                in endpoint_requests(context)
+            ]
+
+        with mock.patch.object(
+                check_query_plans, 'endpoint_requests', strict):
+            with self.assertRaisesMessage(
+                    CommandError, 'Запросов без подходящего индекса: 1.'):
+                self.run_check()
+        self.assertIn('tags: список: полный проход по recipes_tag',
+                      self.output)
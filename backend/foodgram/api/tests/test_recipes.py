@@ -0,0 +1,256 @@
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from .factories import (create_catalog, create_user, create_viewer,
+                        image_data)
+from recipes.models import Favourite, Ingredient, Recipe, RecipeIngredient
+from users.models import Subscribe
+
+# Запросов на страницу списка рецептов при холодном кэше — при любом
+# размере страницы.
+ANONYMOUS_QUERIES = 4
+AUTHENTICATED_QUERIES = 8
+# Карточка рецепта из кэша анонимных ответов: версия для ETag
+# и свежие счётчики.
+CACHED_DETAIL_QUERIES = 2
+
+
+class RecipeListQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_catalog()
+        cls.viewer, cls.token = create_viewer(authors, recipes)
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_constant_queries(self, queries, **headers):
+        for limit in (6, 50):
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = self.client.get(
+                    f'/api/recipes/?limit={limit}', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(ANONYMOUS_QUERIES)
+
+    def test_authenticated(self):
+        self.assert_constant_queries(
+            AUTHENTICATED_QUERIES, Authorization=f'Token {self.token}')
+
+    def test_flags(self):
+        response = self.client.get(
+            '/api/recipes/?limit=50',
+            headers={'Authorization': f'Token {self.token}'})
+        recipes = {recipe['id']: recipe for recipe in response.json()[
+            'results']}
+        favorited = {pk for pk, recipe in recipes.items()
+                     if recipe['is_favorited']}
+        in_cart = {pk for pk, recipe in recipes.items()
+                   if recipe['is_in_shopping_cart']}
+        self.assertEqual(favorited, set(
+            self.viewer.favorites.values_list('recipe_id', flat=True)))
+        self.assertEqual(in_cart, set(
+            self.viewer.shopping.values_list('recipe_id', flat=True)))
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, recipes = create_catalog(recipes=8)
+        cls.viewer, cls.token = create_viewer(authors, recipes)
+
+    def test_ordering_rejected(self):
+        for query in ('search=Рецепт', 'ordering=-favorites_count'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    f'/api/recipes/?pagination=cursor&{query}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_pages(self):
+        response = self.client.get('/api/recipes/?pagination=cursor&limit=5')
+        first = [recipe['id'] for recipe in response.json()['results']]
+        response = self.client.get(response.json()['next'])
+        second = [recipe['id'] for recipe in response.json()['results']]
+        self.assertEqual(first + second, sorted(first + second, reverse=True))
+        self.assertEqual(len(first + second), 8)
+
+    def test_subscriptions(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?pagination=cursor&limit=1',
+            headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNotNone(response.json()['next'])
+
+
+class RecipeUpdateTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_catalog(recipes=3)
+        cls.token = Token.objects.create(user=authors[0]).key
+
+    def test_composition_replaced(self):
+        recipe = self.recipes[0]
+        kept, changed, removed = recipe.recipe_ingredients.order_by('amount')
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'tags': [recipe.tags.first().id], 'ingredients': [
+                {'id': kept.ingredient_id, 'amount': kept.amount},
+                {'id': changed.ingredient_id, 'amount': 7},
+            ]},
+            content_type='application/json',
+            headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount')),
+            {kept.ingredient_id: kept.amount, changed.ingredient_id: 7})
+        self.assertFalse(
+            recipe.recipe_ingredients.filter(pk=removed.pk).exists())
+
+    def save(self, method, path, ingredients):
+        return getattr(self.client, method)(
+            path,
+            {'name': f'Рецепт {ingredients[0].id}-{len(ingredients)}',
+             'text': 'Текст',
+             'cooking_time': 5, 'tags': [self.tag_id],
+             'ingredients': [{'id': ingredient.id, 'amount': 2}
+                             for ingredient in ingredients]},
+            content_type='application/json',
+            headers={'Authorization': f'Token {self.token}'})
+
+    def assert_queries_do_not_grow(self, method, single, many):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.save(method, *single)
+        self.assertLess(response.status_code, 300)
+        with self.assertNumQueries(len(queries)):
+            response = self.save(method, *many)
+        self.assertEqual(len(response.json()['ingredients']), len(many[1]))
+        return response.json()['id']
+
+    def test_composition_queries_do_not_grow(self):
+        '''Состав пишется пачками: запросов при одном ингредиенте
+        столько же, сколько при двадцати — и при создании рецепта,
+        и при замене его состава.'''
+        self.tag_id = self.recipes[0].tags.first().id
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Новый {number:02}', measurement_unit='г')
+            for number in range(40)
+        ]
+        single_id = self.save(
+            'post', '/api/recipes/', ingredients[:1]).json()['id']
+        many_id = self.assert_queries_do_not_grow(
+            'post', ('/api/recipes/', ingredients[1:2]),
+            ('/api/recipes/', ingredients[:20]))
+        self.assert_queries_do_not_grow(
+            'patch', (f'/api/recipes/{single_id}/', ingredients[20:21]),
+            (f'/api/recipes/{many_id}/', ingredients[20:40]))
+
+    def test_composition_rows_deleted_in_one_batch(self):
+        '''Обработчики удаления строк состава срабатывают один раз
+        на весь queryset: запросов на строки одного рецепта и на строки
+        всех рецептов одинаково, а updated_at меняется у каждого.'''
+        first, *others = self.recipes
+        row = first.recipe_ingredients.first()
+        with CaptureQueriesContext(connection) as single:
+            RecipeIngredient.objects.filter(pk=row.pk).delete()
+        before = dict(Recipe.objects.values_list('id', 'updated_at'))
+        with self.assertNumQueries(len(single)):
+            RecipeIngredient.objects.filter(
+                recipe__in=others).delete()
+        after = dict(Recipe.objects.values_list('id', 'updated_at'))
+        for recipe in others:
+            self.assertGreater(after[recipe.id], before[recipe.id])
+        self.assertFalse(
+            RecipeIngredient.objects.filter(recipe__in=others).exists())
+
+    def test_upload_goes_to_temporary_media(self):
+        recipe = self.recipes[0]
+        response = self.client.post(
+            '/api/recipes/',
+            {'name': 'С картинкой', 'text': 'Описание', 'cooking_time': 5,
+             'image': image_data(), 'tags': [recipe.tags.first().id],
+             'ingredients': [{'id': recipe.ingredients.first().id,
+                              'amount': 1}]},
+            content_type='application/json',
+            headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 201)
+        image = Recipe.objects.get(id=response.json()['id']).image
+        self.assertTrue(image.path.startswith(settings.MEDIA_ROOT))
+        self.assertTrue(os.path.exists(image.path))
+        self.assertNotEqual(
+            settings.MEDIA_ROOT, os.path.join(settings.BASE_DIR, 'media'))
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_catalog(recipes=4)
+        cls.viewer, cls.token = create_viewer(authors, cls.recipes)
+        cls.other = create_user('other')
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, path, **headers):
+        etag = self.client.get(path, headers=headers)['ETag']
+        return lambda: self.client.get(
+            path, headers={**headers, 'If-None-Match': etag})
+
+    def test_counters_change_validators(self):
+        recipe = self.recipes[0]
+        auth = {'Authorization': f'Token {self.token}'}
+        checks = [
+            self.revalidate(path, **headers)
+            for path in ('/api/recipes/', f'/api/recipes/{recipe.id}/',
+                         '/api/recipes/?ordering=-favorites_count')
+            for headers in ({}, auth)
+        ]
+        for check in checks:
+            self.assertEqual(check().status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favourite.objects.create(user=self.other, recipe=recipe)
+        for check in checks:
+            response = check()
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['id'], recipe.id)
+        recipe.refresh_from_db()
+        self.assertEqual(response.json()['results'][0]['favorites_count'],
+                         recipe.favorites_count)
+
+    def test_followers_change_retrieve(self):
+        recipe = self.recipes[0]
+        check = self.revalidate(f'/api/recipes/{recipe.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscribe.objects.create(user=self.other, author=recipe.author)
+        response = check()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['author']['followers_count'], 2)
+
+    def test_favorite_keeps_other_recipes(self):
+        recipe, other = self.recipes[:2]
+        path = f'/api/recipes/{other.id}/'
+        etag = self.client.get(path)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Favourite.objects.create(user=self.other, recipe=recipe)
+        # ETag и закэшированное тело другого рецепта те же: отдаются
+        # проверкой версии и подстановкой счётчиков в ответ из кэша.
+        with self.assertNumQueries(CACHED_DETAIL_QUERIES):
+            response = self.client.get(path)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(
+            path, headers={'If-None-Match': etag}).status_code, 304)
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        recipe.refresh_from_db()
+        self.assertEqual(response.json()['favorites_count'],
+                         recipe.favorites_count)
@@ -0,0 +1,138 @@
+from django.test import TestCase
+
+from .factories import create_catalog, create_viewer
+from recipes import shopping_list
+from recipes.models import Favourite, Recipe, ShoppingCart, ShoppingListItem
+
+
+class RelationsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_catalog(recipes=8)
+        cls.viewer, token = create_viewer(authors, cls.recipes)
+        cls.auth = {'Authorization': f'Token {token}'}
+
+    def post(self, path, data=None):
+        return self.client.post(path, data, content_type='application/json',
+                                headers=self.auth)
+
+    def delete(self, path, data=None):
+        return self.client.delete(path, data,
+                                  content_type='application/json',
+                                  headers=self.auth)
+
+    def counters(self, field):
+        return dict(Recipe.objects.values_list('id', field))
+
+    def items(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.viewer).values_list('ingredient_id', 'amount'))
+
+    def assert_items_rebuilt(self):
+        items = self.items()
+        self.assertEqual(shopping_list.rebuild([self.viewer.id]), (0, 0, 0))
+        self.assertEqual(self.items(), items)
+
+    def test_single_favorite(self):
+        recipe = self.recipes[0]
+        path = f'/api/recipes/{recipe.id}/favorite/'
+        created = self.post(path)
+        self.assertEqual(created.status_code, 201)
+        repeated = self.post(path)
+        self.assertEqual(repeated.status_code, 200)
+        self.assertEqual(repeated.json(), created.json())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(self.delete(path).status_code, 204)
+        self.assertEqual(self.delete(path).status_code, 204)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(self.post('/api/recipes/0/favorite/').status_code,
+                         404)
+
+    def test_single_shopping_cart(self):
+        recipe = self.recipes[0]
+        path = f'/api/recipes/{recipe.id}/shopping_cart/'
+        self.assertEqual(self.post(path).status_code, 201)
+        self.assertEqual(self.post(path).status_code, 200)
+        self.assert_items_rebuilt()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assertEqual(self.delete(path).status_code, 204)
+        self.assertEqual(self.delete(path).status_code, 204)
+        self.assert_items_rebuilt()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 0)
+
+    def test_queryset_delete_updates_counters_and_lists(self):
+        '''Удаление queryset'ом (например, из админки) обновляет
+        счётчики и список покупок так же, как эндпоинты.'''
+        in_cart = list(ShoppingCart.objects.filter(
+            user=self.viewer).values_list('recipe_id', flat=True))
+        before = self.counters('in_carts_count')
+        ShoppingCart.objects.filter(
+            user=self.viewer, recipe_id__in=in_cart[:2]).delete()
+        after = self.counters('in_carts_count')
+        for pk in in_cart[:2]:
+            self.assertEqual(after[pk], before[pk] - 1)
+        self.assert_items_rebuilt()
+        before = self.counters('favorites_count')
+        Favourite.objects.filter(user=self.viewer).delete()
+        after = self.counters('favorites_count')
+        self.assertEqual(
+            sum(before.values()) - sum(after.values()), 4)
+
+    def test_bulk_favorites(self):
+        before = self.counters('favorites_count')
+        already = self.recipes[-1].id
+        ids = [self.recipes[0].id, self.recipes[1].id, already]
+        response = self.post('/api/recipes/favorite/', {'recipes': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changed'], sorted(ids[:2]))
+        self.assertEqual(response.json()['recipes'], sorted(
+            Favourite.objects.filter(
+                user=self.viewer).values_list('recipe_id', flat=True)))
+        repeated = self.post('/api/recipes/favorite/', {'recipes': ids})
+        self.assertEqual(repeated.json()['changed'], [])
+        after = self.counters('favorites_count')
+        self.assertEqual(
+            {pk for pk in after if after[pk] != before[pk]}, set(ids[:2]))
+        self.assertTrue(all(after[pk] == before[pk] + 1 for pk in ids[:2]))
+
+        response = self.delete('/api/recipes/favorite/', {'recipes': ids})
+        self.assertEqual(response.json()['changed'], sorted(ids))
+        repeated = self.delete('/api/recipes/favorite/', {'recipes': ids})
+        self.assertEqual(repeated.json()['changed'], [])
+        after = self.counters('favorites_count')
+        self.assertEqual(after[already], before[already] - 1)
+        self.assertEqual(after[ids[0]], before[ids[0]])
+
+    def test_bulk_shopping_carts(self):
+        before = self.counters('in_carts_count')
+        in_cart = set(ShoppingCart.objects.filter(
+            user=self.viewer).values_list('recipe_id', flat=True))
+        ids = [recipe.id for recipe in self.recipes[:2]] + [max(in_cart)]
+        response = self.post('/api/recipes/shopping_cart/', {'recipes': ids})
+        self.assertEqual(response.json()['changed'], sorted(ids[:2]))
+        self.assertEqual(self.post(
+            '/api/recipes/shopping_cart/', {'recipes': ids}
+        ).json()['changed'], [])
+        self.assert_items_rebuilt()
+        after = self.counters('in_carts_count')
+        self.assertTrue(all(after[pk] == before[pk] + 1 for pk in ids[:2]))
+        self.assertEqual(after[ids[2]], before[ids[2]])
+
+        response = self.delete(
+            '/api/recipes/shopping_cart/', {'recipes': ids})
+        self.assertEqual(response.json()['changed'], sorted(ids))
+        self.assertEqual(self.delete(
+            '/api/recipes/shopping_cart/', {'recipes': ids}
+        ).json()['changed'], [])
+        self.assert_items_rebuilt()
+        after = self.counters('in_carts_count')
+        self.assertEqual(after[ids[2]], before[ids[2]] - 1)
+
+    def test_unknown_recipes_ignored(self):
+        response = self.post('/api/recipes/favorite/', {'recipes': [10 ** 6]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changed'], [])
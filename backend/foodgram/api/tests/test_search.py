@@ -0,0 +1,98 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from .factories import create_catalog
+from recipes import search
+from recipes.models import Recipe
+
+
+class SearchQueryTest(SimpleTestCase):
+    def test_sqlite_match(self):
+        self.assertEqual(search.sqlite_match('блины с "мёдом" OR*'),
+                         '"блины" "с" "мёдом" "OR"*')
+        self.assertEqual(search.sqlite_match(' -* '), '')
+
+    def test_postgresql_tsquery(self):
+        self.assertEqual(search.postgresql_tsquery('блины с мёд'),
+                         'блины & с & мёд:*')
+        self.assertEqual(search.postgresql_tsquery('!:*'), '')
+
+
+class RecipeSearchTest(TestCase):
+    '''FTS5 и триггеры миграции 0006 на SQLite тестов.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        _, recipes = create_catalog(recipes=4, authors=1, tags=2)
+        cls.pancakes, cls.soup, cls.porridge, cls.salad = recipes
+        Recipe.objects.filter(id=cls.pancakes.id).update(
+            name='Блины', text='Тонкие блины на молоке.')
+        Recipe.objects.filter(id=cls.soup.id).update(
+            name='Суп', text='Подавать с блинами или хлебом.')
+        Recipe.objects.filter(id=cls.porridge.id).update(
+            name='Каша', text='Овсяная каша на молоке.')
+
+    def found(self, query):
+        return list(search.search_recipes(
+            Recipe.objects.all(), query).values_list('id', flat=True))
+
+    def indexed(self, recipe_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT name, text FROM recipes_recipe_fts WHERE rowid = %s',
+                [recipe_id])
+            return cursor.fetchall()
+
+    def test_name_ranked_above_text(self):
+        Recipe.objects.filter(id=self.salad.id).update(
+            name='Салат', text='Хлеб к супу.')
+        self.assertEqual(self.found('суп'), [self.soup.id, self.salad.id])
+
+    def test_prefix(self):
+        self.assertEqual(self.found('бли'), [self.pancakes.id, self.soup.id])
+        self.assertEqual(self.found('молоке ка'), [self.porridge.id])
+        self.assertEqual(self.found('ка молоке'), [])
+
+    def test_operators_ignored(self):
+        self.assertEqual(self.found('"'), [])
+        self.assertEqual(self.found('Блины OR Каша'), [])
+
+    def test_insert_update_delete(self):
+        recipe = Recipe.objects.create(
+            name='Оладьи', author=self.soup.author, text='На кефире.',
+            cooking_time=20, image='recipes/test.png')
+        self.assertEqual(self.found('кефир'), [recipe.id])
+        recipe.text = 'На простокваше.'
+        recipe.save()
+        self.assertEqual(self.found('кефир'), [])
+        self.assertEqual(self.found('простокваш'), [recipe.id])
+        Recipe.objects.filter(id=recipe.id).update(name='Сырники')
+        self.assertEqual(self.found('оладьи'), [])
+        self.assertEqual(self.found('сырники'), [recipe.id])
+        recipe.delete()
+        self.assertEqual(self.indexed(recipe.id), [])
+        self.assertEqual(self.found('сырники'), [])
+
+    def test_triggers_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER recipes_recipe_fts_update')
+        Recipe.objects.filter(id=self.salad.id).update(name='Винегрет')
+        self.assertEqual(self.found('винегрет'), [])
+        search.restore_sqlite_triggers(connection)
+        self.assertEqual(self.found('винегрет'), [self.salad.id])
+        Recipe.objects.filter(id=self.salad.id).update(name='Оливье')
+        self.assertEqual(self.found('оливье'), [self.salad.id])
+
+    def test_filter_combined_with_tags(self):
+        tag = self.soup.tags.order_by('id').last()
+        self.assertNotIn(tag, self.pancakes.tags.all())
+        response = self.client.get(
+            '/api/recipes/', {'search': 'блин', 'tags': tag.slug})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.soup.id])
+        response = self.client.get('/api/recipes/', {'search': 'блин'})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.pancakes.id, self.soup.id])
@@ -0,0 +1,80 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from .factories import create_catalog, create_user
+from recipes import shopping_list
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+class ShoppingListTotalsTest(TestCase):
+    '''Инкрементальные итоги списка покупок совпадают с пересчётом
+    rebuild() с нуля.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        authors, cls.recipes = create_catalog(
+            recipes=4, authors=1, ingredients=5)
+        cls.token = Token.objects.create(user=authors[0]).key
+        cls.buyers = [create_user(number) for number in (10, 11)]
+
+    def totals(self, user):
+        return dict(ShoppingListItem.objects.filter(
+            user=user).values_list('ingredient_id', 'amount'))
+
+    def assert_rebuilt(self):
+        user_ids = [buyer.id for buyer in self.buyers]
+        self.assertEqual(
+            shopping_list.rebuild(user_ids, dry_run=True), (0, 0, 0))
+        self.assertEqual(
+            {(item.user_id, item.ingredient_id): item.amount
+             for item in ShoppingListItem.objects.filter(
+                 user_id__in=user_ids)},
+            shopping_list.expected_totals(user_ids))
+
+    def test_add_and_remove_recipe(self):
+        buyer = self.buyers[0]
+        first, second = self.recipes[:2]
+        ShoppingCart.objects.create(user=buyer, recipe=first)
+        ShoppingCart.objects.create(user=buyer, recipe=second)
+        self.assert_rebuilt()
+        shared = set(first.ingredients.values_list('id', flat=True)) & set(
+            second.ingredients.values_list('id', flat=True))
+        self.assertTrue(shared)
+        ShoppingCart.objects.get(user=buyer, recipe=second).delete()
+        self.assert_rebuilt()
+        self.assertEqual(
+            self.totals(buyer),
+            dict(first.recipe_ingredients.values_list(
+                'ingredient_id', 'amount')))
+
+    def test_totals_drop_to_zero(self):
+        buyer = self.buyers[0]
+        ShoppingCart.objects.create(user=buyer, recipe=self.recipes[0])
+        ShoppingCart.objects.get(user=buyer).delete()
+        self.assertEqual(self.totals(buyer), {})
+        self.assert_rebuilt()
+
+    def test_composition_edited_in_several_carts(self):
+        recipe, other = self.recipes[:2]
+        for buyer in self.buyers:
+            ShoppingCart.objects.create(user=buyer, recipe=recipe)
+        ShoppingCart.objects.create(user=self.buyers[1], recipe=other)
+        kept, changed, removed = recipe.recipe_ingredients.order_by('amount')
+        added = self.recipes[3].recipe_ingredients.order_by('amount').first()
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'tags': [recipe.tags.first().id], 'ingredients': [
+                {'id': kept.ingredient_id, 'amount': kept.amount},
+                {'id': changed.ingredient_id, 'amount': 9},
+                {'id': added.ingredient_id, 'amount': 4},
+            ]},
+            content_type='application/json',
+            headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assert_rebuilt()
+        self.assertEqual(self.totals(self.buyers[0]), {
+            kept.ingredient_id: kept.amount,
+            changed.ingredient_id: 9,
+            added.ingredient_id: 4,
+        })
+        self.assertNotIn(removed.ingredient_id, self.totals(self.buyers[0]))
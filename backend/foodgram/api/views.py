@@ -1,122 +1,371 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import FileUploadParser, MultiPartParser
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from . import conditional, documents
+from .cache import AnonymousCacheMixin
+from .conditional import ConditionalGetMixin
 from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import PageLimitPagination
+from .fragments import FragmentCacheMixin, display_queryset
+from .ingredient_index import current_version, ingredient_index
+from .instrumentation import TimedViewMixin, section, timed
+from .light_serializers import (SUBSCRIPTION_VALUES, IngredientValuesMixin,
+                                subscriptions_data)
+from .pagination import SelectablePagination
 from .permissions import AdminOrReadOnly, AdminUserOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscriptionSerializer,
-                          TagSerializer)
-from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
+from .serializers import (IngredientSerializer, RecipeCreateSerializer,
+                          RecipeIdsSerializer, RecipeImageSerializer,
+                          RecipeSerializer, ShoppingListItemSerializer,
+                          ShoppingListJobSerializer, ShortRecipeSerializer,
+                          SubscriptionSerializer, TagSerializer)
+from .shopping_list import RENDERERS, list_rows
+from recipes import relations
+from recipes.models import (DeletedRecipe, Favourite, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, ShoppingListJob,
+                            Tag)
 from users.models import Subscribe, User
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(TimedViewMixin, ConditionalGetMixin,
+                  viewsets.ReadOnlyModelViewSet):
     permission_classes = (AdminOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    query_budgets = {'list': 4, 'retrieve': 4}
+
+    def get_validators(self, request):
+        state = Tag.objects.aggregate(Count('id'), Max('updated_at'))
+        return ((self.kwargs.get('pk'), *state.values()),
+                state['updated_at__max'])
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(TimedViewMixin, ConditionalGetMixin,
+                         IngredientValuesMixin,
+                         viewsets.ReadOnlyModelViewSet):
     permission_classes = (AdminOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientSearchFilter
     search_fields = ('name__startswith',)
+    search_limit = 50
+    query_budgets = {'list': 4, 'retrieve': 4}
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(request, lambda: Response(
+            ingredient_index.search(name, self.search_limit)))
 
+    def get_validators(self, request):
+        # Версия индекса одна на все ответы: ответы различают id
+        # ингредиента и параметры, а name поиск сравнивает без регистра.
+        return (current_version(), self.kwargs.get('pk'),
+                conditional.query_digest(request, {'name': str.casefold})
+                ), None
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(TimedViewMixin, ConditionalGetMixin,
+                    AnonymousCacheMixin, FragmentCacheMixin,
+                    viewsets.ModelViewSet):
     permission_classes = (AdminUserOrReadOnly,)
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = PageLimitPagination
+    pagination_class = SelectablePagination
+    query_budgets = {
+        'list': 16, 'retrieve': 11, 'changes': 4,
+        'create': 28, 'update': 26, 'partial_update': 26, 'destroy': 18,
+        'favorite': 8, 'delete_favorite': 10,
+        'favorites': 8, 'delete_favorites': 10,
+        'shopping_cart': 15, 'delete_shopping_cart': 17,
+        'shopping_carts': 15, 'delete_shopping_carts': 17,
+        'shopping_list': 4, 'download_shopping_cart': 4,
+        'shopping_cart_jobs': 5, 'shopping_cart_job': 4,
+    }
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return display_queryset()
+        return super().get_queryset()
+
+    def get_validators(self, request):
+        if self.action != 'retrieve':
+            # Счётчики рецептов на странице меняются без updated_at,
+            # а какие рецепты на неё попадут, известно только после
+            # выборки: ETag списка считается по телу ответа, и
+            # избранное одного рецепта не меняет ETag чужих страниц.
+            return None, None
+        pk = self.kwargs['pk']
+        # Счётчики меняются без updated_at, поэтому входят в ETag.
+        version = Recipe.objects.filter(
+            pk=pk if pk.isdigit() else None
+        ).values_list(
+            'updated_at', 'favorites_count', 'in_carts_count',
+            'author__recipes_count', 'author__followers_count',
+        ).first()
+        return (pk, version, conditional.user_state(request.user)), None
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    def perform_content_negotiation(self, request, force=False):
+        '''Файл списка покупок в неизвестном формате — 400, а не 404
+        от DRF и не молчаливый txt (как было для ?format=json). Ответ
+        об ошибке согласуется повторно с force и уходит в JSON.'''
+        file_format = request.query_params.get(
+            api_settings.URL_FORMAT_OVERRIDE)
+        if (self.action == 'download_shopping_cart' and not force
+                and file_format and file_format not in RENDERERS):
+            raise ValidationError({
+                'format': f'Доступные форматы: {", ".join(RENDERERS)}.'
+            })
+        return super().perform_content_negotiation(request, force)
+
+    @action(detail=False, methods=['GET'])
+    def changes(self, request):
+        try:
+            # None — строка не похожа на дату, ValueError — дата
+            # невозможная (например, 2023-13-45T00:00:00).
+            since = parse_datetime(request.query_params.get(
+                'updated_since', '').replace(' ', '+'))
+        except ValueError:
+            since = None
+        if since is None:
+            raise ValidationError({
+                'updated_since': 'Укажите дату и время в формате ISO 8601.'
+            })
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, timezone.utc)
+        # updated_at и deleted_at ставятся до коммита, поэтому строки из
+        # транзакций, закоммиченных после прошлого опроса, могут быть
+        # старше его timestamp. Отдаём изменения с запасом: повторно
+        # полученные id клиенту безвредны, пропущенные — нет.
+        since -= timedelta(seconds=settings.RECIPE_CHANGES_OVERLAP)
+        if since < DeletedRecipe.horizon():
+            return Response(
+                {'updated_since': 'Записи об удалениях за этот период уже '
+                                  'не хранятся, загрузите рецепты заново.'},
+                status=status.HTTP_410_GONE)
+        timestamp = timezone.now()
+        updated = Recipe.objects.filter(
+            updated_at__gt=since).order_by().values_list('id', flat=True)
+        deleted = DeletedRecipe.objects.filter(
+            deleted_at__gt=since).values_list('recipe_id', flat=True)
+        return Response({
+            'timestamp': timestamp,
+            'updated': sorted(updated, reverse=True),
+            'deleted': sorted(set(deleted)),
+        })
+
     @staticmethod
-    def post_method(request, pk, serializers):
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializers(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def post_method(request, pk, model):
+        '''Идемпотентно, как и пачка: 201, если рецепт добавлен,
+        и 200 с тем же телом, если он уже был.'''
+        recipe = get_object_or_404(Recipe, id=pk)
+        added = relations.add(model, request.user.id, [recipe.id])
+        return Response(
+            ShortRecipeSerializer(recipe, context={'request': request}).data,
+            status=status.HTTP_201_CREATED if added else status.HTTP_200_OK)
 
     @staticmethod
     def delete_method(request, pk, model):
-        user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
-        model_obj = get_object_or_404(model, user=user, recipe=recipe)
-        model_obj.delete()
+        relations.remove(model, request.user.id, [recipe.id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def bulk_method(request, model, change):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = change(
+            model, request.user.id, serializer.validated_data['recipes'])
+        return Response({
+            'changed': sorted(changed),
+            'recipes': relations.recipe_ids(model, request.user.id),
+        })
+
     @action(detail=True, methods=["POST"],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
         return self.post_method(
-            request=request, pk=pk, serializers=FavoriteSerializer)
+            request=request, pk=pk, model=Favourite)
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
         return self.delete_method(
             request=request, pk=pk, model=Favourite)
 
+    @action(detail=False, methods=['POST'], url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    def favorites(self, request):
+        return self.bulk_method(request, Favourite, relations.add)
+
+    @favorites.mapping.delete
+    def delete_favorites(self, request):
+        return self.bulk_method(request, Favourite, relations.remove)
+
     @action(detail=True, methods=["POST"],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
-        self.queryset = self.queryset.prefetch_related('shopping')
         return self.post_method(
-            request=request, pk=pk, serializers=ShoppingCartSerializer)
+            request=request, pk=pk, model=ShoppingCart)
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
         return self.delete_method(
             request=request, pk=pk, model=ShoppingCart)
 
-    @action(detail=False, methods=['GET'],
+    @action(detail=False, methods=['POST'], url_path='shopping_cart',
             permission_classes=[IsAuthenticated])
+    def shopping_carts(self, request):
+        return self.bulk_method(request, ShoppingCart, relations.add)
+
+    @shopping_carts.mapping.delete
+    def delete_shopping_carts(self, request):
+        return self.bulk_method(request, ShoppingCart, relations.remove)
+
+    @action(detail=True, methods=['PUT'],
+            parser_classes=[MultiPartParser, FileUploadParser])
+    def image(self, request, pk):
+        '''Файл в поле image формы или телом запроса с заголовком
+        Content-Disposition; большие файлы Django пишет на диск
+        по частям, не держа их в памяти.'''
+        recipe = self.get_object()
+        serializer = RecipeImageSerializer(
+            recipe,
+            data={'image': request.data.get('image',
+                                            request.data.get('file'))},
+            context={'request': request},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[JSONRenderer, TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              PDFShoppingListRenderer])
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).order_by('ingredient__name').annotate(total=Sum('amount'))
-
-        content = ''
-        for ingredient in ingredients:
-            ingredient_name = ingredient['ingredient__name']
-            total_amount = ingredient['total']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            line = f'{ingredient_name} ({measurement_unit}) — {total_amount}\n'
-            content += line
-
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename=shopping_cart.txt'
+        renderer = request.accepted_renderer
+        if renderer.format not in RENDERERS:
+            # Формат не указан, а Accept допускает JSON: файлом по
+            # умолчанию остаётся txt.
+            renderer = TextShoppingListRenderer()
+        ingredients = list_rows(request.user)
+
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        chunks = RENDERERS[renderer.format](ingredients.iterator())
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_cart.{renderer.format}')
 
         return response
 
+    @action(detail=False, methods=['POST'],
+            url_path='download_shopping_cart/jobs',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_jobs(self, request):
+        '''Заказ файла списка покупок: 202 и id заказа, пока файл
+        собирается, или сразу 200 со ссылкой, если файл этой версии
+        списка уже есть.'''
+        file_format = request.data.get('format', 'pdf')
+        if file_format not in documents.FORMATS:
+            raise ValidationError({
+                'format': f'Доступные форматы: '
+                          f'{", ".join(documents.FORMATS)}.'
+            })
+        job, _ = documents.request_document(request.user, file_format)
+        serializer = ShoppingListJobSerializer(
+            job, context={'request': request})
+        if job.status == ShoppingListJob.DONE:
+            return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['GET'],
+            url_path=r'download_shopping_cart/jobs/(?P<job_id>\d+)',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_job(self, request, job_id):
+        job = get_object_or_404(
+            ShoppingListJob, id=job_id, user=request.user)
+        return Response(ShoppingListJobSerializer(
+            job, context={'request': request}).data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=[IsAuthenticated])
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = timed(ShoppingListItemSerializer(items, many=True))
+        return Response(serializer.data)
+
 
-class CustomUserViewSet(UserViewSet):
-    pagination_class = PageLimitPagination
+class CustomUserViewSet(TimedViewMixin, UserViewSet):
+    pagination_class = SelectablePagination
+    cursor_ordering = 'id'
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ('id', 'recipes_count', 'followers_count')
+    query_budgets = {
+        'list': 5, 'retrieve': 4, 'me': 3, 'create': 10, 'set_password': 6,
+        'subscriptions': 6, 'subscribe': 10, 'unsubscribe': 10,
+    }
     ''' Я понимаю, что нужно было просто убрать ветку с elif, но решила переписать код
     Сейчас вроде как все должно быть корректно. '''
 
-    @staticmethod
-    def post_method(request, id, serializers):
+    def get_recent_recipes(self):
+        '''Рецепты авторов для подписок: последние recipes_limit
+        у каждого автора.'''
+        recipes = Recipe.objects.all()
+        limit = self.request.query_params.get('recipes_limit')
+        if not (limit and limit.isdigit()):
+            return recipes
+        return recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=F('id').desc(),
+        )).filter(row_number__lte=int(limit))
+
+    def get_subscriptions(self, **filters):
+        '''Подписки вместе с последними recipes_limit рецептами
+        авторов — за три запроса на всю страницу.'''
+        return Subscribe.objects.filter(**filters).select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch('author__recipes', queryset=self.get_recent_recipes(),
+                     to_attr='recent_recipes')
+        ).order_by('id')
+
+    def get_subscription_rows(self, **filters):
+        '''Подписки строками SUBSCRIPTION_VALUES для subscriptions_data.'''
+        return Subscribe.objects.filter(**filters).order_by('id').values(
+            *SUBSCRIPTION_VALUES)
+
+    def post_method(self, request, id, serializers):
         user = request.user
         author = get_object_or_404(User, id=id)
         if user == author:
@@ -130,7 +379,8 @@ class CustomUserViewSet(UserViewSet):
 
         follow = Subscribe.objects.create(user=user, author=author)
         serializer = serializers(
-            follow, context={'request': request}
+            self.get_subscriptions(id=follow.id).get(),
+            context={'request': request}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -160,13 +410,11 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        queryset = Subscribe.objects.filter(user=user)
+        queryset = self.get_subscription_rows(user=request.user)
         pages = self.paginate_queryset(queryset)
         if pages is not None:
-            serializer = SubscriptionSerializer(
-                pages, many=True,
-                context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
+            with section('serialize'):
+                data = subscriptions_data(
+                    pages, self.get_recent_recipes(), request)
+            return self.get_paginated_response(data)
         raise NotFound()
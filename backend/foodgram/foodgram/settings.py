@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -9,7 +10,7 @@ load_dotenv()
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 
-DEBUG = False
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = ['*']
 
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,6 +78,32 @@ DATABASES = {
     }
 }
 
+# Кэш общий для всех воркеров и с атомарным add(): на нём держатся
+# поколения ответов и блокировка их пересборки (api.cache). Файловый
+# кэш не проходит системную проверку api.E001, LocMemCache и DummyCache
+# без DEBUG — api.E002. Тесты подменяют кэш в своём раннере.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/1'),
+    }
+}
+
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics'))
+METRICS_FLUSH_INTERVAL = 5
+# Server-Timing во всех ответах; без этого — только сотрудникам.
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+# Токен сборщика метрик; пока он не задан, /metrics отвечает 404.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+QUERY_INSPECTION = os.getenv('QUERY_INSPECTION', 'sample')
+QUERY_INSPECTION_SAMPLE_RATE = float(
+    os.getenv('QUERY_INSPECTION_SAMPLE_RATE', 0.01))
+QUERY_REPEAT_LIMIT = int(os.getenv('QUERY_REPEAT_LIMIT', 5))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,6 +135,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+TEST_RUNNER = 'foodgram.test_runner.TemporaryMediaRunner'
+
+RECIPE_THUMBNAIL_SIZES = {'small': 320, 'medium': 640, 'large': 1280}
+RECIPE_THUMBNAIL_WORKERS = int(os.getenv('RECIPE_THUMBNAIL_WORKERS', 2))
+
+# /api/recipes/changes/ отдаёт изменения с запасом RECIPE_CHANGES_OVERLAP
+# секунд до updated_since: updated_at ставится до коммита, и строка из
+# долгой транзакции может стать видна позже, чем клиент получил timestamp.
+# Запас должен быть больше самой долгой транзакции, пишущей рецепты.
+RECIPE_CHANGES_OVERLAP = int(os.getenv('RECIPE_CHANGES_OVERLAP', 300))
+# Сколько дней хранятся записи об удалённых рецептах (prune_deleted_recipes).
+DELETED_RECIPES_RETENTION_DAYS = int(
+    os.getenv('DELETED_RECIPES_RETENTION_DAYS', 30))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -0,0 +1,39 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+# Тесты идут в одном процессе и не зависят от CACHE_BACKEND окружения:
+# у них свой LocMemCache, а проверка api.E002, запрещающая его
+# без DEBUG, для них отключена.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-tests',
+    }
+}
+
+
+class TemporaryMediaRunner(DiscoverRunner):
+    '''Тесты пишут загруженные картинки, миниатюры и файлы списков
+    покупок во временный MEDIA_ROOT, а не в media/ репозитория,
+    и кэшируют ответы в памяти процесса (TEST_CACHES).'''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.media_root = tempfile.mkdtemp(prefix='foodgram-media-')
+        self.media_settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CACHES=TEST_CACHES,
+            SILENCED_SYSTEM_CHECKS=[
+                *settings.SILENCED_SYSTEM_CHECKS, 'api.E002'],
+        )
+        self.media_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.media_settings.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,8 +1,21 @@
 from django.contrib import admin
 from django.contrib.admin import display
 
+from . import shopping_list
 from .models import (Favourite, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
+from .paginator import ApproximateCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    '''Список без полного COUNT(*): число строк на PostgreSQL берётся
+    из оценки планировщика, а счётчик «всего» под поиском не считается.
+    Поиск по связанным полям — по префиксу (__startswith), чтобы
+    работали индексы с varchar_pattern_ops.'''
+
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
 
 
 @admin.register(Tag)
@@ -12,40 +25,79 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('name', 'measurement_unit',)
-    search_fields = ('name', 'measurement_unit',)
-    list_filter = ('name', 'measurement_unit',)
+    search_fields = ('name__startswith',)
+    list_filter = ('measurement_unit',)
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
+    extra = 1
+    min_num = 1
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = ('name', 'id', 'author', 'cooking_time', 'total_favorites',)
-    search_fields = ('name', 'author', 'cooking_time', 'text',)
+    list_select_related = ('author',)
+    search_fields = ('name__startswith', 'author__username__startswith',
+                     'author__email__startswith')
     readonly_fields = ('total_favorites',)
-    list_filter = ('name', 'author', 'tags',)
+    list_filter = ('tags',)
+    autocomplete_fields = ('author', 'tags')
+    inlines = (RecipeIngredientInline,)
 
     @display(description='Количество в избранных')
     def total_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    def save_formset(self, request, form, formset, change):
+        '''Состав рецепта сохраняется тремя запросами на всю форму,
+        а не запросом на строку.'''
+        if formset.model is not RecipeIngredient:
+            return super().save_formset(request, form, formset, change)
+        recipe = form.instance
+        old_amounts = shopping_list.recipe_amounts(recipe.id)
+        items = formset.save(commit=False)
+        RecipeIngredient.objects.bulk_create(
+            [item for item in items if item.pk is None])
+        RecipeIngredient.objects.bulk_update(
+            [item for item in items if item.pk is not None],
+            ['ingredient', 'amount'])
+        RecipeIngredient.objects.filter(
+            pk__in=[item.pk for item in formset.deleted_objects]
+        ).delete()
+        if change:
+            shopping_list.update_recipe(
+                recipe.id, old_amounts, shopping_list.recipe_amounts(
+                    recipe.id))
+        return None
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredienAdmin(admin.ModelAdmin):
+class RecipeIngredienAdmin(LargeTableAdmin):
     list_display = ('recipe', 'ingredient', 'amount',)
-    search_fields = ('recipe', 'ingredient',)
-    list_filter = ('recipe', 'ingredient',)
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('recipe__name__startswith',
+                     'ingredient__name__startswith',)
+    raw_id_fields = ('recipe', 'ingredient')
 
 
 @admin.register(Favourite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user', 'recipe',)
-    list_filter = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username__startswith',
+                     'recipe__name__startswith',)
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user', 'recipe',)
-    list_filter = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username__startswith',
+                     'recipe__name__startswith',)
+    raw_id_fields = ('user', 'recipe')
@@ -0,0 +1,343 @@
+'''Потоковый импорт каталога: ингредиентов, тегов и рецептов.
+
+Файл читается по одной записи, записи копятся в пачки и сохраняются
+пачкой за один-два запроса. Повторный импорт того же файла ничего
+не дублирует: ингредиенты сопоставляются по названию и единице
+измерения, теги — по слагу, рецепты — по автору и названию.
+'''
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+
+User = get_user_model()
+
+INGREDIENT = 'ingredient'
+TAG = 'tag'
+RECIPE = 'recipe'
+MODELS = (INGREDIENT, TAG, RECIPE)
+
+JSON = 'json'
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (JSON, NDJSON, CSV)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def iter_json_array(file):
+    '''Элементы JSON-массива верхнего уровня по одному, не читая файл
+    в память целиком.'''
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CatalogError('JSON-файл должен содержать массив записей.')
+    buffer = buffer[1:]
+    eof = False
+    # После '[' и ',' ждём запись, после записи — ',' или ']'.
+    item_expected = True
+    empty = True
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            if eof:
+                raise CatalogError('JSON-файл оборван или повреждён.')
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        if buffer.startswith(']') and (empty or not item_expected):
+            return
+        if not item_expected:
+            if not buffer.startswith(','):
+                raise CatalogError(
+                    'Записи JSON-массива должны разделяться запятой.')
+            buffer = buffer[1:]
+            item_expected = True
+            continue
+        if buffer.startswith((',', ']')):
+            raise CatalogError(
+                'Лишняя запятая в JSON-массиве: между записями должна '
+                'быть ровно одна.')
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CatalogError('JSON-файл оборван или повреждён.')
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+        item_expected = empty = False
+
+
+def iter_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file):
+    '''В ячейках tags и ingredients рецептов ожидается JSON.'''
+    for row in csv.DictReader(file):
+        for field in ('tags', 'ingredients'):
+            if row.get(field):
+                row[field] = json.loads(row[field])
+        yield row
+
+
+READERS = {JSON: iter_json_array, NDJSON: iter_ndjson, CSV: iter_csv}
+
+
+def read_records(file, file_format, model=None):
+    '''Пары (модель, поля). Понимает и формат фикстур loaddata
+    ({"model": "recipes.ingredient", "fields": {...}}), и плоские
+    записи — для них модель задаётся аргументом. pk фикстуры
+    сохраняется в поле id: на эти id ссылаются другие фикстуры.'''
+    for record in READERS[file_format](file):
+        if 'fields' in record:
+            record_model = record['model'].rpartition('.')[2]
+            fields = record['fields']
+            if record.get('pk') is not None:
+                fields = {**fields, 'id': record['pk']}
+        else:
+            record_model, fields = model, record
+        if record_model not in MODELS:
+            raise CatalogError(
+                f'Неизвестный тип записи: {record_model or "не указан"}.')
+        yield record_model, fields
+
+
+def copy_rows(cursor, table, columns, rows, not_null=()):
+    '''Загрузка строк через COPY ... FROM STDIN (только PostgreSQL).
+    Пустые значения колонок not_null пишутся пустой строкой, а не NULL.'''
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    options = 'FORMAT csv'
+    if not_null:
+        options += f', FORCE_NOT_NULL ({", ".join(not_null)})'
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH ({options})',
+        buffer)
+
+
+def record_id(fields):
+    pk = fields.get('id')
+    return None if pk in (None, '') else int(pk)
+
+
+def ingredient_key(fields):
+    return (str(fields['name']).strip(),
+            str(fields['measurement_unit']).strip())
+
+
+class CatalogImporter:
+    def __init__(self, using='default'):
+        self.using = using
+        self.postgresql = connections[using].vendor == 'postgresql'
+        self.cart_user_ids = set()
+        self.author_ids_seen = set()
+
+    @transaction.atomic
+    def save_ingredients(self, batch):
+        '''Ингредиенты вставляются в порядке файла; записи с id (pk
+        фикстуры) получают ровно этот id. Уже существующие — по id или
+        по названию с единицей измерения — пропускаются.'''
+        rows = {}
+        for fields in batch:
+            rows.setdefault(ingredient_key(fields), record_id(fields))
+        if not rows:
+            return
+        if not self.postgresql:
+            Ingredient.objects.using(self.using).bulk_create(
+                [Ingredient(id=pk, name=name, measurement_unit=unit)
+                 for (name, unit), pk in rows.items()],
+                ignore_conflicts=True)
+        else:
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    'CREATE TEMP TABLE import_ingredient (position integer, '
+                    'id bigint, name varchar(200), '
+                    'measurement_unit varchar(200))')
+                copy_rows(cursor, 'import_ingredient',
+                          ('position', 'id', 'name', 'measurement_unit'),
+                          ((position, pk, name, unit) for position, (
+                              (name, unit), pk) in enumerate(rows.items())))
+                cursor.execute(
+                    'INSERT INTO recipes_ingredient '
+                    '(id, name, measurement_unit, updated_at) '
+                    'SELECT COALESCE(id, nextval(pg_get_serial_sequence('
+                    "'recipes_ingredient', 'id'))), name, measurement_unit, "
+                    '%s FROM import_ingredient ORDER BY position '
+                    'ON CONFLICT DO NOTHING',
+                    [timezone.now()])
+                cursor.execute('DROP TABLE import_ingredient')
+        if any(pk is not None for pk in rows.values()):
+            self.reset_sequence(Ingredient)
+
+    def reset_sequence(self, model):
+        '''После вставки явных id следующий автоматический id должен
+        идти за наибольшим (на PostgreSQL — setval, как в loaddata).'''
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    @transaction.atomic
+    def save_tags(self, batch):
+        tags = {
+            fields['slug']: Tag(name=fields['name'], color=fields['color'],
+                                slug=fields['slug'])
+            for fields in batch
+        }
+        Tag.objects.using(self.using).bulk_create(
+            tags.values(), update_conflicts=True, unique_fields=['slug'],
+            update_fields=['name', 'color', 'updated_at'])
+
+    def ingredient_ids(self, keys):
+        names = {name for name, _ in keys}
+        return {
+            (name, unit): pk for pk, name, unit in Ingredient.objects.using(
+                self.using).filter(name__in=names).values_list(
+                    'id', 'name', 'measurement_unit')
+            if (name, unit) in keys
+        }
+
+    def author_ids(self, authors):
+        emails = {author for author in authors if isinstance(author, str)}
+        ids = {author for author in authors if isinstance(author, int)}
+        found = {}
+        for pk, email in User.objects.using(self.using).filter(
+                email__in=emails).values_list('id', 'email'):
+            found[email] = pk
+        for pk in User.objects.using(self.using).filter(
+                id__in=ids).values_list('id', flat=True):
+            found[pk] = pk
+        return found
+
+    def tag_ids(self, tags):
+        slugs = {tag for tag in tags if isinstance(tag, str)}
+        ids = {tag for tag in tags if isinstance(tag, int)}
+        found = {}
+        for pk, slug in Tag.objects.using(self.using).filter(
+                slug__in=slugs).values_list('id', 'slug'):
+            found[slug] = pk
+        for pk in Tag.objects.using(self.using).filter(
+                id__in=ids).values_list('id', flat=True):
+            found[pk] = pk
+        return found
+
+    @transaction.atomic
+    def save_recipes(self, batch):
+        '''Рецепты пачки заменяют одноимённые рецепты тех же авторов
+        вместе с составом и тегами. Ингредиенты, которых ещё нет
+        в каталоге, создаются. Возвращает число пропущенных записей.'''
+        items = [
+            item for fields in batch
+            for item in fields.get('ingredients') or ()
+        ]
+        by_name = [item for item in items if 'name' in item]
+        self.save_ingredients(by_name)
+        ingredient_ids = self.ingredient_ids(
+            {ingredient_key(item) for item in by_name})
+        known_ids = set(Ingredient.objects.using(self.using).filter(
+            id__in={item['id'] for item in items if 'name' not in item}
+        ).values_list('id', flat=True))
+        for fields in batch:
+            if str(fields['author']).isdigit():
+                fields['author'] = int(fields['author'])
+        authors = self.author_ids({fields['author'] for fields in batch})
+        tags = self.tag_ids({
+            tag for fields in batch for tag in fields.get('tags') or ()})
+
+        recipes = {}
+        compositions = {}
+        skipped = 0
+        for fields in batch:
+            author_id = authors.get(fields['author'])
+            if author_id is None:
+                skipped += 1
+                continue
+            key = (author_id, fields['name'])
+            recipes[key] = Recipe(
+                author_id=author_id, name=fields['name'],
+                text=fields.get('text', ''),
+                cooking_time=fields['cooking_time'],
+                image=fields.get('image', ''),
+            )
+            amounts = defaultdict(int)
+            for item in fields.get('ingredients') or ():
+                if 'name' in item:
+                    ingredient_id = ingredient_ids.get(ingredient_key(item))
+                elif item['id'] in known_ids:
+                    ingredient_id = item['id']
+                else:
+                    ingredient_id = None
+                if ingredient_id is not None:
+                    amounts[ingredient_id] += int(item['amount'])
+            compositions[key] = (
+                amounts, {tags[tag] for tag in fields.get('tags') or ()
+                          if tag in tags})
+        if not recipes:
+            return skipped
+
+        Recipe.objects.using(self.using).bulk_create(
+            recipes.values(), update_conflicts=True,
+            unique_fields=['author', 'name'],
+            update_fields=['text', 'cooking_time', 'image', 'updated_at'])
+        recipe_ids = {
+            (author_id, name): pk
+            for pk, author_id, name in Recipe.objects.using(
+                self.using).filter(
+                    author_id__in={author for author, _ in recipes},
+                    name__in={name for _, name in recipes},
+            ).values_list('id', 'author_id', 'name')
+            if (author_id, name) in recipes
+        }
+        self.author_ids_seen.update(author for author, _ in recipe_ids)
+        self.cart_user_ids.update(ShoppingCart.objects.using(
+            self.using).filter(recipe_id__in=recipe_ids.values()
+                               ).values_list('user_id', flat=True))
+
+        RecipeIngredient.objects.using(self.using).filter(
+            recipe_id__in=recipe_ids.values()).delete()
+        # У промежуточной таблицы тегов нет обработчиков удаления, поэтому
+        # delete() выполняется одним DELETE, не загружая строки.
+        recipe_tags = Recipe.tags.through
+        recipe_tags.objects.using(self.using).filter(
+            recipe_id__in=recipe_ids.values()).delete()
+        rows = [
+            (recipe_ids[key], ingredient_id, amount)
+            for key, (amounts, _) in compositions.items()
+            for ingredient_id, amount in amounts.items()
+        ]
+        if self.postgresql:
+            with connections[self.using].cursor() as cursor:
+                copy_rows(cursor, RecipeIngredient._meta.db_table,
+                          ('recipe_id', 'ingredient_id', 'amount'), rows)
+        else:
+            RecipeIngredient.objects.using(self.using).bulk_create(
+                RecipeIngredient(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id, amount=amount)
+                for recipe_id, ingredient_id, amount in rows)
+        recipe_tags.objects.using(self.using).bulk_create(
+            recipe_tags(recipe_id=recipe_ids[key], tag_id=tag_id)
+            for key, (_, tag_ids) in compositions.items()
+            for tag_id in tag_ids)
+        return skipped
@@ -0,0 +1,55 @@
+'''Хранимые счётчики: сколько раз рецепт в избранном и в корзинах,
+сколько у пользователя рецептов и подписчиков.
+
+Сигналы меняют счётчики одним UPDATE с F() на каждое изменение связи.
+Массовые операции сигналы обходят, после них счётчики сверяются
+с таблицами связей командой reconcile_counters.
+'''
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favourite, Recipe, ShoppingCart
+from users.models import Subscribe
+
+User = get_user_model()
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': (Favourite, 'recipe'),
+        'in_carts_count': (ShoppingCart, 'recipe'),
+    },
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Subscribe, 'author'),
+    },
+}
+
+
+def change(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
+
+
+def expected(model, field):
+    '''Подзапрос с настоящим значением счётчика для каждой строки.'''
+    related, foreign_key = COUNTERS[model][field]
+    return Coalesce(Subquery(
+        related.objects.filter(
+            **{foreign_key: OuterRef('pk')}
+        ).order_by().values(foreign_key).annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile(queryset, field, dry_run=False):
+    '''Исправляет расхождения счётчика field у строк queryset.
+    Возвращает число строк, где счётчик был неверным.'''
+    model = queryset.model
+    drifted = list(queryset.annotate(
+        expected_value=expected(model, field)
+    ).exclude(**{field: F('expected_value')}).values_list('pk', flat=True))
+    if drifted and not dry_run:
+        model.objects.filter(pk__in=drifted).update(
+            **{field: expected(model, field)})
+    return len(drifted)
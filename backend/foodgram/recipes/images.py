@@ -0,0 +1,132 @@
+'''Миниатюры изображений рецептов.
+
+Картинки уменьшаются в пуле процессов, чтобы запрос на загрузку
+не ждал Pillow и не занимал его на время ресайза. Готовые миниатюры
+лежат рядом с оригиналами в MEDIA_ROOT, а их имена записываются
+в Recipe.thumbnails. В имени миниатюры есть id рецепта и хэш имени
+исходного файла, поэтому миниатюры a.png и a.jpg, а также разных
+рецептов с одной картинкой не затирают друг друга.
+'''
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+THUMBNAILS_DIR = 'recipes/thumbnails'
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp', {'quality': 80, 'method': 4}
+    return 'JPEG', 'jpg', {'quality': 80, 'progressive': True,
+                           'optimize': True}
+
+
+def render_thumbnails(source, target_dir, stem, sizes):
+    '''Выполняется в процессе пула: без Django, только файлы.
+    Возвращает {размер: имя файла относительно target_dir}.'''
+    image_format, extension, options = thumbnail_format()
+    os.makedirs(target_dir, exist_ok=True)
+    names = {}
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'A' in original.getbands()
+                                        else 'RGB')
+        if image_format == 'JPEG' and original.mode == 'RGBA':
+            original = original.convert('RGB')
+        for size, width in sizes.items():
+            image = original.copy()
+            image.thumbnail((width, width), Image.LANCZOS)
+            name = f'{stem}_{size}.{extension}'
+            image.save(os.path.join(target_dir, name), image_format,
+                       **options)
+            names[size] = name
+    return names
+
+
+def thumbnail_stem(recipe_id, image_name):
+    '''Имена в хранилище уникальны, значит, и хэш имени отличает
+    любые две загруженные картинки, даже с одинаковым названием.'''
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    digest = hashlib.sha1(image_name.encode()).hexdigest()[:8]
+    return f'{recipe_id}_{stem}_{digest}'
+
+
+def render_args(recipe_id, image_name):
+    return (default_storage.path(image_name),
+            default_storage.path(THUMBNAILS_DIR),
+            thumbnail_stem(recipe_id, image_name),
+            settings.RECIPE_THUMBNAIL_SIZES)
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+@lru_cache(maxsize=None)
+def executor():
+    '''Пул создаётся при первом обращении, то есть уже в рабочем
+    процессе gunicorn, а не в мастере до fork.'''
+    return ProcessPoolExecutor(settings.RECIPE_THUMBNAIL_WORKERS)
+
+
+def save_thumbnails(recipe_id, image_name, names):
+    thumbnails = {
+        size: f'{THUMBNAILS_DIR}/{name}' for size, name in names.items()
+    }
+    recipe = Recipe.objects.filter(id=recipe_id, image=image_name).first()
+    if recipe is None:
+        # Картинку уже заменили или рецепт удалили, пока шёл ресайз.
+        delete_files(thumbnails.values())
+        return
+    recipe.thumbnails = thumbnails
+    recipe.save(update_fields=['thumbnails', 'updated_at'])
+
+
+def thumbnails_ready(recipe_id, image_name, submitter, future):
+    '''Колбэк пула. Обычно выполняется в служебном потоке пула и тогда
+    закрывает открытое там соединение с базой; соединение потока,
+    который поставил задачу, не трогает.'''
+    try:
+        save_thumbnails(recipe_id, image_name, future.result())
+    except Exception:
+        logger.exception('Не удалось сделать миниатюры для %s', image_name)
+    finally:
+        if threading.get_ident() != submitter:
+            connections.close_all()
+
+
+def submit(recipe_id, image_name):
+    future = executor().submit(
+        render_thumbnails, *render_args(recipe_id, image_name))
+    future.add_done_callback(partial(
+        thumbnails_ready, recipe_id, image_name, threading.get_ident()))
+
+
+def replace(previous, recipe_id, image_name):
+    delete_files(previous)
+    submit(recipe_id, image_name)
+
+
+def schedule(recipe, previous=None):
+    '''Поставить миниатюры в очередь после фиксации транзакции:
+    пул не должен видеть ещё не сохранённый файл и рецепт. Файлы
+    previous — миниатюры прежней картинки — удаляются тогда же,
+    а при откате транзакции остаются.'''
+    if recipe.image:
+        transaction.on_commit(partial(
+            replace, list((previous or {}).values()), recipe.id,
+            recipe.image.name))
@@ -0,0 +1,51 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Делает миниатюры изображений рецептов, у которых их ещё нет '
+            '(например, загруженных до появления миниатюр).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать миниатюры всех рецептов.')
+        parser.add_argument(
+            '--workers', type=int,
+            default=settings.RECIPE_THUMBNAIL_WORKERS)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').values_list(
+            'id', 'image', 'thumbnails')
+        if not options['all']:
+            recipes = recipes.filter(thumbnails={})
+        done = failed = 0
+        with ProcessPoolExecutor(options['workers']) as pool:
+            futures = {
+                pool.submit(images.render_thumbnails,
+                            *images.render_args(recipe_id, image)):
+                (recipe_id, image, previous)
+                for recipe_id, image, previous in recipes.iterator()
+            }
+            for future in as_completed(futures):
+                recipe_id, image, previous = futures[future]
+                try:
+                    names = future.result()
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{image}: {error}')
+                    continue
+                images.save_thumbnails(recipe_id, image, names)
+                # С --all удаляем миниатюры, названные по-старому.
+                images.delete_files(
+                    set(previous.values()) - {
+                        f'{images.THUMBNAILS_DIR}/{name}'
+                        for name in names.values()})
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы: {done}; с ошибками: {failed}.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import DeletedRecipe
+
+
+class Command(BaseCommand):
+    help = ('Удаляет записи об удалённых рецептах старше '
+            'DELETED_RECIPES_RETENTION_DAYS дней. Клиентам, которые '
+            'запрашивают /api/recipes/changes/ за более ранний период, '
+            'отвечаем 410, и они загружают рецепты заново.')
+
+    def handle(self, *args, **options):
+        pruned, _ = DeletedRecipe.objects.filter(
+            deleted_at__lt=DeletedRecipe.horizon()).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей об удалённых рецептах: {pruned}.'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from recipes import shopping_list
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сверяет таблицу списков покупок с корзинами пользователей '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя; при расхождениях '
+                 'команда завершается с ошибкой.')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя; можно указать несколько раз.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            Q(shopping__isnull=False) | Q(shopping_list__isnull=False)
+        ).distinct().order_by('id').values_list('id', flat=True)
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        user_ids = list(users)
+
+        created = updated = deleted = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            counts = shopping_list.rebuild(batch, dry_run=options['check'])
+            created += counts[0]
+            updated += counts[1]
+            deleted += counts[2]
+
+        summary = (f'Пользователей: {len(user_ids)}; '
+                   f'недостающих строк: {created}, '
+                   f'неверных количеств: {updated}, '
+                   f'лишних строк: {deleted}.')
+        if options['check'] and created + updated + deleted:
+            raise CommandError(f'Списки покупок расходятся. {summary}')
+        self.stdout.write(self.style.SUCCESS(summary))
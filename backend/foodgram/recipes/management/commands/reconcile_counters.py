@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет хранимые счётчики (избранное, корзины, рецепты, '
+            'подписчики) с таблицами связей и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя; при расхождениях '
+                 'команда завершается с ошибкой.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        for model, fields in counters.COUNTERS.items():
+            bounds = model.objects.aggregate(Min('pk'), Max('pk'))
+            first, last = bounds['pk__min'] or 0, bounds['pk__max'] or -1
+            for field in fields:
+                drifted = 0
+                for start in range(first, last + 1, batch_size):
+                    drifted += counters.reconcile(
+                        model.objects.filter(
+                            pk__gte=start, pk__lt=start + batch_size),
+                        field, dry_run=options['check'])
+                total += drifted
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}, {field}: '
+                    f'расхождений {drifted}')
+        if options['check'] and total:
+            raise CommandError(f'Счётчики расходятся: {total}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {0 if options["check"] else total}.'))
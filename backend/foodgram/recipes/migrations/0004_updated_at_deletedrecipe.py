@@ -0,0 +1,42 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(verbose_name='id рецепта')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый рецепт',
+                'verbose_name_plural': 'Удалённые рецепты',
+            },
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_updated_at_deletedrecipe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['recipe', 'user'], name='favourite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shopping_recipe_user_idx'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# SQL записан здесь, а не берётся из recipes.search: миграция должна
+# делать одно и то же, как бы ни менялся код приложения.
+POSTGRESQL_INSTALL = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    'CREATE INDEX recipe_search_vector_idx '
+    'ON recipes_recipe USING GIN (search_vector)',
+)
+POSTGRESQL_UNINSTALL = (
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+# Триггеры и переиндексацию отсюда же выполняет
+# recipes.search.restore_sqlite_triggers.
+SQLITE_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert '
+    'AFTER INSERT ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete '
+    'AFTER DELETE ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update '
+    'AFTER UPDATE OF name, text ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+)
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) VALUES ('rebuild')"
+)
+SQLITE_INSTALL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+    "USING fts5(name, text, content='recipes_recipe', content_rowid='id')",
+    *SQLITE_TRIGGERS,
+    SQLITE_REBUILD,
+)
+SQLITE_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def execute(schema_editor, statements):
+    statements = statements.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def install(apps, schema_editor):
+    execute(schema_editor, {
+        'postgresql': POSTGRESQL_INSTALL, 'sqlite': SQLITE_INSTALL})
+
+
+def uninstall(apps, schema_editor):
+    execute(schema_editor, {
+        'postgresql': POSTGRESQL_UNINSTALL, 'sqlite': SQLITE_UNINSTALL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:42
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.utils import timezone
+
+MAX_RECIPE_AMOUNT = 32767
+
+
+def merge_rows(rows, owner, keeper_id, limit=None):
+    '''Оставляет по одной строке на владельца (рецепт или пользователя)
+    с суммой количеств и ингредиентом keeper_id; возвращает строки
+    на удаление.'''
+    by_owner = defaultdict(list)
+    for row in rows:
+        by_owner[getattr(row, owner)].append(row)
+    deleted = []
+    for owner_rows in by_owner.values():
+        owner_rows.sort(key=lambda row: row.ingredient_id != keeper_id)
+        kept, *rest = owner_rows
+        total = sum(row.amount for row in owner_rows)
+        kept.ingredient_id = keeper_id
+        kept.amount = min(total, limit) if limit else total
+        deleted += rest
+    return deleted
+
+
+def merge_duplicates(apps, schema_editor):
+    '''Сливает ингредиенты с одинаковыми названием и единицей измерения
+    в строку с наименьшим id: составы рецептов и списки покупок
+    переводятся на неё, количества одного ингредиента складываются.'''
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    groups = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).order_by().annotate(
+        keeper=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    for group in groups.iterator():
+        keeper_id = group['keeper']
+        ids = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).values_list('id', flat=True))
+        for model, owner, limit in (
+                (RecipeIngredient, 'recipe_id', MAX_RECIPE_AMOUNT),
+                (ShoppingListItem, 'user_id', None)):
+            rows = list(model.objects.filter(ingredient_id__in=ids))
+            deleted = {row.pk for row in merge_rows(
+                rows, owner, keeper_id, limit)}
+            model.objects.filter(pk__in=deleted).delete()
+            model.objects.bulk_update(
+                [row for row in rows if row.pk not in deleted],
+                ['ingredient', 'amount'])
+            if model is RecipeIngredient:
+                Recipe.objects.filter(
+                    id__in={row.recipe_id for row in rows}
+                ).update(updated_at=timezone.now())
+        Ingredient.objects.filter(id__in=ids).exclude(id=keeper_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
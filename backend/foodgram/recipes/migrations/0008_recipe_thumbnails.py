@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_ingredient_natural_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Миниатюры'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_recipe_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(max_length=8, verbose_name='Формат')),
+                ('version', models.CharField(max_length=32, verbose_name='Версия списка')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=8, verbose_name='Статус')),
+                ('file', models.FileField(blank=True, upload_to='shopping_lists/', verbose_name='Файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начат')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершён')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Файл списка покупок',
+                'verbose_name_plural': 'Файлы списков покупок',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', 'format', 'version'], name='shopping_job_version_idx'), models.Index(fields=['status', 'id'], name='shopping_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, foreign_key):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{foreign_key: OuterRef('pk')}
+        ).order_by().values(foreign_key).annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favourite = apps.get_model('recipes', 'Favourite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    User = apps.get_model('users', 'User')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    Recipe.objects.update(
+        favorites_count=count_of(Favourite, 'recipe'),
+        in_carts_count=count_of(ShoppingCart, 'recipe'),
+    )
+    User.objects.update(
+        recipes_count=count_of(Recipe, 'author'),
+        followers_count=count_of(Subscribe, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_shoppinglistjob'),
+        ('users', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['name'], name='recipe_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
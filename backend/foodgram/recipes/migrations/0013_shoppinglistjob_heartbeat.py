@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+def start_heartbeats(apps, schema_editor):
+    '''Заказы, которые уже выполняются, возвращаются в очередь по времени
+    начала, как и раньше.'''
+    ShoppingListJob = apps.get_model('recipes', 'ShoppingListJob')
+    ShoppingListJob.objects.filter(status='running').update(
+        heartbeat_at=models.F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_admin_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сигнал воркера'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistjob',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Воркер'),
+        ),
+        migrations.RunPython(start_heartbeats, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import Index, Prefetch, UniqueConstraint
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -10,6 +14,7 @@ class Tag(models.Model):
     name = models.CharField('Название', max_length=200, unique=True)
     color = models.CharField('Цветовой HEX-код', max_length=7, unique=True)
     slug = models.SlugField('Слаг', max_length=200, unique=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'Тег'
@@ -22,16 +27,39 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     name = models.CharField('Название', max_length=200)
     measurement_unit = models.CharField('Единица измерения', max_length=200)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = [
+            UniqueConstraint(fields=['name', 'measurement_unit'],
+                             name='unique_ingredient')
+        ]
+        indexes = [
+            Index(fields=['name'], name='ingredient_name_prefix_idx',
+                  opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def for_display(self):
+        '''Всё, что нужно RecipeSerializer, за фиксированное число запросов:
+        автор — через select_related, теги и ингредиенты — через
+        prefetch_related. Флаги пользователя сериализатор берёт
+        из api.relation_sets.'''
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')),
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField('Название', max_length=200)
     author = models.ForeignKey(
@@ -41,6 +69,8 @@ class Recipe(models.Model):
         verbose_name='Автор'
     )
     image = models.ImageField('Изображение', upload_to='recipes/')
+    thumbnails = models.JSONField(
+        'Миниатюры', default=dict, blank=True, editable=False)
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -55,6 +85,14 @@ class Recipe(models.Model):
             1, message='Минимальное время приготовления - 1 минута'),
         )
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-id']
@@ -64,11 +102,38 @@ class Recipe(models.Model):
             UniqueConstraint(fields=['author', 'name'],
                              name='unique_author_name')
         ]
+        indexes = [
+            Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+            Index(fields=['-favorites_count', '-id'],
+                  name='recipe_favorites_count_idx'),
+            Index(fields=['name'], name='recipe_name_prefix_idx',
+                  opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class DeletedRecipe(models.Model):
+    recipe_id = models.BigIntegerField('id рецепта')
+    deleted_at = models.DateTimeField(
+        'Дата удаления', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+    @staticmethod
+    def horizon():
+        '''Записи об удалениях раньше этого момента могли быть удалены
+        командой prune_deleted_recipes.'''
+        return timezone.now() - timedelta(
+            days=settings.DELETED_RECIPES_RETENTION_DAYS)
+
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -119,6 +184,9 @@ class Favourite(models.Model):
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_favourite')
         ]
+        indexes = [
+            Index(fields=['recipe', 'user'], name='favourite_recipe_user_idx'),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} добавил "{self.recipe}" в избранное.'
@@ -145,6 +213,86 @@ class ShoppingCart(models.Model):
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_shopping')
         ]
+        indexes = [
+            Index(fields=['recipe', 'user'], name='shopping_recipe_user_idx'),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} добавил "{self.recipe}" в корзину.'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            UniqueConstraint(fields=['user', 'ingredient'],
+                             name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} — {self.amount}'
+
+
+class ShoppingListJob(models.Model):
+    '''Заказ на файл списка покупок. Файлы собирает воркер
+    (manage.py shopping_list_worker), а готовый файл переиспользуется,
+    пока не изменится версия списка — User.shopping_list_version.'''
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_jobs',
+        verbose_name='Пользователь',
+    )
+    format = models.CharField('Формат', max_length=8)
+    version = models.CharField('Версия списка', max_length=32)
+    status = models.CharField(
+        'Статус', max_length=8, choices=STATUSES, default=PENDING)
+    file = models.FileField(
+        'Файл', upload_to='shopping_lists/', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+    started_at = models.DateTimeField('Начат', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершён', null=True, blank=True)
+    worker = models.CharField('Воркер', max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(
+        'Последний сигнал воркера', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Файл списка покупок'
+        verbose_name_plural = 'Файлы списков покупок'
+        indexes = [
+            Index(fields=['user', 'format', 'version'],
+                  name='shopping_job_version_idx'),
+            Index(fields=['status', 'id'], name='shopping_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.format} ({self.get_status_display()})'
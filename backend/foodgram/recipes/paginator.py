@@ -0,0 +1,29 @@
+'''Постраничная выдача без полного COUNT(*) для больших таблиц:
+её используют и админка, и пагинация API.'''
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def approximate_count(queryset):
+    '''Оценка числа строк по плану запроса вместо COUNT(*).
+    Оценку умеет давать только PostgreSQL; на остальных базах
+    считаем честно.'''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ApproximateCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
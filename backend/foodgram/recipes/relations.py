@@ -0,0 +1,98 @@
+'''Добавление рецептов в избранное и корзину и удаление оттуда
+пачками.
+
+Каждое действие занимает постоянное число запросов на всю пачку:
+строка пользователя блокируется (параллельные изменения его избранного
+и корзины выполняются по очереди), изменившиеся id читаются одним
+SELECT, а строки вставляются bulk_create(ignore_conflicts=True) или
+удаляются QuerySet.delete(). Повторы ничего не ломают. Счётчики
+и списки покупок обновляются одним запросом на всю пачку: после
+bulk_create — здесь же, а при удалении — из обработчика pre_delete
+(recipes.signals), который получает весь удаляемый queryset. Остальным
+приложениям отправляется сигнал relations_changed.
+'''
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
+
+from . import shopping_list
+from .models import Favourite, Recipe, RecipeIngredient, ShoppingCart
+
+User = get_user_model()
+
+COUNTER_FIELDS = {
+    Favourite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+relations_changed = Signal()
+
+
+def _lock(user_id):
+    list(User.objects.select_for_update().filter(
+        id=user_id).values_list('id', flat=True))
+
+
+def _changed(model, user_id, recipe_ids, delta):
+    if not recipe_ids:
+        return
+    field = COUNTER_FIELDS[model]
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
+    if model is ShoppingCart:
+        amounts = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id').order_by().annotate(total=Sum('amount'))
+        shopping_list.change_totals([user_id], {
+            row['ingredient_id']: delta * row['total'] for row in amounts
+        })
+    relations_changed.send(
+        sender=model, user_id=user_id, recipe_ids=recipe_ids)
+
+
+@transaction.atomic
+def add(model, user_id, recipe_ids):
+    '''Добавляет существующие рецепты из recipe_ids; возвращает id тех,
+    которых у пользователя ещё не было.'''
+    if not recipe_ids:
+        return set()
+    _lock(user_id)
+    added = set(Recipe.objects.filter(id__in=recipe_ids).exclude(
+        id__in=model.objects.filter(user_id=user_id).values('recipe_id')
+    ).values_list('id', flat=True))
+    model.objects.bulk_create(
+        [model(user_id=user_id, recipe_id=pk) for pk in sorted(added)],
+        ignore_conflicts=True)
+    _changed(model, user_id, added, 1)
+    return added
+
+
+def removing(model, rows):
+    '''Строки rows (queryset model) сейчас будут удалены одним delete().'''
+    by_user = defaultdict(set)
+    for user_id, recipe_id in rows.values_list('user_id', 'recipe_id'):
+        by_user[user_id].add(recipe_id)
+    for user_id, recipe_ids in by_user.items():
+        _changed(model, user_id, recipe_ids, -1)
+
+
+@transaction.atomic
+def remove(model, user_id, recipe_ids):
+    '''Удаляет рецепты recipe_ids; возвращает id тех, что были.'''
+    if not recipe_ids:
+        return set()
+    _lock(user_id)
+    rows = model.objects.filter(user_id=user_id, recipe_id__in=recipe_ids)
+    removed = set(rows.values_list('recipe_id', flat=True))
+    if removed:
+        rows.delete()
+    return removed
+
+
+def recipe_ids(model, user_id):
+    return sorted(model.objects.filter(
+        user_id=user_id).values_list('recipe_id', flat=True))
@@ -0,0 +1,100 @@
+'''Полнотекстовый поиск по названию и описанию рецептов.
+
+В PostgreSQL у таблицы рецептов есть вычисляемая колонка search_vector
+(tsvector с русской конфигурацией; название весит больше описания)
+с GIN-индексом. В SQLite её заменяет виртуальная таблица FTS5, которую
+синхронизируют триггеры. Обе структуры создаются миграцией 0006
+и в модели не описаны: ORM их не читает и не пишет, запросы к ним
+собираются здесь.
+'''
+import re
+from importlib import import_module
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# SQL триггеров FTS5 заморожен в миграции 0006 и берётся оттуда же:
+# restore_sqlite_triggers возвращает ровно то, что она создала.
+# Если триггеры изменит новая миграция, импорт нужно перевести на неё.
+schema = import_module('recipes.migrations.0006_recipe_search')
+
+NAME_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+WORD = re.compile(r'\w+')
+
+
+def restore_sqlite_triggers(connection):
+    '''SQLite меняет схему таблицы, пересоздавая её, и триггеры старой
+    таблицы при этом пропадают. Возвращает их и переиндексирует рецепты,
+    если после миграций триггеров не оказалось.'''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE 'recipes\\_recipe\\_fts\\_%' ESCAPE '\\'")
+        (triggers,), = cursor.fetchall()
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master "
+            "WHERE name = 'recipes_recipe_fts'")
+        (tables,), = cursor.fetchall()
+        if not tables or triggers == len(schema.SQLITE_TRIGGERS):
+            return
+        for statement in (*schema.SQLITE_TRIGGERS, schema.SQLITE_REBUILD):
+            cursor.execute(statement)
+
+
+def sqlite_match(query):
+    '''Слова запроса в кавычках: операторы FTS5 из пользовательского
+    ввода не интерпретируются, слова объединяются через AND. Последнее
+    слово ищется как префикс — запрос ещё могут дописывать.'''
+    terms = [f'"{word}"' for word in WORD.findall(query)]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def postgresql_tsquery(query):
+    '''То же для to_tsquery: слова через &, последнее — префикс.'''
+    terms = WORD.findall(query)
+    if terms:
+        terms[-1] += ':*'
+    return ' & '.join(terms)
+
+
+def search_recipes(queryset, query):
+    '''Оставляет рецепты, подходящие под запрос, и сортирует их
+    по релевантности (search_rank, чем больше, тем лучше).'''
+    table = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        terms = postgresql_tsquery(query)
+        if not terms:
+            return queryset.none()
+        tsquery = "to_tsquery('russian', %s)"
+        condition = RawSQL(
+            f'{table}.search_vector @@ {tsquery}', [terms],
+            output_field=BooleanField())
+        rank = RawSQL(
+            f'ts_rank({table}.search_vector, {tsquery})', [terms],
+            output_field=FloatField())
+    elif vendor == 'sqlite':
+        match = sqlite_match(query)
+        if not match:
+            return queryset.none()
+        condition = RawSQL(
+            f'{table}.id IN (SELECT rowid FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s)', [match],
+            output_field=BooleanField())
+        rank = RawSQL(
+            f'(SELECT -bm25(recipes_recipe_fts, {NAME_WEIGHT}, '
+            f'{TEXT_WEIGHT}) FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s '
+            f'AND recipes_recipe_fts.rowid = {table}.id)', [match],
+            output_field=FloatField())
+    else:
+        condition = Q(name__icontains=query) | Q(text__icontains=query)
+        rank = Value(0.0)
+    return queryset.filter(condition).annotate(
+        search_rank=rank).order_by('-search_rank', '-id')
@@ -0,0 +1,131 @@
+'''Поддержка таблицы ShoppingListItem — суммарного количества каждого
+ингредиента в корзине пользователя. Таблица меняется инкрементально
+вместе с корзиной, а rebuild() пересчитывает её с нуля. Каждое изменение
+списка увеличивает User.shopping_list_version.'''
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+
+def touch(user_ids):
+    '''Новая версия списков покупок пользователей user_ids (id или
+    подзапрос): по версии переиспользуются собранные файлы списка.'''
+    User.objects.filter(id__in=user_ids).update(
+        shopping_list_version=F('shopping_list_version') + 1)
+
+
+def recipe_amounts(recipe_id):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+@transaction.atomic
+def change_totals(user_ids, deltas):
+    '''Прибавляет deltas ({ingredient_id: количество}, в том числе
+    отрицательное) к спискам покупок пользователей user_ids.'''
+    user_ids = list(user_ids)
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0)
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items() if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas)
+    items.update(amount=Greatest(
+        F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    ))
+    items.filter(amount=0).delete()
+    touch(user_ids)
+
+
+def add_recipe(user_id, recipe_id):
+    change_totals([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    change_totals([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def update_recipe(recipe_id, old_amounts, new_amounts):
+    '''Переносит изменение состава рецепта в списки покупок всех, у кого
+    он лежит в корзине.'''
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True)
+    change_totals(user_ids, {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    })
+
+
+def totals_queryset(user_ids):
+    return RecipeIngredient.objects.filter(
+        recipe__shopping__user_id__in=user_ids
+    ).values(
+        'recipe__shopping__user_id', 'ingredient_id'
+    ).order_by().annotate(total=Sum('amount'))
+
+
+def expected_totals(user_ids):
+    rows = totals_queryset(user_ids)
+    return {
+        (row['recipe__shopping__user_id'], row['ingredient_id']): row['total']
+        for row in rows
+    }
+
+
+@transaction.atomic
+def rebuild(user_ids, dry_run=False):
+    '''Сверяет списки покупок пользователей с корзинами и исправляет
+    расхождения. Возвращает количество добавленных, исправленных
+    и удалённых строк.'''
+    expected = expected_totals(user_ids)
+    actual = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.filter(user_id__in=user_ids)
+    }
+    to_create = [
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         amount=amount)
+        for (user_id, ingredient_id), amount in expected.items()
+        if (user_id, ingredient_id) not in actual
+    ]
+    to_update = []
+    for key, item in actual.items():
+        if key in expected and item.amount != expected[key]:
+            item.amount = expected[key]
+            to_update.append(item)
+    to_delete = [
+        item.pk for key, item in actual.items() if key not in expected
+    ]
+    if not dry_run:
+        ShoppingListItem.objects.bulk_create(to_create)
+        ShoppingListItem.objects.bulk_update(to_update, ['amount'])
+        ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+        if to_create or to_update or to_delete:
+            touch({user_id for user_id, _ in expected.keys() | actual.keys()})
+    return len(to_create), len(to_update), len(to_delete)
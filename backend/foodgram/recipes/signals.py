@@ -0,0 +1,170 @@
+from weakref import WeakKeyDictionary
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save, pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, relations, search, shopping_list
+from .models import (DeletedRecipe, Favourite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, ShoppingListItem, Tag)
+from users.models import Subscribe
+
+User = get_user_model()
+
+# Поля, которые меняет вход пользователя: такое сохранение не влияет
+# ни на рецепты, ни на кэш ответов (api.signals).
+LOGIN_FIELDS = frozenset(('last_login', 'password'))
+
+_handled_batches = WeakKeyDictionary()
+
+
+def touch_recipes(**filters):
+    '''Отмечает рецепты изменёнными, когда меняются данные, которые
+    попадают в их представление.'''
+    Recipe.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+def deleted_in_batch(sender, origin=None, **kwargs):
+    '''Строку удаляют вызовом delete() у queryset той же модели.'''
+    return isinstance(origin, QuerySet) and origin.model is sender
+
+
+def first_in_batch(origin, key):
+    '''QuerySet.delete() отправляет pre_delete и post_delete на каждую
+    строку с одним и тем же origin. Обработчик, который обновляет всю
+    пачку одним запросом, делает это на первой строке (pre_delete, пока
+    строки origin ещё в базе) и пропускает остальные.'''
+    handled = _handled_batches.setdefault(origin, set())
+    if key in handled:
+        return False
+    handled.add(key)
+    return True
+
+
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added_to_cart(instance, created, raw, **kwargs):
+    if created and not raw:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+        counters.change(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def recipe_removed_from_cart(sender, instance, **kwargs):
+    if deleted_in_batch(sender, **kwargs):
+        return
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+    counters.change(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=Favourite)
+def recipe_favorited(instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favourite)
+def recipe_unfavorited(sender, instance, **kwargs):
+    if deleted_in_batch(sender, **kwargs):
+        return
+    counters.change(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def author_followed(instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def author_unfollowed(instance, **kwargs):
+    counters.change(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    DeletedRecipe.objects.create(recipe_id=instance.id)
+    counters.change(User, instance.author_id, 'recipes_count', -1)
+
+
+def deleted_with_recipe(origin=None, **kwargs):
+    '''Строка удаляется каскадом вместе с рецептом (origin — рецепт или
+    queryset рецептов): трогать сам рецепт незачем.'''
+    return isinstance(origin, Recipe) or getattr(
+        origin, 'model', None) is Recipe
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if not deleted_with_recipe(**kwargs) and not deleted_in_batch(
+            sender, **kwargs):
+        touch_recipes(id=instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Favourite)
+@receiver(pre_delete, sender=ShoppingCart)
+def relations_deleted(sender, origin=None, **kwargs):
+    if deleted_in_batch(sender, origin) and first_in_batch(
+            origin, __name__):
+        relations.removing(sender, origin)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def recipe_ingredients_deleted(sender, origin=None, **kwargs):
+    if deleted_in_batch(sender, origin) and first_in_batch(
+            origin, __name__):
+        touch_recipes(id__in=origin.values('recipe_id'))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_recipes(id=instance.id)
+    elif pk_set is not None:
+        touch_recipes(id__in=pk_set)
+    else:
+        touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(instance, created, **kwargs):
+    if not created:
+        touch_recipes(tags=instance)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(instance, **kwargs):
+    touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(instance, created, **kwargs):
+    if not created:
+        touch_recipes(ingredients=instance)
+        shopping_list.touch(ShoppingListItem.objects.filter(
+            ingredient=instance).values('user_id'))
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, created, update_fields, **kwargs):
+    if created or update_fields and set(update_fields) <= LOGIN_FIELDS:
+        return
+    touch_recipes(author=instance)
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        search.restore_sqlite_triggers(connections[using])
@@ -0,0 +1,286 @@
+'''Синтетические данные для нагрузочных тестов и замеров.
+
+Всё выводится из одного зерна: при тех же размерах и зерне получаются
+те же пользователи, подписки, рецепты, составы, избранное и корзины.
+У каждого вида данных свой генератор случайных чисел, поэтому строки
+можно порождать потоком, не держа их в памяти, а размеры одного вида
+не сдвигают остальные. Популярность авторов и рецептов распределена
+по закону Ципфа, число подписок, избранного и корзин у пользователя —
+по Парето: несколько «звёзд» и длинный хвост, как в живой базе.
+
+Строки пишутся пачками — COPY в PostgreSQL, bulk_create в остальных
+базах — мимо сигналов моделей, поэтому счётчики и списки покупок
+пересчитываются в конце одним проходом.
+'''
+import itertools
+import random
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, shopping_list
+from .catalog_import import copy_rows
+from .models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from users.models import Subscribe
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'synthetic.example'
+PASSWORD = 'synthetic'
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 1.5
+MAX_FAN_OUT = 1000
+INGREDIENTS_PER_RECIPE = (5, 40)
+TAGS_PER_RECIPE = (1, 3)
+IMAGE_SIZE = (600, 400)
+
+FIRST_NAMES = ('Анна', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Жанна',
+               'Илья', 'Ксения', 'Лев', 'Мария', 'Никита', 'Ольга', 'Павел')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов',
+              'Лебедев', 'Козлов', 'Новиков', 'Морозов', 'Волков')
+ADJECTIVES = ('Домашний', 'Быстрый', 'Летний', 'Острый', 'Пряный',
+              'Сытный', 'Лёгкий', 'Праздничный', 'Деревенский', 'Нежный')
+DISHES = ('суп', 'салат', 'пирог', 'плов', 'омлет', 'рагу', 'соус',
+          'гуляш', 'десерт', 'кекс', 'борщ', 'жаркое')
+WORDS = ('нарезать', 'обжарить', 'добавить', 'перемешать', 'посолить',
+         'потушить', 'остудить', 'подавать', 'горячим', 'мелко', 'минут',
+         'до', 'золотистой', 'корочки', 'на', 'среднем', 'огне', 'и')
+
+
+class SyntheticError(ValueError):
+    pass
+
+
+def fan_out(rng, mean, limit):
+    '''Целое по Парето со средним около mean, не больше limit.'''
+    if mean <= 0 or limit <= 0:
+        return 0
+    scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+    return min(int(rng.paretovariate(PARETO_ALPHA) * scale), limit)
+
+
+class Popularity:
+    '''Выбор индексов 0..size-1 по Ципфу; какой индекс популярнее,
+    решает перестановка, чтобы «звёзды» не совпадали с первыми id.'''
+
+    def __init__(self, rng, size):
+        self.order = list(range(size))
+        rng.shuffle(self.order)
+        self.cum_weights = list(itertools.accumulate(
+            1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(size)))
+
+    def sample(self, rng, count, exclude=None):
+        '''До count разных индексов, кроме exclude.'''
+        chosen = set()
+        for _ in range(3):
+            for rank in rng.choices(range(len(self.order)),
+                                    cum_weights=self.cum_weights,
+                                    k=count - len(chosen)):
+                index = self.order[rank]
+                if index != exclude:
+                    chosen.add(index)
+            if len(chosen) >= count:
+                break
+        return sorted(chosen)
+
+
+class SyntheticSeeder:
+    def __init__(self, seed, using='default', batch_size=5000, log=None):
+        self.seed = seed
+        self.using = using
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.postgresql = connections[using].vendor == 'postgresql'
+        self.now = timezone.now()
+
+    def rng(self, name):
+        return random.Random(f'{self.seed}:{name}')
+
+    def email(self, number):
+        return f'user{number}.s{self.seed}@{EMAIL_DOMAIN}'
+
+    def write(self, model, columns, rows):
+        '''Пишет строки (значения columns по порядку) пачками.
+        NULL в синтетических строках не бывает, пустая строка — это
+        пустая строка.'''
+        written = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic(using=self.using):
+                if self.postgresql:
+                    with connections[self.using].cursor() as cursor:
+                        copy_rows(cursor, model._meta.db_table, columns,
+                                  batch, not_null=columns)
+                else:
+                    model.objects.using(self.using).bulk_create(
+                        model(**dict(zip(columns, row))) for row in batch)
+            written += len(batch)
+        self.log(f'{model._meta.verbose_name_plural}: {written}')
+        return written
+
+    def new_ids(self, model, since):
+        '''id строк, вставленных после since, в порядке вставки.'''
+        return list(model.objects.using(self.using).filter(
+            id__gt=since).order_by('id').values_list('id', flat=True))
+
+    def last_id(self, model):
+        return model.objects.using(self.using).aggregate(
+            last=Max('id'))['last'] or 0
+
+    def seed_users(self, count):
+        if User.objects.using(self.using).filter(
+                email=self.email(0)).exists():
+            raise SyntheticError(
+                f'Данные с зерном {self.seed} уже загружены.')
+        rng = self.rng('users')
+        password = make_password(PASSWORD)
+        since = self.last_id(User)
+        self.write(User, (
+            'password', 'is_superuser', 'username', 'first_name',
+            'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+            'recipes_count', 'followers_count',
+        ), (
+            (password, False, f'user{number}_s{self.seed}',
+             rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+             self.email(number), False, True, self.now, 0, 0)
+            for number in range(count)
+        ))
+        return self.new_ids(User, since)
+
+    def seed_subscriptions(self, user_ids, mean):
+        rng = self.rng('subscriptions')
+        authors = Popularity(rng, len(user_ids))
+        limit = min(len(user_ids) - 1, MAX_FAN_OUT)
+        self.write(Subscribe, ('user_id', 'author_id'), (
+            (user_id, user_ids[index])
+            for number, user_id in enumerate(user_ids)
+            for index in authors.sample(
+                rng, fan_out(rng, mean, limit), exclude=number)
+        ))
+
+    def ensure_catalog(self, model, count, build):
+        '''Досоздаёт синтетические теги или ингредиенты, если в базе
+        их меньше count. Возвращает id всех.'''
+        existing = model.objects.using(self.using).count()
+        if existing < count:
+            model.objects.using(self.using).bulk_create(
+                (build(number) for number in range(existing, count)),
+                batch_size=self.batch_size, ignore_conflicts=True)
+        return list(model.objects.using(self.using).order_by(
+            'id').values_list('id', flat=True))
+
+    def seed_images(self, count):
+        rng = self.rng('images')
+        names = []
+        for number in range(count):
+            name = f'recipes/synthetic_{self.seed}_{number}.png'
+            color = tuple(rng.randrange(256) for _ in range(3))
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                Image.new('RGB', IMAGE_SIZE, color).save(buffer, 'PNG')
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        if names:
+            self.log(f'Изображений: {len(names)}')
+        return names
+
+    def seed_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                     images):
+        content = self.rng('recipes')
+        authors = Popularity(self.rng('authors'), len(user_ids))
+        since = self.last_id(Recipe)
+        self.write(Recipe, (
+            'name', 'author_id', 'image', 'thumbnails', 'text',
+            'cooking_time', 'updated_at', 'favorites_count',
+            'in_carts_count',
+        ), (
+            (f'{content.choice(ADJECTIVES)} {content.choice(DISHES)} '
+             f'№{number}',
+             user_ids[authors.sample(content, 1)[0]],
+             images[number % len(images)] if images else '',
+             '{}' if self.postgresql else {},
+             ' '.join(content.choices(WORDS, k=content.randint(10, 60))),
+             content.randint(5, 180), self.now, 0, 0)
+            for number in range(count)
+        ))
+        recipe_ids = self.new_ids(Recipe, since)
+        composition = self.rng('composition')
+        self.write(RecipeIngredient, (
+            'recipe_id', 'ingredient_id', 'amount'
+        ), (
+            (recipe_id, ingredient_id, composition.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.pick(
+                composition, ingredient_ids, INGREDIENTS_PER_RECIPE)
+        ))
+        tagging = self.rng('tags')
+        self.write(Recipe.tags.through, ('recipe_id', 'tag_id'), (
+            (recipe_id, tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.pick(tagging, tag_ids, TAGS_PER_RECIPE)
+        ))
+        return recipe_ids
+
+    @staticmethod
+    def pick(rng, ids, bounds):
+        low, high = bounds
+        high = min(high, len(ids))
+        return rng.sample(ids, rng.randint(min(low, high), high))
+
+    def seed_relation(self, model, user_ids, recipe_ids, mean):
+        rng = self.rng(model._meta.model_name)
+        recipes = Popularity(rng, len(recipe_ids))
+        limit = min(len(recipe_ids), MAX_FAN_OUT)
+        self.write(model, ('user_id', 'recipe_id'), (
+            (user_id, recipe_ids[index])
+            for user_id in user_ids
+            for index in recipes.sample(rng, fan_out(rng, mean, limit))
+        ))
+
+    def refresh_derived_data(self, user_ids, recipe_ids):
+        '''Счётчики и списки покупок новых строк одним проходом.'''
+        querysets = {User: User.objects.filter(id__gte=user_ids[0])}
+        if recipe_ids:
+            querysets[Recipe] = Recipe.objects.filter(id__gte=recipe_ids[0])
+        for model, queryset in querysets.items():
+            for field in counters.COUNTERS[model]:
+                queryset.using(self.using).update(
+                    **{field: counters.expected(model, field)})
+        cart_user_ids = sorted(ShoppingCart.objects.using(self.using).filter(
+            user_id__gte=user_ids[0]).values_list(
+                'user_id', flat=True).distinct())
+        for start in range(0, len(cart_user_ids), 500):
+            shopping_list.rebuild(cart_user_ids[start:start + 500])
+        self.log('Счётчики и списки покупок пересчитаны')
+
+    def run(self, users, recipes, tags=10, ingredients=1000,
+            subscriptions=5, favorites=10, carts=3, images=0):
+        if users < 1:
+            raise SyntheticError('Нужен хотя бы один пользователь.')
+        user_ids = self.seed_users(users)
+        self.seed_subscriptions(user_ids, subscriptions)
+        tag_ids = self.ensure_catalog(Tag, tags, lambda number: Tag(
+            name=f'Подборка {number}', color=f'#{number:06X}',
+            slug=f'synthetic-{number}'))
+        ingredient_ids = self.ensure_catalog(
+            Ingredient, ingredients, lambda number: Ingredient(
+                name=f'Ингредиент {number}', measurement_unit='г'))
+        recipe_ids = self.seed_recipes(
+            recipes, user_ids, tag_ids, ingredient_ids,
+            self.seed_images(images))
+        if recipe_ids:
+            self.seed_relation(Favourite, user_ids, recipe_ids, favorites)
+            self.seed_relation(ShoppingCart, user_ids, recipe_ids, carts)
+        self.refresh_derived_data(user_ids, recipe_ids)
+        return user_ids, recipe_ids
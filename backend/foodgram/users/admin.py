@@ -2,10 +2,11 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
 from .models import Subscribe, User
+from recipes.admin import LargeTableAdmin
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(UserAdmin, LargeTableAdmin):
     list_display = (
         'username',
         'id',
@@ -13,12 +14,14 @@ class CustomUserAdmin(UserAdmin):
         'first_name',
         'last_name',
     )
-    list_filter = ('email', 'username')
-    search_fields = ('username', 'email')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('username__startswith', 'email__startswith')
 
 
 @admin.register(Subscribe)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'author',)
-    search_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username__startswith',
+                     'author__username__startswith')
     raw_id_fields = ('user', 'author')
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['author', 'user'], name='subscribe_author_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['user', 'id'], name='subscribe_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-followers_count', 'id'], name='user_followers_count_idx'),
+        ),
+    ]
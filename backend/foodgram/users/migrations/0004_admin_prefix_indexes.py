@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['username'], name='user_username_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='user_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
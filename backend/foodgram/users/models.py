@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import Index, UniqueConstraint
 
 
 class User(AbstractUser):
@@ -15,6 +15,12 @@ class User(AbstractUser):
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
     email = models.EmailField('email', max_length=254, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
+    shopping_list_version = models.PositiveIntegerField(
+        'Версия списка покупок', default=0, editable=False)
 
     class Meta:
         ordering = ['id']
@@ -23,6 +29,14 @@ class User(AbstractUser):
         constraints = [
             UniqueConstraint(fields=['email', 'username'], name='unique_auth'),
         ]
+        indexes = [
+            Index(fields=['-followers_count', 'id'],
+                  name='user_followers_count_idx'),
+            Index(fields=['username'], name='user_username_prefix_idx',
+                  opclasses=['varchar_pattern_ops']),
+            Index(fields=['email'], name='user_email_prefix_idx',
+                  opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.username
@@ -48,6 +62,10 @@ class Subscribe(models.Model):
         constraints = [
             UniqueConstraint(fields=['user', 'author'], name='unique_follow'),
         ]
+        indexes = [
+            Index(fields=['author', 'user'], name='subscribe_author_user_idx'),
+            Index(fields=['user', 'id'], name='subscribe_user_id_idx'),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на {self.author}.'